@@ -0,0 +1,184 @@
+# -*- encoding:UTF-8 -*-
+import argparse, json, logging, os, platform, sys, time, timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'sample'))
+
+import api_coordinator, calculation, depth_index, order_book
+from depth_cache import DepthCache
+from fixtures import MARKETS, SIZES, load_payload, make_offline_wrapper
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+calculation、api_coordinator の処理時間を計測する
+- 通信は行わず、記録したdepthデータ(fixtures.py)を使用する
+- 結果は1行1件のJSONで出力し、--compare で前回の結果と比較する
+
+使い方:
+    python benchmarks/bench_hot_paths.py > before.jsonl
+    (変更後)
+    python benchmarks/bench_hot_paths.py --compare before.jsonl
+'''
+def measure(func, repeat, min_time=0.2):
+    '''
+    1回あたりの処理時間[マイクロ秒]を計測する
+    min_time[秒]以上かかる回数を1計測とし、repeat回計測する
+    '''
+    timer = timeit.Timer(func)
+
+    # 1計測あたりの回数を決める
+    number = 1
+    while timer.timeit(number) < min_time / 10:
+        number *= 10
+
+    times = sorted(t / number * 1e6 for t in timer.repeat(repeat, number))
+    return {
+            'number': number, 'repeat': repeat
+            , 'min_us': times[0], 'median_us': times[len(times) // 2]
+            , 'mean_us': sum(times) / len(times)
+    }
+
+def __calculation_cases():
+    '''
+    丸め処理の計測対象
+    '''
+    quantizer = calculation.get_quantizer(8)
+    yield 'calculation.kiri_sute', {}, lambda: calculation.kiri_sute(0.1234567891, 8)
+    yield 'calculation.kiri_age', {}, lambda: calculation.kiri_age(0.1234567891, 8)
+    yield 'calculation.shisha_gonyu', {}, lambda: calculation.shisha_gonyu(0.1234567891, 8)
+    yield 'Quantizer.kiri_sute', {}, lambda: quantizer.kiri_sute(0.1234567891)
+    yield 'Quantizer.kiri_age', {}, lambda: quantizer.kiri_age(0.1234567891)
+
+def __depth_cases(exchange_name, size_name):
+    '''
+    depthの解析、注文計画の計測対象
+    '''
+    payload = load_payload(exchange_name, size_name)
+
+    # 毎回depthを解析させるため、スナップショットは使い回さない
+    api_wrapper = make_offline_wrapper(exchange_name, payload, depth_max_age=-1)
+    params = {'exchange': exchange_name, 'size': size_name}
+
+    # 板の半分程度を約定させる数量
+    orders = api_wrapper.get_sell_orders()
+    half = orders[:max(1, len(orders) // 2)]
+    base_amount = sum(api_wrapper.get_order_amount(order) for order in half)
+    counter_amount = sum(api_wrapper.get_order_price(order) * api_wrapper.get_order_amount(order)
+            for order in half
+    )
+    order_price = api_wrapper.get_order_price(half[-1])
+
+    yield 'get_buy_orders', params, api_wrapper.get_buy_orders
+    yield 'get_sell_orders', params, api_wrapper.get_sell_orders
+    yield 'get_buy_levels', params, api_wrapper.get_buy_levels
+    yield 'get_sell_levels', params, api_wrapper.get_sell_levels
+
+    # depthの解析を含む計測と、スナップショットを使い回す(注文計画のみの)計測
+    cached_api_wrapper = make_offline_wrapper(
+            exchange_name, payload, depth_max_age=float('inf'), depth_cache=DepthCache()
+    )
+    for suffix, target in (('', api_wrapper), ('.cached', cached_api_wrapper)):
+        yield 'get_order_plan_with_base_amount' + suffix, params \
+                , lambda target=target: api_coordinator.get_order_plan_with_base_amount(
+                        target, True, base_amount
+                )
+        yield 'get_order_plan_with_order' + suffix, params \
+                , lambda target=target: api_coordinator.get_order_plan_with_order(
+                        target, True, order_price, base_amount
+                )
+        yield 'get_order_plan_with_counter_amount' + suffix, params \
+                , lambda target=target: api_coordinator.get_order_plan_with_counter_amount(
+                        target, True, counter_amount
+                )
+
+    # 複数の注文数の計画(1件ずつ計画する場合と、1つの注文一覧で一括して計画する場合)
+    ladder = [base_amount * ratio for ratio in (0.01, 0.05, 0.1, 0.5, 1.0)]
+    yield 'quote_ladder.each.cached', params, lambda: [
+            api_coordinator.get_order_plan_with_base_amount(cached_api_wrapper, True, amount)
+            for amount in ladder
+    ]
+    yield 'quote_ladder.batch.cached', params \
+            , lambda: order_book.get_order_plans_with_base_amount(cached_api_wrapper, True, ladder)
+
+    # 累積和の索引による平均約定価格、約定可能数量の参照
+    yield 'depth_index.get_vwap.cached', params \
+            , lambda: depth_index.get_depth_index(cached_api_wrapper, True).get_vwap(base_amount)
+    yield 'depth_index.get_amount_within.cached', params \
+            , lambda: depth_index.get_depth_index(cached_api_wrapper, True).get_amount_within(
+                    order_price
+            )
+
+def iter_cases(pattern=None):
+    '''
+    計測対象を (名前, パラメータ, 関数) で得る
+    '''
+    cases = [__calculation_cases()]
+    for exchange_name in sorted(MARKETS):
+        for size_name in sorted(SIZES, key=SIZES.get):
+            cases.append(__depth_cases(exchange_name, size_name))
+
+    for case in cases:
+        for name, params, func in case:
+            if pattern is None or pattern in name:
+                yield name, params, func
+
+def get_case_key(result):
+    '''
+    前回の結果と突き合わせるキーを得る
+    '''
+    return (result['name'], result.get('exchange'), result.get('size'))
+
+def compare(results, baseline_path):
+    '''
+    前回の結果と比較する(比率が1未満であれば速くなっている)
+    '''
+    with open(baseline_path) as f:
+        baseline = dict((get_case_key(r), r) for r in map(json.loads, f) if 'name' in r)
+
+    lines = []
+    for result in results:
+        before = baseline.get(get_case_key(result))
+        if before is None:
+            continue
+
+        lines.append('%-40s %-12s %-7s %12.2f %12.2f %7.2f' % (
+                result['name'], result.get('exchange', ''), result.get('size', '')
+                , before['min_us'], result['min_us'], result['min_us'] / before['min_us']
+        ))
+
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description=u'calculation、api_coordinator の処理時間を計測する')
+    parser.add_argument('-k', dest='pattern', help=u'名前にこの文字列を含む計測対象のみ実行する')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--compare', help=u'比較する前回の結果(JSON Lines)')
+    args = parser.parse_args()
+
+    # 実行環境
+    print json.dumps({
+            'python': platform.python_version(), 'platform': platform.platform()
+            , 'timestamp': time.time()
+    })
+
+    results = []
+    for name, params, func in iter_cases(args.pattern):
+        result = dict(params, name=name, **measure(func, args.repeat))
+        results.append(result)
+        print json.dumps(result, sort_keys=True)
+        sys.stdout.flush()
+
+    if args.compare:
+        # 比較結果は標準エラー出力に出す
+        print >> sys.stderr, '%-40s %-12s %-7s %12s %12s %7s' % (
+                'name', 'exchange', 'size', 'before[us]', 'after[us]', 'ratio'
+        )
+        for line in compare(results, args.compare):
+            print >> sys.stderr, line
+
+if __name__ == '__main__':
+    main()
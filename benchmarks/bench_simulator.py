@@ -0,0 +1,106 @@
+# -*- encoding:UTF-8 -*-
+import argparse, json, logging, os, platform, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'sample'))
+
+import api_coordinator
+from api_wrapper import get_api_wrapper
+from depth_cache import DepthCache
+from fixtures import MARKETS
+from simulator import ExchangeSimulator
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+取引所シミュレータ(simulator.py)に対する、APIラッパーの応答時間、処理件数を計測する
+- 通信はローカルのシミュレータとのみ行う
+- 結果は bench_hot_paths.py と同じく1行1件のJSONで出力する
+
+使い方:
+    python benchmarks/bench_simulator.py --depth 200 --latency 0.01 --jitter 0.005
+'''
+def measure(func, count):
+    '''
+    count回実行し、1回あたりの応答時間[ミリ秒]の分布と、1秒あたりの処理件数を得る
+    '''
+    latencies = []
+    start = time.time()
+    for i in xrange(count):
+        call_start = time.time()
+        func()
+        latencies.append((time.time() - call_start) * 1e3)
+    elapsed = time.time() - start
+
+    latencies.sort()
+    return {
+            'count': count, 'per_second': count / elapsed
+            , 'min_ms': latencies[0], 'median_ms': latencies[len(latencies) // 2]
+            , 'p90_ms': latencies[int(len(latencies) * 0.9)], 'max_ms': latencies[-1]
+    }
+
+def iter_cases(base_url, public_key, secret_key):
+    '''
+    計測対象を (名前, パラメータ, 関数) で得る
+    '''
+    for exchange_name, market in sorted(MARKETS.items()):
+        # 毎回depthを取得させるため、スナップショットは使い回さない
+        api_wrapper = get_api_wrapper(market.api_util_class)(
+                market, base_url=base_url, depth_max_age=-1, depth_cache=DepthCache()
+        )
+        params = {'exchange': exchange_name}
+
+        yield 'depth', params, api_wrapper.depth
+        yield 'get_sell_levels', params, api_wrapper.get_sell_levels
+        yield 'get_order_plan_with_base_amount', params \
+                , lambda api_wrapper=api_wrapper: api_coordinator.get_order_plan_with_base_amount(
+                        api_wrapper, True, api_wrapper.min_trade_amount * 10
+                )
+        yield 'get_balance', params \
+                , lambda api_wrapper=api_wrapper: api_coordinator.get_balance(
+                        api_wrapper, public_key, secret_key
+                )
+        yield 'order', params \
+                , lambda api_wrapper=api_wrapper: api_coordinator.order(
+                        api_wrapper, public_key, secret_key, True, 1, api_wrapper.min_trade_amount
+                )
+
+def main():
+    parser = argparse.ArgumentParser(description=u'取引所シミュレータに対するAPIラッパーの応答時間を計測する')
+    parser.add_argument('-k', dest='pattern', help=u'名前にこの文字列を含む計測対象のみ実行する')
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--depth', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    simulator = ExchangeSimulator(
+            depth=args.depth, latency=args.latency, jitter=args.jitter, seed=args.seed
+            , accounts={'public_key': 'secret_key'}
+    ).start()
+
+    # 実行環境、シミュレータの設定
+    print json.dumps({
+            'python': platform.python_version(), 'platform': platform.platform()
+            , 'timestamp': time.time(), 'depth': args.depth, 'latency': args.latency
+            , 'jitter': args.jitter, 'seed': args.seed
+    })
+
+    try:
+        for name, params, func in iter_cases(simulator.get_base_url(), 'public_key', 'secret_key'):
+            if args.pattern is not None and args.pattern not in name:
+                continue
+
+            result = dict(params, name=name, **measure(func, args.count))
+            print json.dumps(result, sort_keys=True)
+            sys.stdout.flush()
+
+    finally:
+        simulator.stop()
+
+if __name__ == '__main__':
+    main()
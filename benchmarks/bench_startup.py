@@ -0,0 +1,149 @@
+# -*- encoding:UTF-8 -*-
+import os, subprocess, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'sample'))
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+起動時間を計測する
+- モジュール毎に、新しいプロセスでの読み込み時間を計測する
+- 取引所毎に、新しいプロセスで api_wrapper を読み込んでから、
+  取引所シミュレータ(simulator.py)から最初のdepthを取得するまでの時間を計測する
+- 計測するプロセスでは、計測が終わるまで計測対象以外のモジュールを読み込まない
+- 結果は bench_hot_paths.py と同じく1行1件のJSONで出力する
+
+使い方:
+    python benchmarks/bench_startup.py --repeat 10
+'''
+# 読み込み時間を計測するモジュール
+MODULES = ('calculation', 'api_wrapper', 'api_coordinator', 'depth_index', 'order_book')
+
+class StartupMarket(object):
+    '''
+    計測用の市場情報(models.Market と同じ属性を持つ)
+    '''
+    def __init__(self, exchange_name, base_currency, counter_currency, fee
+            , min_price_unit, min_trade_amount, min_trade_unit, api_util_class
+    ):
+        self.exchange_name = exchange_name
+        self.api_available_span = 0
+        self.base_currency = base_currency
+        self.counter_currency = counter_currency
+        self.fee = float(fee)
+        self.bid_fee_is_gain = True
+        self.ask_fee_is_gain = True
+        self.min_price_unit = int(min_price_unit)
+        self.min_trade_amount = float(min_trade_amount)
+        self.min_trade_unit = int(min_trade_unit)
+        self.api_util_class = api_util_class
+
+def measure_import(module_name):
+    '''
+    (計測するプロセスで実行する)モジュールの読み込み時間を計測する
+    '''
+    start = time.time()
+    __import__(module_name)
+    elapsed = time.time() - start
+
+    return {'import_ms': elapsed * 1e3, 'module_num': len(sys.modules)}
+
+def measure_first_depth(base_url, *market_args):
+    '''
+    (計測するプロセスで実行する)api_wrapper の読み込みから、最初のdepthの取得、丸めまでの時間を計測する
+    '''
+    start = time.time()
+    import api_wrapper
+    imported = time.time()
+
+    market = StartupMarket(*market_args)
+    api_wrapper.get_api_wrapper(market.api_util_class)(market, base_url=base_url).get_sell_levels()
+    fetched = time.time()
+
+    return {
+            'import_ms': (imported - start) * 1e3, 'first_depth_ms': (fetched - imported) * 1e3
+            , 'total_ms': (fetched - start) * 1e3, 'module_num': len(sys.modules)
+    }
+
+def run_child(*args):
+    '''
+    新しいプロセスで計測し、結果を得る
+    '''
+    import json
+
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--child'] + [
+            str(arg) for arg in args
+    ])
+    return json.loads(output)
+
+def summarize(results):
+    '''
+    繰り返し計測した結果から、各値の最小値、中央値を得る
+    '''
+    summary = {}
+    for key in results[0]:
+        values = sorted(result[key] for result in results)
+        if key.endswith('_ms'):
+            summary[key[:-3] + '_min_ms'] = values[0]
+            summary[key[:-3] + '_median_ms'] = values[len(values) // 2]
+        else:
+            summary[key] = values[-1]
+
+    return summary
+
+def main():
+    import argparse, json, platform
+
+    from fixtures import MARKETS
+    from simulator import ExchangeSimulator
+
+    parser = argparse.ArgumentParser(description=u'モジュールの読み込み時間、最初のdepth取得までの時間を計測する')
+    parser.add_argument('-k', dest='pattern', help=u'名前にこの文字列を含む計測対象のみ実行する')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--depth', type=int, default=200)
+    args = parser.parse_args()
+
+    print json.dumps({
+            'python': platform.python_version(), 'platform': platform.platform()
+            , 'timestamp': time.time(), 'repeat': args.repeat, 'depth': args.depth
+    })
+
+    cases = [('import.' + module_name, {}, ('import', module_name)) for module_name in MODULES]
+
+    simulator = ExchangeSimulator(depth=args.depth).start()
+    try:
+        for exchange_name, market in sorted(MARKETS.items()):
+            cases.append(('first_depth', {'exchange': exchange_name}, (
+                    'depth', simulator.get_base_url(), market.exchange_name
+                    , market.base_currency, market.counter_currency, market.fee
+                    , market.min_price_unit, market.min_trade_amount, market.min_trade_unit
+                    , market.api_util_class
+            )))
+
+        for name, params, child_args in cases:
+            if args.pattern is not None and args.pattern not in name:
+                continue
+
+            results = [run_child(*child_args) for i in xrange(args.repeat)]
+            print json.dumps(dict(params, name=name, **summarize(results)), sort_keys=True)
+            sys.stdout.flush()
+
+    finally:
+        simulator.stop()
+
+def child_main(args):
+    '''
+    計測するプロセスの処理(結果のJSONは計測が終わってから作成する)
+    '''
+    result = measure_import(*args[1:]) if args[0] == 'import' else measure_first_depth(*args[1:])
+
+    import json
+    print json.dumps(result)
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child_main(sys.argv[2:])
+    else:
+        main()
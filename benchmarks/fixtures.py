@@ -0,0 +1,184 @@
+# -*- encoding:UTF-8 -*-
+import argparse, json, logging, os, random, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'sample'))
+
+import constants
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+ベンチマーク用のdepthデータ
+- 記録したdepthデータ(fixtures/<取引所名>-<サイズ>.json)を使用する
+- 同梱の fixtures/ は、各取引所の形式で決まった乱数系列から作成したものであり、取引所APIの記録ではない
+  (対象の取引所APIから取得できないため。取得できる環境では --live で取引所APIの記録に置き換える)
+- 記録が無い場合は、同じ乱数系列から作成する(警告を出力する)
+'''
+# depthデータを記録するディレクトリ
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# 板の厚さ(片側の注文数)
+SIZES = {'small': 10, 'medium': 200, 'deep': 5000}
+
+class BenchMarket(object):
+    '''
+    ベンチマーク用の市場情報(models.Market と同じ属性を持つ)
+    '''
+    def __init__(self, exchange_name, base_currency, counter_currency, fee
+            , min_price_unit, min_trade_amount, min_trade_unit, api_util_class
+    ):
+        self.exchange_name = exchange_name
+        self.api_available_span = 0
+        self.base_currency = base_currency
+        self.counter_currency = counter_currency
+        self.fee = fee
+        self.bid_fee_is_gain = True
+        self.ask_fee_is_gain = True
+        self.min_price_unit = min_price_unit
+        self.min_trade_amount = min_trade_amount
+        self.min_trade_unit = min_trade_unit
+        self.api_util_class = api_util_class
+
+# 取引所名 -> ベンチマーク用の市場情報
+MARKETS = {
+        constants.MARKET_ALLCOIN: BenchMarket(
+                constants.MARKET_ALLCOIN, 'DOGE', 'BTC', 0.2, 8, 1, 0, 'AllCoinApiWrapper'
+        )
+        , constants.MARKET_BTCBOX: BenchMarket(
+                constants.MARKET_BTCBOX, 'BTC', 'JPY', 0.1, 0, 0.001, 3, 'BtcBoxApiWrapper'
+        )
+        , constants.MARKET_ETWINGS: BenchMarket(
+                constants.MARKET_ETWINGS, 'BTC', 'JPY', 0.1, 0, 0.0001, 4, 'EtwingsApiWrapper'
+        )
+}
+
+def __generate_side(rnd, size, best_price, tick, is_ask, amount_digits):
+    '''
+    片側の注文一覧を (価格, 数量) の一覧で作成する(約定させる順)
+    '''
+    levels = []
+    price = best_price
+    for i in xrange(size):
+        levels.append((price, round(rnd.expovariate(1.0), amount_digits)))
+        step = tick * rnd.randint(1, 3)
+        price = price + step if is_ask else price - step
+
+    return levels
+
+def generate_payload(exchange_name, size, seed=0):
+    '''
+    取引所の形式でdepthデータを作成する
+    '''
+    rnd = random.Random('%s-%s-%s' % (exchange_name, size, seed))
+
+    if exchange_name == constants.MARKET_ALLCOIN:
+        # 価格は文字列、数量は数値のオブジェクト
+        asks = __generate_side(rnd, size, 66, 1, True, 4)
+        bids = __generate_side(rnd, size, 65, 1, False, 4)
+        return json.dumps({'code': 1, 'data': {
+                'sell': [{'price': '%.8f' % (price * 1e-8), 'amount': amount * 1e6}
+                        for price, amount in asks
+                ]
+                , 'buy': [{'price': '%.8f' % (price * 1e-8), 'amount': amount * 1e6}
+                        for price, amount in bids
+                ]
+        }})
+
+    if exchange_name == constants.MARKET_BTCBOX:
+        # 売り注文、買い注文ともに価格の降順
+        asks = __generate_side(rnd, size, 30010, 1, True, 3)
+        bids = __generate_side(rnd, size, 30000, 1, False, 3)
+        return json.dumps({
+                'asks': [[price, amount] for price, amount in reversed(asks)]
+                , 'bids': [[price, amount] for price, amount in bids]
+        })
+
+    if exchange_name == constants.MARKET_ETWINGS:
+        # 売り注文は価格の昇順、買い注文は価格の降順
+        asks = __generate_side(rnd, size, 30010, 5, True, 4)
+        bids = __generate_side(rnd, size, 30000, 5, False, 4)
+        return json.dumps({
+                'asks': [[price, amount] for price, amount in asks]
+                , 'bids': [[price, amount] for price, amount in bids]
+        })
+
+    raise ValueError('unknown exchange_name=%s' % exchange_name)
+
+def get_fixture_path(exchange_name, size_name, fixtures_dir=FIXTURES_DIR):
+    '''
+    記録したdepthデータのパスを得る
+    '''
+    return os.path.join(fixtures_dir, '%s-%s.json' % (exchange_name, size_name))
+
+def load_payload(exchange_name, size_name, fixtures_dir=FIXTURES_DIR):
+    '''
+    depthデータを得る(記録が無い場合は作成する)
+    '''
+    path = get_fixture_path(exchange_name, size_name, fixtures_dir)
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    logger.warning('depth fixture not found, generated instead. path=%s', path)
+    return generate_payload(exchange_name, SIZES[size_name])
+
+def make_offline_wrapper(exchange_name, payload, **kwargs):
+    '''
+    depth() がdepthデータを返す、通信しないAPIラッパーを作成する
+    '''
+    from api_wrapper import get_api_wrapper
+
+    market = MARKETS[exchange_name]
+    api_wrapper_class = get_api_wrapper(market.api_util_class)
+
+    class OfflineApiWrapper(api_wrapper_class):
+        def depth(self):
+            return payload
+
+    return OfflineApiWrapper(market, **kwargs)
+
+def record(exchange_name, size_name, market, fixtures_dir=FIXTURES_DIR):
+    '''
+    取引所APIよりdepthを取得し、記録する
+    '''
+    from api_wrapper import get_api_wrapper
+
+    payload = get_api_wrapper(market.api_util_class)(market).depth()
+    if not os.path.isdir(fixtures_dir):
+        os.makedirs(fixtures_dir)
+
+    path = get_fixture_path(exchange_name, size_name, fixtures_dir)
+    with open(path, 'wb') as f:
+        f.write(payload.encode('utf-8'))
+
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description=u'ベンチマーク用のdepthデータを記録する')
+    parser.add_argument('--live', action='store_true'
+            , help=u'取引所APIから取得する(省略時は作成したデータを保存する)'
+    )
+    parser.add_argument('--dir', default=FIXTURES_DIR)
+    args = parser.parse_args()
+
+    for exchange_name, market in sorted(MARKETS.items()):
+        if args.live:
+            # 実際の板は1種類のため、deep として記録する
+            print record(exchange_name, 'deep', market, args.dir)
+            continue
+
+        for size_name, size in sorted(SIZES.items()):
+            if not os.path.isdir(args.dir):
+                os.makedirs(args.dir)
+
+            path = get_fixture_path(exchange_name, size_name, args.dir)
+            with open(path, 'wb') as f:
+                f.write(generate_payload(exchange_name, size))
+            print path
+
+if __name__ == '__main__':
+    main()
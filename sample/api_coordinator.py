@@ -1,7 +1,9 @@
 # -*- encoding:UTF-8 -*-
-import logging
+from collections import namedtuple
+from itertools import chain
+import logging, time
 
-import calculation, constants
+import calculation
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +15,33 @@ Created on 2015/02/11
 - 処理速度を高めるため、if文の使用は控えたい
 - 全ての取引所APIに対し、画一的なインタフェースでアクセス可能にすること
 '''
+def get_currency_deltas(api_wrapper, is_buy_order, base_amount, counter_amount):
+    '''
+    約定を見込める注文の 基本通貨、相対通貨の取引数量(手数料未計算) から、
+    手数料を考慮した各通貨の増減数量を得る
+    api_wrapper: 市場情報
+    is_buy_order: 買い注文かどうか
+    base_amount: 基本通貨の取引数量
+    counter_amount: 相対通貨の取引数量
+    '''
+    # TODO: 切り上げ、切り捨ての桁は何を基準に設定すればいい？
+    return {
+            api_wrapper.base_currency:
+                    calculation.kiri_sute(
+                            api_wrapper.get_buy_order_gain(base_amount), 8
+                    ) if is_buy_order \
+                    else - calculation.kiri_age(
+                            api_wrapper.get_sell_order_pay(base_amount), 8
+                    )
+            , api_wrapper.counter_currency:
+                    - calculation.kiri_age(
+                            api_wrapper.get_buy_order_pay(counter_amount), 8
+                    ) if is_buy_order \
+                    else calculation.kiri_sute(
+                            api_wrapper.get_sell_order_gain(counter_amount), 8
+                    )
+    }
+
 def __get_order_with_base_amount(
         api_wrapper, price, amount, is_buy_order, order_price
         , fraction, order_list, left_amount, counter_sum
@@ -75,7 +104,32 @@ def __get_order_with_order(
 
     return fraction, order_list, left_amount, counter_sum
 
-def __get_order_plan(api_wrapper, is_buy_order, order_price, order_amount, get_order):
+def __start_planner(levels):
+    '''
+    計測する場合に、注文一覧の計算の開始前に最初の注文を取り出しておく
+    (depthの解析、並べ替えの準備は json_decode_seconds、depth_sort_seconds に集計され、
+     planner_seconds に重ねて集計しないため)
+    戻り値: (最初の注文を含む注文一覧のイテレータ, 計算の開始時刻)
+    '''
+    levels = iter(levels)
+    first = next(levels, None)
+    if first is not None:
+        levels = chain((first, ), levels)
+
+    return levels, time.time()
+
+def __record_planner(api_wrapper, planner_name, start, level_num):
+    '''
+    注文一覧の計算の所要時間、参照した注文数を集計する
+    (depthの取得、解析、並べ替えの準備を除き、参照した注文の取り出し、丸めを含む)
+    '''
+    labels = api_wrapper.get_metric_labels(planner_name)
+    api_wrapper.metrics.observe('planner_seconds', labels, time.time() - start)
+    api_wrapper.metrics.increment('planner_levels_total', labels, level_num)
+
+def __get_order_plan(api_wrapper, is_buy_order, order_price, order_amount, get_order, max_age
+        , planner_name
+):
     '''
     注文情報から、約定を見込める(買い|売り)注文の一覧、各通貨の増減数量 を得る
     api_wrapper: 市場情報
@@ -83,21 +137,30 @@ def __get_order_plan(api_wrapper, is_buy_order, order_price, order_amount, get_o
     order_price: 注文価格
     order_amount: 注文数
     get_order: 注文を取得する関数
+    max_age: 許容するdepthスナップショットの経過時間[秒]
+    planner_name: 集計に使用する名前
     '''
     # APIよりdepthを取得し、
     # 発注する注文一覧、注文可能数量、相対通貨数量(手数料未計算)を得る
+    levels = api_wrapper.iter_sell_levels(max_age) if is_buy_order \
+            else api_wrapper.iter_buy_levels(max_age)
+    start = None
+    if api_wrapper.metrics.enabled:
+        levels, start = __start_planner(levels)
+    level_num = 0
+
     fraction = 0
     order_list = []
     left_amount = order_amount
     counter_sum = 0
-    for order in api_wrapper.get_sell_orders() if is_buy_order else api_wrapper.get_buy_orders():
+    for price, amount in levels:
+        level_num += 1
         if left_amount < api_wrapper.min_trade_amount:
             # 残りの注文数量が最低注文数量に満たない場合
             break
 
-        logger.debug('order=%s', order)
-        price = api_wrapper.get_order_price(order)
-        amount = fraction + api_wrapper.get_order_amount(order)
+        logger.debug('price=%s, amount=%s', price, amount)
+        amount += fraction
 
         pre_fraction = fraction
         pre_counter_sum = counter_sum
@@ -114,6 +177,9 @@ def __get_order_plan(api_wrapper, is_buy_order, order_price, order_amount, get_o
             # 注文が取得出来ない場合
             break
 
+    if start is not None:
+        __record_planner(api_wrapper, planner_name, start, level_num)
+
     # 注文一覧、注文可能数量、相対通貨数量(手数料未計算)
     orderable = order_amount - left_amount
     logger.debug('order_list=%s, orderable=%s, counter_sum=%s'
@@ -121,48 +187,35 @@ def __get_order_plan(api_wrapper, is_buy_order, order_price, order_amount, get_o
     )
 
     # 注文一覧、各通貨の増減数量 の順序で返す
-    # TODO: 切り上げ、切り捨ての桁は何を基準に設定すればいい？
-    return order_list \
-            , {
-                    api_wrapper.base_currency:
-                            calculation.kiri_sute(
-                                    api_wrapper.get_buy_order_gain(orderable), 8
-                            ) if is_buy_order \
-                            else - calculation.kiri_age(
-                                    api_wrapper.get_sell_order_pay(orderable), 8
-                            )
-                    , api_wrapper.counter_currency:
-                            - calculation.kiri_age(
-                                    api_wrapper.get_buy_order_pay(counter_sum), 8
-                            ) if is_buy_order \
-                            else calculation.kiri_sute(
-                                    api_wrapper.get_sell_order_gain(counter_sum), 8
-                            )
-            }
-
-def get_order_plan_with_base_amount(api_wrapper, is_buy_order, order_amount):
+    return order_list, get_currency_deltas(api_wrapper, is_buy_order, orderable, counter_sum)
+
+def get_order_plan_with_base_amount(api_wrapper, is_buy_order, order_amount, max_age=None):
     '''
     注文数から、約定を見込める(買い|売り)注文の一覧、各通貨の増減数量 を得る
     api_wrapper: 市場情報
     is_buy_order: 買い注文かどうか
     order_amount: 注文数
+    max_age: 許容するdepthスナップショットの経過時間[秒](省略時はapi_wrapperの既定値)
     '''
     # 注文一覧、取得数量、支払数量 の順序で返す
     return __get_order_plan(
             api_wrapper, is_buy_order, None, order_amount, __get_order_with_base_amount
+            , max_age, 'order_plan_with_base_amount'
     )
 
-def get_order_plan_with_order(api_wrapper, is_buy_order, order_price, order_amount):
+def get_order_plan_with_order(api_wrapper, is_buy_order, order_price, order_amount, max_age=None):
     '''
     注文から、約定を見込める(買い|売り)注文の一覧、各通貨の増減数量 を得る
     api_wrapper: 市場情報
     is_buy_order: 買い注文かどうか
     order_price: 注文価格
     order_amount: 注文数
+    max_age: 許容するdepthスナップショットの経過時間[秒](省略時はapi_wrapperの既定値)
     '''
     # 注文一覧、取得数量、支払数量 の順序で返す
     return __get_order_plan(
             api_wrapper, is_buy_order, order_price, order_amount, __get_order_with_order
+            , max_age, 'order_plan_with_order'
     )
 
 def __get_order_with_counter_amount(
@@ -185,9 +238,7 @@ def __get_order_with_counter_amount(
     elif left_amount <= price * amount:
         # 残りの相対通貨が注文に収まった場合
         fraction = 0
-        order_amount = calculation.kiri_sute(
-                left_amount / price, api_wrapper.min_trade_unit
-        )
+        order_amount = api_wrapper.trade_quantizer.kiri_sute(left_amount / price)
         order_list.append([price, order_amount])
         base_sum += order_amount
         left_amount = 0
@@ -201,23 +252,31 @@ def __get_order_with_counter_amount(
 
     return fraction, order_list, left_amount, base_sum
 
-def get_order_plan_with_counter_amount(api_wrapper, is_buy_order, counter_amount):
+def get_order_plan_with_counter_amount(api_wrapper, is_buy_order, counter_amount, max_age=None):
     '''
     相対通貨の数量から、約定を見込める(買い|売り)注文の一覧、各通貨の増減数量 を得る
     api_wrapper: 市場情報
     is_buy_order: 買い注文かどうか
     counter_amount: 相対通貨の数量
+    max_age: 許容するdepthスナップショットの経過時間[秒](省略時はapi_wrapperの既定値)
     '''
     # APIよりdepthを取得し、
     # 発注する注文一覧、注文可能数量、基本通貨数量(手数料未計算)を得る
+    levels = api_wrapper.iter_sell_levels(max_age) if is_buy_order \
+            else api_wrapper.iter_buy_levels(max_age)
+    start = None
+    if api_wrapper.metrics.enabled:
+        levels, start = __start_planner(levels)
+    level_num = 0
+
     fraction = 0
     order_list = []
     left_amount = counter_amount
     base_sum = 0
-    for order in api_wrapper.get_sell_orders() if is_buy_order else api_wrapper.get_buy_orders():
-        logger.debug('order=%s', order)
-        price = api_wrapper.get_order_price(order)
-        amount = fraction + api_wrapper.get_order_amount(order)
+    for price, amount in levels:
+        level_num += 1
+        logger.debug('price=%s, amount=%s', price, amount)
+        amount += fraction
 
         if left_amount < price * api_wrapper.min_trade_amount:
             # 残りの相対通貨で最小単位の注文が出来ない場合
@@ -237,6 +296,9 @@ def get_order_plan_with_counter_amount(api_wrapper, is_buy_order, counter_amount
             # 注文が取得出来ない場合
             break
 
+    if start is not None:
+        __record_planner(api_wrapper, 'order_plan_with_counter_amount', start, level_num)
+
     # 注文一覧、注文可能数量、基本通貨数量(手数料未計算)
     orderable = counter_amount - left_amount
     logger.debug('order_list=%s, orderable=%s, base_sum=%s'
@@ -244,76 +306,83 @@ def get_order_plan_with_counter_amount(api_wrapper, is_buy_order, counter_amount
     )
 
     # 注文一覧、各通貨の増減 の順序で返す
-    return order_list \
-            , {
-                    api_wrapper.base_currency:
-                            calculation.kiri_sute(
-                                    api_wrapper.get_buy_order_gain(base_sum), 8
-                            ) if is_buy_order \
-                            else - calculation.kiri_age(
-                                    api_wrapper.get_sell_order_pay(base_sum), 8
-                            )
-                    , api_wrapper.counter_currency:
-                            - calculation.kiri_age(
-                                    api_wrapper.get_buy_order_pay(orderable), 8
-                            ) if is_buy_order \
-                            else calculation.kiri_sute(
-                                    api_wrapper.get_sell_order_gain(orderable), 8
-                            )
-            }
+    return order_list, get_currency_deltas(api_wrapper, is_buy_order, base_sum, orderable)
+
+# 市場毎のdepth取得結果
+# buy_orders: 買い注文一覧(価格の降順)
+# sell_orders: 売り注文一覧(価格の昇順)
+# timestamp: depthの取得時刻
+# latency: 取得に要した時間[秒](API使用可能になるまでの待ち時間を含む)
+# error: 取得に失敗した場合の例外
+DepthFetchResult = namedtuple('DepthFetchResult'
+        , 'api_wrapper buy_orders sell_orders timestamp latency error'
+)
+
+def __fetch_depth(args):
+    '''
+    1市場のdepthを取得する
+    '''
+    api_wrapper, max_age = args
+
+    start = time.time()
+    try:
+        snapshot = api_wrapper.get_depth_snapshot(max_age)
+        return DepthFetchResult(
+                api_wrapper
+                , api_wrapper.sort_buy_orders(snapshot.bids)
+                , api_wrapper.sort_sell_orders(snapshot.asks)
+                , snapshot.timestamp, time.time() - start, None
+        )
 
-def get_balance(api_wrapper, public_key, secret_key):
+    except Exception as e:
+        logger.exception('depth fetch failed. exchange_name=%s', api_wrapper.exchange_name)
+        return DepthFetchResult(api_wrapper, None, None, None, time.time() - start, e)
+
+def fetch_depths(api_wrappers, max_age=None, pool=None):
     '''
-    残高取得
+    複数市場のdepthを並行して取得する
+    api_wrappers: 市場情報の一覧
+    max_age: 許容するdepthスナップショットの経過時間[秒](省略時は各api_wrapperの既定値)
+    pool: 取得に使用するスレッドプール(省略時は市場数分のスレッドを作成する)
     '''
-    # 取引所API IF と引き当てる
-    if api_wrapper.exchange_name == constants.MARKET_ALLCOIN:
-        func = api_wrapper.account_info
+    # 全体の所要時間は、最も遅い市場の所要時間となる
+    own_pool = pool is None
+    if own_pool:
+        # multiprocessingは起動時に読み込まないよう、必要な場合のみ読み込む
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(max(1, len(api_wrappers)))
 
-    elif api_wrapper.exchange_name == constants.MARKET_BTCBOX:
-        func = api_wrapper.account_balance
+    try:
+        # api_wrappers と同じ順序で返す
+        return pool.map(__fetch_depth, [(api_wrapper, max_age) for api_wrapper in api_wrappers])
 
-    elif api_wrapper.exchange_name == constants.MARKET_ETWINGS:
-        func = api_wrapper.get_info
+    finally:
+        if own_pool:
+            pool.close()
 
-    # TODO: 結果を画一化して返却
-    result = func(public_key, secret_key)
+def get_balance(api_wrapper, public_key, secret_key):
+    '''
+    残高取得
+    結果は api_wrapper.Balance で返す
+    '''
+    result = api_wrapper.get_balance(public_key, secret_key)
     logger.debug(result)
+    return result
 
 def order(api_wrapper, public_key, secret_key, is_buy_order, price, amount):
     '''
     発注
+    結果は api_wrapper.OrderAck で返す
     '''
-    # 取引所API IF と引き当てる
-    if api_wrapper.exchange_name == constants.MARKET_ALLCOIN:
-        func = api_wrapper.buy_coin if is_buy_order else api_wrapper.sell_coin
-
-    elif api_wrapper.exchange_name == constants.MARKET_BTCBOX:
-        func = api_wrapper.trade_add
-
-    elif api_wrapper.exchange_name == constants.MARKET_ETWINGS:
-        func = api_wrapper.trade
-
-    # TODO: 結果を画一化して返却
-    result = func(public_key, secret_key, is_buy_order, price, amount) \
-            if not api_wrapper.exchange_name == constants.MARKET_ALLCOIN \
-            else func(public_key, secret_key, price, amount)
+    result = api_wrapper.place_order(public_key, secret_key, is_buy_order, price, amount)
     logger.debug(result)
+    return result
 
 def cancel_order(api_wrapper, public_key, secret_key, order):
     '''
     注文取消
+    結果は api_wrapper.CancelAck で返す
     '''
-    # 取引所API IF と引き当てる
-    if api_wrapper.exchange_name == constants.MARKET_ALLCOIN:
-        func = api_wrapper.cancel_order
-
-    elif api_wrapper.exchange_name == constants.MARKET_BTCBOX:
-        func = api_wrapper.trade_cancel
-
-    elif api_wrapper.exchange_name == constants.MARKET_ETWINGS:
-        func = api_wrapper.cancel_order
-
-    # TODO: 結果を画一化して返却
-    result = func(public_key, secret_key, order)
+    result = api_wrapper.cancel(public_key, secret_key, order)
     logger.debug(result)
+    return result
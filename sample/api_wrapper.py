@@ -1,11 +1,17 @@
 # -*- encoding:UTF-8 -*-
 from abc import ABCMeta, abstractmethod
-import hashlib, hmac, json, logging, time
-
-import requests
-
-import calculation
+from collections import namedtuple
+from itertools import imap, islice
+from operator import ge, itemgetter, le
+from urlparse import urlparse
+import heapq, logging, threading, time
+
+import calculation, json_decoder, rate_limiter
+from depth_cache import DepthLevel, DepthSnapshot, shared_depth_cache
+from metrics import shared_metrics
 from reflection import class_for_name
+from signer import AllCoinSigner, BtcBoxSigner, EtwingsSigner, as_signer
+from transport import get_shared_transport
 
 logger = logging.getLogger(__name__)
 
@@ -16,11 +22,79 @@ Created on 2015/02/11
 
 APIラッパー
 '''
+# クラス名 -> APIラッパーのクラス
+__api_wrapper_classes = {}
+__api_wrapper_classes_lock = threading.Lock()
+
+def register_api_wrapper(wrapper_class, class_name=None):
+    '''
+    APIラッパーのクラスを登録する
+    class_name: 登録するクラス名(省略時はクラスの名前)
+    '''
+    if not (isinstance(wrapper_class, type) and issubclass(wrapper_class, BaseApiWrapper)) \
+            or wrapper_class.__abstractmethods__:
+        raise RuntimeError, u"APIラッパーには BaseApiWrapper の具象サブクラスを指定してください。"
+
+    with __api_wrapper_classes_lock:
+        __api_wrapper_classes[class_name or wrapper_class.__name__] = wrapper_class
+
+    return wrapper_class
+
 def get_api_wrapper(class_name):
     '''
     stringのクラス名からclassを得る
+    登録済みのクラスを返し、未登録の場合はこのモジュールから探して登録する
+    '''
+    wrapper_class = __api_wrapper_classes.get(class_name)
+    if wrapper_class is None:
+        wrapper_class = register_api_wrapper(class_for_name(__name__, class_name), class_name)
+
+    return wrapper_class
+
+def validate_api_wrappers(class_names):
+    '''
+    全てのクラス名がAPIラッパーのクラスとして解決できることを検証する(起動時に使用する)
+    解決できないクラス名があれば、それらを列挙して例外を送出する
+    '''
+    errors = []
+    for class_name in set(class_names):
+        try:
+            get_api_wrapper(class_name)
+
+        except (ImportError, AttributeError, RuntimeError) as e:
+            errors.append(u'%s: %s' % (class_name, unicode(e)))
+
+    if errors:
+        raise RuntimeError, u"APIラッパーのクラスを解決できません。 " + u', '.join(sorted(errors))
+
+# 最後に発行したnonce
+__last_nonce = [0]
+__nonce_lock = threading.Lock()
+
+def make_nonce():
+    '''
+    nonceを発行する(UNIX時間[秒]、プロセス内で単調増加)
+    同じ秒に複数発行した場合は、前回の値に1を加えた値とする
     '''
-    return class_for_name(__name__, class_name)
+    with __nonce_lock:
+        nonce = max(int(time.time()), __last_nonce[0] + 1)
+        __last_nonce[0] = nonce
+
+    return str(nonce)
+
+# 画一化した認証APIの結果
+# success: 成功したかどうか
+# error: 失敗した場合のエラー内容(成功した場合はNone)
+# 残高
+# available: 通貨(大文字) -> 使用可能な数量
+# locked: 通貨(大文字) -> 注文中等で使用できない数量
+Balance = namedtuple('Balance', 'success available locked error')
+# 発注結果
+# order_id: 注文ID(文字列)
+OrderAck = namedtuple('OrderAck', 'success order_id error')
+# 注文取消結果
+# order_id: 取り消した注文ID(文字列)
+CancelAck = namedtuple('CancelAck', 'success order_id error')
 
 class BaseApiWrapper():
     '''
@@ -28,10 +102,29 @@ class BaseApiWrapper():
     '''
     __metaclass__ = ABCMeta
 
-    # APIの前回呼び出し時刻
-    last_api_use = None
+    # depth情報での 買い注文一覧、売り注文一覧 のキーの経路
+    DEPTH_BIDS_PATH = ('bids',)
+    DEPTH_ASKS_PATH = ('asks',)
+
+    # 取引所が注文一覧を約定させる順(買い注文は価格の降順、売り注文は価格の昇順)で返すかどうか
+    # Trueの場合も、スナップショット毎に並び順を検証してから使用する
+    DEPTH_BIDS_SORTED = False
+    DEPTH_ASKS_SORTED = False
+
+    # 認証が必要なAPIの署名クラス
+    SIGNER_CLASS = None
 
-    def __init__(self, market_instance):
+    # APIのURLのスキーム、ホスト部分
+    BASE_URL = None
+
+    def __init__(self, market_instance, transport=None, depth_cache=None, depth_max_age=None
+            , base_url=None, metrics=None, hedge_policy=None
+    ):
+        '''
+        base_url: APIのURLのスキーム、ホスト部分(省略時は取引所のURL、シミュレータ等に向ける場合に指定する)
+        metrics: 処理時間等の集計先(省略時は全てのAPIラッパーで共有する集計先)
+        hedge_policy: depth取得等の冪等なリクエストのヘッジ、再試行の方針(hedging.HedgePolicy、省略時は行わない)
+        '''
         self.exchange_name = market_instance.exchange_name
         self.api_available_span = market_instance.api_available_span
         self.base_currency = market_instance.base_currency
@@ -43,40 +136,123 @@ class BaseApiWrapper():
         self.min_trade_amount = market_instance.min_trade_amount
         self.min_trade_unit = market_instance.min_trade_unit
 
-        self.last_api_use = time.time() - self.api_available_span
-        logger.debug(self.last_api_use)
+        # 価格、数量の丸め処理
+        self.price_quantizer = calculation.get_quantizer(self.min_price_unit)
+        self.trade_quantizer = calculation.get_quantizer(self.min_trade_unit)
+
+        # HTTPトランスポート(未指定の場合は取引所単位で共有する)
+        self.transport = transport or get_shared_transport(self.exchange_name)
+
+        # depthスナップショットのキャッシュ(未指定の場合は全市場で共有する)
+        self.depth_cache = depth_cache or shared_depth_cache
+
+        # depthスナップショットの有効期間[秒](未指定の場合はAPI使用可能間隔)
+        self.depth_max_age = self.api_available_span if depth_max_age is None else depth_max_age
+
+        self.base_url = base_url or self.BASE_URL
+
+        # APIのホスト(市場を識別するキーに含め、シミュレータと取引所の市場を区別する)
+        self.api_host = urlparse(self.base_url).netloc if self.base_url else None
+
+        # 処理時間等の集計先(既定では無効)
+        self.metrics = metrics or shared_metrics
+
+        # 冪等なリクエストのヘッジ、再試行の方針
+        self.hedge_policy = hedge_policy
+
+    def get_metric_labels(self, endpoint):
+        '''
+        集計に使用するラベルの値(取引所、市場、エンドポイント)を得る
+        '''
+        return (self.exchange_name, self.base_currency + '_' + self.counter_currency, endpoint)
+
+    def record_response(self, url, r, start):
+        '''
+        HTTPリクエストの所要時間、受信したバイト数を集計する
+        '''
+        labels = self.get_metric_labels(urlparse(url).path)
+        self.metrics.observe('http_seconds', labels, time.time() - start)
+        self.metrics.increment('bytes_received_total', labels, len(r.content))
+
+    def get_rate_limiter(self, url, endpoint):
+        '''
+        APIの呼び出し間隔を制御するトークンバケットを得る
+        取引所ホスト、エンドポイント種別が同じであれば、全てのAPIラッパーで共有する
+        (補充間隔の既定値はAPI使用可能間隔)
+        '''
+        return rate_limiter.get_rate_limiter(
+                urlparse(url).netloc, endpoint, self.api_available_span
+        )
+
+    def get_signer(self, public_key, secret_key=None):
+        '''
+        認証が必要なAPIの署名を得る
+        public_key: 公開鍵、または署名(署名の場合、secret_keyは使用しない)
+        secret_key: 秘密鍵
+        '''
+        return as_signer(self.SIGNER_CLASS, public_key, secret_key)
+
+    def get_auth_rate_limiter(self):
+        '''
+        認証が必要なAPIのトークンバケットを得る
+        '''
+        return self.get_rate_limiter(self.get_auth_api_url(), rate_limiter.ENDPOINT_AUTH)
 
-    def __wait_for_use_api(self):
+    def __wait_for_use_api(self, url, endpoint):
         '''
         APIが使用可能になるまで待つ
         '''
-        # 前回のAPI呼び出しから経過した時間
-        time_from_last_use = time.time() - self.last_api_use
-        logger.debug('time_from_last_use=%s', time_from_last_use)
+        wait = self.get_rate_limiter(url, endpoint).acquire()
+        logger.debug('wait_for_use_api=%s', wait)
 
-        if time_from_last_use < self.api_available_span:
-            time.sleep(self.api_available_span - time_from_last_use)
+        if self.metrics.enabled:
+            self.metrics.observe(
+                    'rate_limit_wait_seconds', self.get_metric_labels(urlparse(url).path), wait
+            )
 
-    def send_get(self, url, **kwargs):
+    def __request_get(self, url, **kwargs):
         '''
-        GETリクエストを送信する
+        API使用可能になるまで待たずに、GETリクエストを送信する
         '''
-        self.__wait_for_use_api()
+        start = time.time() if self.metrics.enabled else None
+        r = self.transport.get(url, **kwargs)
+        if start is not None:
+            self.record_response(url, r, start)
+
+        return r
 
-        r = requests.get(url, **kwargs)
-        self.last_api_use = time.time()
+    def send_get(self, url, raw=False, idempotent=False, **kwargs):
+        '''
+        GETリクエストを送信する
+        raw: Trueの場合、レスポンスの本文を文字列にデコードせずbytesのまま返す
+        idempotent: 冪等なリクエスト(depth等)の場合True
+                    hedge_policyが指定されていれば、ヘッジ、再試行を行う
+        '''
+        if idempotent and self.hedge_policy is not None:
+            bucket = self.get_rate_limiter(url, rate_limiter.ENDPOINT_PUBLIC)
+            r = self.hedge_policy.call(
+                    urlparse(url).netloc
+                    , lambda: self.__request_get(url, **kwargs)
+                    , lambda: self.__wait_for_use_api(url, rate_limiter.ENDPOINT_PUBLIC)
+                    , bucket.try_acquire, bucket.get_wait
+            )
+        else:
+            self.__wait_for_use_api(url, rate_limiter.ENDPOINT_PUBLIC)
+            r = self.__request_get(url, **kwargs)
 
         logger.debug('GET Request sended.')
-        return r.text
+        return r.content if raw else r.text
 
     def send_post(self, url, data=None, json=None, **kwargs):
         '''
         POSTリクエストを送信する
         '''
-        self.__wait_for_use_api()
+        self.__wait_for_use_api(url, rate_limiter.ENDPOINT_AUTH)
 
-        r = requests.post(url, data, json, **kwargs)
-        self.last_api_use = time.time()
+        start = time.time() if self.metrics.enabled else None
+        r = self.transport.post(url, data, json, **kwargs)
+        if start is not None:
+            self.record_response(url, r, start)
 
         logger.debug('POST Request sended.')
         return r.text
@@ -88,34 +264,327 @@ class BaseApiWrapper():
         '''
         pass
 
+    @abstractmethod
+    def request_balance(self, public_key, secret_key):
+        '''
+        残高取得APIを実行し、レスポンスの本文を返す
+        '''
+        pass
+
+    @abstractmethod
+    def request_order(self, public_key, secret_key, is_buy_order, price, amount):
+        '''
+        発注APIを実行し、レスポンスの本文を返す
+        '''
+        pass
+
+    @abstractmethod
+    def request_cancel(self, public_key, secret_key, order_id):
+        '''
+        注文取消APIを実行し、レスポンスの本文を返す
+        '''
+        pass
+
+    @abstractmethod
+    def parse_balance(self, text):
+        '''
+        残高取得APIのレスポンスの本文を Balance にする
+        '''
+        pass
+
+    @abstractmethod
+    def parse_order_ack(self, text):
+        '''
+        発注APIのレスポンスの本文を OrderAck にする
+        '''
+        pass
+
+    @abstractmethod
+    def parse_cancel_ack(self, text):
+        '''
+        注文取消APIのレスポンスの本文を CancelAck にする
+        '''
+        pass
+
+    def load_auth_result(self, text):
+        '''
+        認証APIのレスポンスの本文を解析する(JSONのオブジェクトでない場合はNone)
+        '''
+        try:
+            result = json_decoder.loads(text)
+
+        except ValueError:
+            result = None
+
+        if not isinstance(result, dict):
+            logger.warning('invalid response. exchange_name=%s, text=%r'
+                    , self.exchange_name, text[:200]
+            )
+            return None
+
+        return result
+
+    @staticmethod
+    def format_order_id(order_id):
+        '''
+        注文IDを文字列にする(含まれていない場合はNone)
+        '''
+        return None if order_id is None else str(order_id)
+
+    def get_balance(self, public_key, secret_key):
+        '''
+        残高を Balance で得る
+        '''
+        return self.parse_balance(self.request_balance(public_key, secret_key))
+
+    def place_order(self, public_key, secret_key, is_buy_order, price, amount):
+        '''
+        発注し、結果を OrderAck で得る
+        '''
+        return self.parse_order_ack(
+                self.request_order(public_key, secret_key, is_buy_order, price, amount)
+        )
+
+    def cancel(self, public_key, secret_key, order_id):
+        '''
+        注文を取り消し、結果を CancelAck で得る
+        '''
+        return self.parse_cancel_ack(self.request_cancel(public_key, secret_key, order_id))
+
+    def get_market_key(self):
+        '''
+        市場を識別するキーを得る
+        (同じ市場でもAPIのホストが異なれば、depthキャッシュ、depthの取得を共有しない)
+        '''
+        return (self.exchange_name, self.base_currency, self.counter_currency, self.api_host)
+
+    def parse_depth(self, depth):
+        '''
+        depth情報を 買い注文一覧、売り注文一覧 に分ける
+        '''
+        depth = json_decoder.loads(depth)
+        return reduce(dict.__getitem__, self.DEPTH_BIDS_PATH, depth) \
+                , reduce(dict.__getitem__, self.DEPTH_ASKS_PATH, depth)
+
+    def parse_depth_side(self, depth, is_buy):
+        '''
+        depth情報から片側の注文一覧のみを得る(反対側は解析しない)
+        '''
+        if not self.metrics.enabled:
+            return json_decoder.extract(depth, self.DEPTH_BIDS_PATH if is_buy else self.DEPTH_ASKS_PATH)
+
+        start = time.time()
+        orders = json_decoder.extract(depth, self.DEPTH_BIDS_PATH if is_buy else self.DEPTH_ASKS_PATH)
+        self.metrics.observe(
+                'json_decode_seconds', self.get_metric_labels('bids' if is_buy else 'asks')
+                , time.time() - start
+        )
+        return orders
+
+    def create_depth_snapshot(self, depth):
+        '''
+        depth情報からスナップショットを作成する
+        注文一覧は参照された側のみ解析する
+        '''
+        return DepthSnapshot(payload=depth, parse_side=self.parse_depth_side)
+
+    def __fetch_depth_snapshot(self):
+        '''
+        APIよりdepthを取得し、スナップショットを作成する
+        '''
+        return self.create_depth_snapshot(self.depth())
+
+    def refresh_depth_snapshot(self, normalize=False):
+        '''
+        有効期間にかかわらずAPIよりdepthを取得し、スナップショットを保存する
+        (同じ市場を取得中の場合は、その結果を待つ)
+        normalize: Trueの場合、保存する前に両側の DepthLevel 一覧を作成しておく
+        '''
+        def fetch():
+            snapshot = self.__fetch_depth_snapshot()
+            if normalize:
+                snapshot.get_levels(True, self.normalize_buy_orders)
+                snapshot.get_levels(False, self.normalize_sell_orders)
+            return snapshot
+
+        return self.depth_cache.refresh(self.get_market_key(), fetch)
+
+    def refresh_depth_snapshot_sync(self, normalize=False):
+        '''
+        refresh_depth_snapshot を呼び出し、完了まで待つ
+        (depth_poller 等のスレッドから使用する。非同期APIラッパーではイベントループで取得する)
+        '''
+        return self.refresh_depth_snapshot(normalize)
+
+    def get_depth_snapshot(self, max_age=None):
+        '''
+        depthのスナップショットを得る
+        max_age: 許容するスナップショットの経過時間[秒](省略時はdepth_max_age)
+        '''
+        return self.depth_cache.get_or_fetch(
+                self.get_market_key()
+                , self.depth_max_age if max_age is None else max_age
+                , self.__fetch_depth_snapshot
+        )
+
     def get_order_price(self, order):
         '''
         depthの一注文の価格を得る
         '''
-        return calculation.kiri_sute(order[0], self.min_price_unit)
+        return self.price_quantizer.kiri_sute(order[0])
 
     def get_order_amount(self, order):
         '''
         depthの一注文の数量を得る
         '''
-        return calculation.kiri_sute(order[1], self.min_trade_unit)
+        return self.trade_quantizer.kiri_sute(order[1])
+
+    def get_raw_order_price(self, order):
+        '''
+        depthの一注文の丸める前の価格を得る(並び順の検証に使用する)
+        '''
+        return order[0]
+
+    def normalize_orders(self, orders):
+        '''
+        depthの注文一覧を、丸め済みの価格、数量を持つ DepthLevel の一覧にする
+        '''
+        get_order_price = self.get_order_price
+        get_order_amount = self.get_order_amount
+        return [DepthLevel(get_order_price(order), get_order_amount(order)) for order in orders]
+
+    def __record_sort(self, is_buy, start, level_num):
+        '''
+        注文一覧の丸め、並べ替えの所要時間、処理した注文数を集計する
+        '''
+        labels = self.get_metric_labels('bids' if is_buy else 'asks')
+        self.metrics.observe('depth_sort_seconds', labels, time.time() - start)
+        self.metrics.increment('depth_levels_total', labels, level_num)
+
+    def normalize_buy_orders(self, orders):
+        '''
+        買い注文一覧を DepthLevel にし、価格の降順に並べる
+        '''
+        start = time.time() if self.metrics.enabled else None
+        levels = tuple(sorted(self.normalize_orders(orders), key=itemgetter(0), reverse=True))
+        if start is not None:
+            self.__record_sort(True, start, len(levels))
+
+        return levels
+
+    def normalize_sell_orders(self, orders):
+        '''
+        売り注文一覧を DepthLevel にし、価格の昇順に並べる
+        '''
+        start = time.time() if self.metrics.enabled else None
+        levels = tuple(sorted(self.normalize_orders(orders), key=itemgetter(0)))
+        if start is not None:
+            self.__record_sort(False, start, len(levels))
+
+        return levels
+
+    def is_sorted_orders(self, orders, is_buy):
+        '''
+        注文一覧が約定させる順に並んでいるかどうか
+        '''
+        prices = map(self.get_raw_order_price, orders)
+        return all(imap(ge if is_buy else le, prices, islice(prices, 1, None)))
+
+    def iter_normalized_orders(self, orders, is_buy):
+        '''
+        注文一覧を DepthLevel にし、約定させる順に返す
+        - 取引所が並べ替え済みで返す場合は、その順序のまま返す
+        - それ以外は、価格のみを丸めてヒープを作り、参照された分だけ取り出す
+        いずれも normalize_buy_orders、normalize_sell_orders と同じ順序となる
+        '''
+        get_order_price = self.get_order_price
+        get_order_amount = self.get_order_amount
+
+        # 計測する場合は、並べ替えの準備の所要時間と、取り出した注文数を集計する
+        # (取り出した注文数は、途中までしか参照されない場合も含め、作成する毎に加える)
+        start = time.time() if self.metrics.enabled else None
+        if start is not None:
+            increment = self.metrics.increment
+            labels = self.get_metric_labels('bids' if is_buy else 'asks')
+
+        if (self.DEPTH_BIDS_SORTED if is_buy else self.DEPTH_ASKS_SORTED) \
+                and self.is_sorted_orders(orders, is_buy):
+            if start is not None:
+                self.__record_sort(is_buy, start, 0)
+
+            for order in orders:
+                if start is not None:
+                    increment('depth_levels_total', labels)
+                yield DepthLevel(get_order_price(order), get_order_amount(order))
+            return
+
+        # 同じ価格の注文は、元の順序で取り出す
+        sign = -1 if is_buy else 1
+        heap = [(sign * get_order_price(order), i) for i, order in enumerate(orders)]
+        heapq.heapify(heap)
+        if start is not None:
+            self.__record_sort(is_buy, start, 0)
+
+        while heap:
+            key, i = heapq.heappop(heap)
+            if start is not None:
+                increment('depth_levels_total', labels)
+            yield DepthLevel(sign * key, get_order_amount(orders[i]))
+
+    def sort_buy_orders(self, orders):
+        '''
+        買い注文一覧を価格の降順に並べる
+        '''
+        return sorted(orders, key=self.get_order_price, reverse=True)
 
-    def get_buy_orders(self):
+    def sort_sell_orders(self, orders):
+        '''
+        売り注文一覧を価格の昇順に並べる
+        '''
+        return sorted(orders, key=self.get_order_price)
+
+    def get_buy_orders(self, max_age=None):
         '''
         depthから買い注文一覧を得る
         '''
-        # 価格の降順
-        return sorted(json.loads(self.depth())['bids']
-                , key=self.get_order_price, reverse=True
-        )
+        return self.sort_buy_orders(self.get_depth_snapshot(max_age).bids)
 
-    def get_sell_orders(self):
+    def get_sell_orders(self, max_age=None):
         '''
         depthから売り注文一覧を得る
         '''
-        # 価格の昇順
-        return sorted(json.loads(self.depth())['asks']
-                , key=self.get_order_price
+        return self.sort_sell_orders(self.get_depth_snapshot(max_age).asks)
+
+    def get_buy_levels(self, max_age=None):
+        '''
+        depthから買い注文の DepthLevel 一覧(価格の降順)を得る
+        同じスナップショットでは丸め、並べ替えを1度しか行わない
+        '''
+        return self.get_depth_snapshot(max_age).get_levels(True, self.normalize_buy_orders)
+
+    def get_sell_levels(self, max_age=None):
+        '''
+        depthから売り注文の DepthLevel 一覧(価格の昇順)を得る
+        同じスナップショットでは丸め、並べ替えを1度しか行わない
+        '''
+        return self.get_depth_snapshot(max_age).get_levels(False, self.normalize_sell_orders)
+
+    def iter_buy_levels(self, max_age=None):
+        '''
+        depthから買い注文の DepthLevel を価格の降順に返すイテレータを得る
+        参照された分の注文のみ丸める
+        '''
+        return self.get_depth_snapshot(max_age).iter_levels(
+                True, lambda orders: self.iter_normalized_orders(orders, True)
+        )
+
+    def iter_sell_levels(self, max_age=None):
+        '''
+        depthから売り注文の DepthLevel を価格の昇順に返すイテレータを得る
+        参照された分の注文のみ丸める
+        '''
+        return self.get_depth_snapshot(max_age).iter_levels(
+                False, lambda orders: self.iter_normalized_orders(orders, False)
         )
 
     def get_buy_order_gain(self, amount):
@@ -147,11 +616,18 @@ class AllCoinApiWrapper(BaseApiWrapper):
     AllCoin.com APIラッパー
     https://www.allcoin.com/pub/api
     '''
+    DEPTH_BIDS_PATH = ('data', 'buy')
+    DEPTH_ASKS_PATH = ('data', 'sell')
+    DEPTH_BIDS_SORTED = True
+    DEPTH_ASKS_SORTED = True
+    SIGNER_CLASS = AllCoinSigner
+    BASE_URL = 'https://www.allcoin.com'
+
     def get_depth_url(self):
         '''
         depth取得URL
         '''
-        return 'https://www.allcoin.com/api2/orderbook/' \
+        return self.base_url + '/api2/orderbook/' \
                 + self.base_currency.upper() + '_' + self.counter_currency.upper()
 
     def depth(self):
@@ -187,46 +663,34 @@ class AllCoinApiWrapper(BaseApiWrapper):
             }
         }
         '''
-        return self.send_get(self.get_depth_url())
+        return self.send_get(self.get_depth_url(), raw=True, idempotent=True)
 
     def get_order_price(self, order):
         '''
         depthの一注文の価格を得る
         '''
-        return calculation.kiri_sute(float(order['price']), self.min_price_unit)
+        return self.price_quantizer.kiri_sute(float(order['price']))
 
     def get_order_amount(self, order):
         '''
         depthの一注文の数量を得る
         '''
-        return calculation.kiri_sute(order['amount'], self.min_trade_unit)
+        return self.trade_quantizer.kiri_sute(order['amount'])
 
-    def get_buy_orders(self):
+    def get_raw_order_price(self, order):
         '''
-        depthから買い注文一覧を得る
+        depthの一注文の丸める前の価格を得る(並び順の検証に使用する)
         '''
-        # 価格の降順
-        return sorted(json.loads(self.depth())['data']['buy']
-                , key=self.get_order_price, reverse=True
-        )
-
-    def get_sell_orders(self):
-        '''
-        depthから売り注文一覧を得る
-        '''
-        # 価格の昇順
-        return sorted(json.loads(self.depth())['data']['sell']
-                , key=self.get_order_price
-        )
+        return float(order['price'])
 
     def get_auth_api_url(self):
         '''
         Wallet API ( Authentication required)
         のURL取得
         '''
-        return 'https://www.allcoin.com/api2/auth_api/'
+        return self.base_url + '/api2/auth_api/'
 
-    def __add_sign(self, post_params):
+    def __add_sign(self, post_params, signer):
         '''
         All requests to the Wallet and Trading methods require authentication
         via a public and private API key pair.
@@ -235,34 +699,21 @@ class AllCoinApiWrapper(BaseApiWrapper):
         access_key    Your public key
         created       UTC timestamp
         sign          MD5 all your POST DATA( your parameters must be sorted from a~z)
+        (署名処理は signer.AllCoinSigner)
         '''
-        # 暗号化用の文字列を作成
-        for_sign = '&'.join(
-                [param_key + '=' + str(post_params[param_key])
-                        for param_key in sorted(post_params)
-                ]
-        )
-        logger.debug('for_sign=%s', for_sign)
-
-        # signを作成
-        sign = hashlib.md5(for_sign).hexdigest()
-        logger.debug('sign=%s', sign)
+        signer.sign(post_params)
 
-        return post_params.update({'sign': sign})
-
-    def __execute_auth_api(self, public_key, secret_key, method, post_params={}):
+    def __execute_auth_api(self, public_key, secret_key, method, post_params=None):
         '''
         Authenticationが必要なAPIを実行する
+        public_key: 公開鍵、または署名
         '''
         # 必須のPOSTパラメータを追加
-        # 秘密鍵もPOSTパラメータに混ぜるよく分からない方法
-        post_params.update({
-                'access_key': public_key, 'created': time.time(),
-                'method': method, 'secret_key': secret_key,
-        })
+        # 秘密鍵もPOSTパラメータに混ぜるよく分からない方法(access_key、secret_key は署名で追加する)
+        post_params = dict(post_params or {}, created=time.time(), method=method)
 
         # signの設定
-        self.__add_sign(post_params)
+        self.__add_sign(post_params, self.get_signer(public_key, secret_key))
 
         # POSTリクエストを実行
         return self.send_post(self.get_auth_api_url(), data=post_params)
@@ -296,8 +747,8 @@ class AllCoinApiWrapper(BaseApiWrapper):
         type          String       Yes    coin type: DOGE BC DRK...
         '''
         # 価格、数量の整形
-        price = calculation.kiri_sute(price, self.min_price_unit)
-        num = calculation.kiri_sute(num, self.min_trade_unit)
+        price = self.price_quantizer.kiri_sute(price)
+        num = self.trade_quantizer.kiri_sute(num)
         logger.debug('price=%s, amount=%s', price, num)
 
         post_params = {
@@ -323,8 +774,8 @@ class AllCoinApiWrapper(BaseApiWrapper):
         type          String       Yes    coin type: DOGE BC DRK...
         '''
         # 価格、数量の整形
-        price = calculation.kiri_sute(price, self.min_price_unit)
-        num = calculation.kiri_sute(num, self.min_trade_unit)
+        price = self.price_quantizer.kiri_sute(price)
+        num = self.trade_quantizer.kiri_sute(num)
         logger.debug('price=%s, amount=%s', price, num)
 
         post_params = {
@@ -349,16 +800,75 @@ class AllCoinApiWrapper(BaseApiWrapper):
         post_params = {'order_id': order_id}
         return self.__execute_auth_api(public_key, secret_key, 'cancel_order', post_params)
 
+    def request_balance(self, public_key, secret_key):
+        return self.account_info(public_key, secret_key)
+
+    def request_order(self, public_key, secret_key, is_buy_order, price, amount):
+        return (self.buy_coin if is_buy_order else self.sell_coin)(
+                public_key, secret_key, price, amount
+        )
+
+    def request_cancel(self, public_key, secret_key, order_id):
+        return self.cancel_order(public_key, secret_key, order_id)
+
+    def __load_data(self, text):
+        '''
+        レスポンスの本文から (data, エラー内容) を得る
+        成功: {"code": 1, "data": {...}}、失敗: {"code": -1, "error": "..."}
+        '''
+        result = self.load_auth_result(text)
+        if result is None:
+            return None, 'invalid response'
+
+        if result.get('code') != 1:
+            return None, str(result.get('error', result.get('code')))
+
+        return result.get('data') or {}, None
+
+    def parse_balance(self, text):
+        data, error = self.__load_data(text)
+        if error is not None:
+            return Balance(False, {}, {}, error)
+
+        return Balance(True
+                , dict((currency.upper(), float(amount))
+                        for currency, amount in (data.get('balances_available') or {}).items()
+                )
+                , dict((currency.upper(), float(amount))
+                        for currency, amount in (data.get('balance_hold') or {}).items()
+                )
+                , None
+        )
+
+    def parse_order_ack(self, text):
+        data, error = self.__load_data(text)
+        if error is not None:
+            return OrderAck(False, None, error)
+
+        return OrderAck(True, self.format_order_id(data.get('order_id')), None)
+
+    def parse_cancel_ack(self, text):
+        data, error = self.__load_data(text)
+        if error is not None:
+            return CancelAck(False, None, error)
+
+        return CancelAck(True, self.format_order_id(data.get('order_id')), None)
+
 class BtcBoxApiWrapper(BaseApiWrapper):
     '''
     BtcBox APIラッパー
     https://www.btcbox.co.jp/help/api.html
     '''
+    # 売り注文、買い注文ともに価格の降順で返される
+    DEPTH_BIDS_SORTED = True
+    SIGNER_CLASS = BtcBoxSigner
+    BASE_URL = 'https://www.btcbox.co.jp'
+
     def get_api_url(self, func_name):
         '''
         各種APIアクセス用URLを取得
         '''
-        return 'https://www.btcbox.co.jp/api/v1/' + func_name + '/'
+        return self.base_url + '/api/v1/' + func_name + '/'
 
     def depth(self):
         '''
@@ -381,39 +891,39 @@ class BtcBoxApiWrapper(BaseApiWrapper):
                 }
         '''
         return self.send_get(
-                self.get_api_url('depth'), params={'coin': self.base_currency.lower()}
+                self.get_api_url('depth'), raw=True, idempotent=True
+                , params={'coin': self.base_currency.lower()}
         )
 
-    def __make_signature(self, post_params, public_key, secret_key):
+    def get_auth_rate_limiter(self):
+        '''
+        認証が必要なAPIのトークンバケットを得る
+        (APIはホスト単位で制御されるため、どのAPIのURLでもよい)
+        '''
+        return self.get_rate_limiter(self.get_api_url('trade_add'), rate_limiter.ENDPOINT_AUTH)
+
+    def __make_signature(self, post_params, signer):
         '''
         signature -- Parameters like "amount", "price", "type",
         "nonce", "key" will be combined by '&' to create a new string,
         encrypt the new string by Sha256 algorithm, key is md5(private key)
+        (署名処理は signer.BtcBoxSigner)
         '''
-        # 必須のPOSTパラメータを追加
-        post_params.update({'nonce': str(int(time.time())), 'key': public_key})
-
-        # 秘密鍵で署名を行う文字列を作成
-        for_signature = '&'.join(
-                [param_key + '=' + str(post_params[param_key]) for param_key in post_params]
-        )
-        logger.debug('for_signature=%s', for_signature)
-
-        # 秘密鍵で署名を行う
-        signature = hmac.new(hashlib.md5(str(secret_key)).hexdigest()
-                , for_signature, hashlib.sha256
-        ).hexdigest()
-        logger.debug('signature=%s', signature)
+        # 必須のPOSTパラメータを追加(keyは署名で追加する)
+        post_params['nonce'] = make_nonce()
 
-        # POSTパラメーターにsignatureを追加
-        post_params.update({'signature': signature})
+        # 秘密鍵で署名を行い、POSTパラメーターにsignatureを追加
+        signer.sign(post_params)
 
-    def __execute_auth_api(self, public_key, secret_key, func_name, post_params={}):
+    def __execute_auth_api(self, public_key, secret_key, func_name, post_params=None):
         '''
         Authenticationが必要なAPIを実行する
+        public_key: 公開鍵、または署名
         '''
+        post_params = dict(post_params or {})
+
         # signatureの設定
-        self.__make_signature(post_params, public_key, secret_key)
+        self.__make_signature(post_params, self.get_signer(public_key, secret_key))
 
         # POSTリクエストを実行
         return self.send_post(self.get_api_url(func_name), data=post_params)
@@ -575,8 +1085,8 @@ class BtcBoxApiWrapper(BaseApiWrapper):
                 {"result":true, "id":"11"}
         '''
         # 価格、数量の整形
-        price = calculation.kiri_sute(price, self.min_price_unit)
-        amount = calculation.kiri_sute(amount, self.min_trade_unit)
+        price = self.price_quantizer.kiri_sute(price)
+        amount = self.trade_quantizer.kiri_sute(amount)
         logger.debug('price=%s, amount=%s', price, amount)
 
         # POSTパラメーターの作成
@@ -588,55 +1098,105 @@ class BtcBoxApiWrapper(BaseApiWrapper):
         }
         return self.__execute_auth_api(public_key, secret_key, 'trade_add', post_params)
 
+    def request_balance(self, public_key, secret_key):
+        return self.account_balance(public_key, secret_key)
+
+    def request_order(self, public_key, secret_key, is_buy_order, price, amount):
+        return self.trade_add(public_key, secret_key, is_buy_order, price, amount)
+
+    def request_cancel(self, public_key, secret_key, order_id):
+        return self.trade_cancel(public_key, secret_key, order_id)
+
+    def __load_result(self, text):
+        '''
+        レスポンスの本文から (結果, エラー内容) を得る
+        失敗: {"result": false, "code": "..."}
+        '''
+        result = self.load_auth_result(text)
+        if result is None:
+            return None, 'invalid response'
+
+        if result.get('result') is False:
+            return None, str(result.get('code'))
+
+        return result, None
+
+    def parse_balance(self, text):
+        '''
+        xxx_balance は注文中の数量(xxx_lock)を含む合計
+        '''
+        result, error = self.__load_result(text)
+        if error is not None:
+            return Balance(False, {}, {}, error)
+
+        available = {}
+        locked = {}
+        for key, value in result.items():
+            if key.endswith('_balance'):
+                currency = key[:-len('_balance')]
+                lock = float(result.get(currency + '_lock') or 0)
+                available[currency.upper()] = float(value) - lock
+                locked[currency.upper()] = lock
+
+        return Balance(True, available, locked, None)
+
+    def parse_order_ack(self, text):
+        result, error = self.__load_result(text)
+        if error is not None:
+            return OrderAck(False, None, error)
+
+        return OrderAck(True, self.format_order_id(result.get('id')), None)
+
+    def parse_cancel_ack(self, text):
+        result, error = self.__load_result(text)
+        if error is not None:
+            return CancelAck(False, None, error)
+
+        return CancelAck(True, self.format_order_id(result.get('id')), None)
+
 class EtwingsApiWrapper(BaseApiWrapper):
     '''
     etwings APIラッパー
     https://exchange.etwings.com/doc_api
     '''
+    SIGNER_CLASS = EtwingsSigner
+    BASE_URL = 'https://exchange.etwings.com'
+
     def get_depth_url(self):
         '''
         depth取得URL
         '''
-        base_url = 'https://exchange.etwings.com/api/1/depth/'
-        return base_url+ self.base_currency.lower() + '_jpy'
+        return self.base_url + '/api/1/depth/' + self.base_currency.lower() + '_jpy'
 
     def depth(self):
         '''
         depth情報を得る
         '''
-        return self.send_get(self.get_depth_url())
+        return self.send_get(self.get_depth_url(), raw=True, idempotent=True)
 
     def get_auth_api_url(self):
         '''
         Trade APIのURL
         '''
-        return 'https://exchange.etwings.com/tapi'
+        return self.base_url + '/tapi'
 
-    def __create_http_headers(self, post_params, secret_key, key):
+    def __create_http_headers(self, post_params, signer):
         '''
         Trade APIに必要なHTTP Headerを作成する
+        (署名処理は signer.EtwingsSigner)
         '''
-        # 秘密鍵で署名を行う文字列を作成
-        for_sign = '&'.join(
-                [param_key + '=' + str(post_params[param_key]) for param_key in post_params]
-        )
-        logger.debug('for_sign=%s', for_sign)
-
-        # 秘密鍵で署名を行う
-        sign = hmac.new(str(secret_key), for_sign, hashlib.sha512).hexdigest()
-        logger.debug('sign=%s', sign)
-
-        return {'key': key, 'sign': sign,}
+        return signer.sign(post_params)
 
     def __execute_auth_api(self, public_key, secret_key, method, post_params):
         '''
         Trade APIにPOSTリクエストを送信し、結果を返す
+        public_key: 公開鍵、または署名
         '''
         # 必須のPOSTパラメータを追加
-        post_params.update({'method': method, 'nonce': str(int(time.time()))})
+        post_params.update({'method': method, 'nonce': make_nonce()})
 
         # HTTP Headerを作成
-        headers = self.__create_http_headers(post_params, secret_key, public_key)
+        headers = self.__create_http_headers(post_params, self.get_signer(public_key, secret_key))
 
         # POSTリクエストを実行
         return self.send_post(
@@ -657,8 +1217,8 @@ class EtwingsApiWrapper(BaseApiWrapper):
         Issue an order.
         '''
         # 価格、数量の整形
-        price = calculation.kiri_sute(price, self.min_price_unit)
-        amount = calculation.kiri_sute(amount, self.min_trade_unit)
+        price = self.price_quantizer.kiri_sute(price)
+        amount = self.trade_quantizer.kiri_sute(amount)
         logger.debug('price=%s, amount=%s', price, amount)
 
         # POSTパラメーターの作成
@@ -676,3 +1236,63 @@ class EtwingsApiWrapper(BaseApiWrapper):
         '''
         post_params = {'order_id': order_id}
         return self.__execute_auth_api(public_key, secret_key, 'cancel_order', post_params)
+
+    def request_balance(self, public_key, secret_key):
+        return self.get_info(public_key, secret_key)
+
+    def request_order(self, public_key, secret_key, is_buy_order, price, amount):
+        return self.trade(public_key, secret_key, is_buy_order, price, amount)
+
+    def request_cancel(self, public_key, secret_key, order_id):
+        return self.cancel_order(public_key, secret_key, order_id)
+
+    def __load_return(self, text):
+        '''
+        レスポンスの本文から (return, エラー内容) を得る
+        成功: {"success": 1, "return": {...}}、失敗: {"success": 0, "error": "..."}
+        '''
+        result = self.load_auth_result(text)
+        if result is None:
+            return None, 'invalid response'
+
+        if result.get('success') != 1:
+            return None, str(result.get('error'))
+
+        return result.get('return') or {}, None
+
+    def parse_balance(self, text):
+        '''
+        funds は使用可能な数量、deposit は注文中の数量を含む合計
+        '''
+        data, error = self.__load_return(text)
+        if error is not None:
+            return Balance(False, {}, {}, error)
+
+        available = dict(
+                (currency.upper(), float(amount))
+                for currency, amount in (data.get('funds') or {}).items()
+        )
+        deposit = data.get('deposit') or {}
+        locked = dict(
+                (currency.upper(), float(deposit[currency]) - available[currency.upper()])
+                for currency in deposit if currency.upper() in available
+        )
+        return Balance(True, available, locked, None)
+
+    def parse_order_ack(self, text):
+        data, error = self.__load_return(text)
+        if error is not None:
+            return OrderAck(False, None, error)
+
+        return OrderAck(True, self.format_order_id(data.get('order_id')), None)
+
+    def parse_cancel_ack(self, text):
+        data, error = self.__load_return(text)
+        if error is not None:
+            return CancelAck(False, None, error)
+
+        return CancelAck(True, self.format_order_id(data.get('order_id')), None)
+
+# 組み込みのAPIラッパーを登録する
+for __wrapper_class in (AllCoinApiWrapper, BtcBoxApiWrapper, EtwingsApiWrapper):
+    register_api_wrapper(__wrapper_class)
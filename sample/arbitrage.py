@@ -0,0 +1,285 @@
+# -*- encoding:UTF-8 -*-
+from collections import namedtuple
+import logging, Queue, threading, time
+
+import calculation
+from api_coordinator import get_currency_deltas
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+取引所間の裁定機会の検出
+- 市場毎に最新の注文一覧(DepthLevel の一覧)を保持し、
+  ある市場の注文一覧が更新されると、その市場を含む組み合わせのみ計算し直す
+- 約定を見込める数量、手数料を考慮した損益は、
+  get_buy_order_gain、get_sell_order_gain、get_buy_order_pay、get_sell_order_pay と同じ扱いで計算する
+- 裁定機会の発生、変化、消滅をイベントとしてキューに入れる
+'''
+# イベントの種類
+# 裁定機会が発生した
+EVENT_OPEN = 'open'
+# 裁定機会の数量、価格、損益が変化した
+EVENT_UPDATE = 'update'
+# 裁定機会が消滅した
+EVENT_CLOSE = 'close'
+
+# 1市場の最新の注文一覧
+# api_wrapper: 市場情報
+# bids: 買い注文の DepthLevel 一覧(価格の降順)
+# asks: 売り注文の DepthLevel 一覧(価格の昇順)
+# timestamp: depthの取得時刻
+MarketBook = namedtuple('MarketBook', 'api_wrapper bids asks timestamp')
+
+# 裁定機会(buy_api_wrapper の売り注文を買い、sell_api_wrapper の買い注文に売る)
+# amount: 両市場での注文数量
+# buy_price: 買い注文の価格(約定を見込める最も高い売り注文の価格)
+# sell_price: 売り注文の価格(約定を見込める最も低い買い注文の価格)
+# currency_deltas: 手数料を考慮した、両市場を合わせた各通貨の増減数量
+# profit: 相対通貨での損益(基本通貨の増減は sell_price で換算する)
+# timestamp: 計算に使用したdepthのうち、古い方の取得時刻
+ArbitrageOpportunity = namedtuple('ArbitrageOpportunity'
+        , 'buy_api_wrapper sell_api_wrapper amount buy_price sell_price currency_deltas profit'
+        ' timestamp'
+)
+
+# 裁定機会のイベント
+# kind: イベントの種類(EVENT_*)
+# opportunity: 裁定機会(EVENT_CLOSE の場合は消滅する前の裁定機会)
+ArbitrageEvent = namedtuple('ArbitrageEvent', 'kind opportunity')
+
+def find_opportunity(buy_book, sell_book, min_profit=0):
+    '''
+    buy_book の売り注文を買い、sell_book の買い注文に売る裁定機会を得る(無い場合はNone)
+    両市場の注文を価格の有利な順に突き合わせ、損益が正となる範囲のみ参照する
+    min_profit: 裁定機会とする損益の下限(相対通貨)
+    '''
+    buy_api_wrapper = buy_book.api_wrapper
+    sell_api_wrapper = sell_book.api_wrapper
+    asks = buy_book.asks
+    bids = sell_book.bids
+    if not asks or not bids:
+        return None
+
+    # 数量 1 あたりの支払い、受け取り
+    buy_pay_rate = buy_api_wrapper.get_buy_order_pay(1.0)
+    buy_gain_rate = buy_api_wrapper.get_buy_order_gain(1.0)
+    sell_pay_rate = sell_api_wrapper.get_sell_order_pay(1.0)
+    sell_gain_rate = sell_api_wrapper.get_sell_order_gain(1.0)
+
+    # 数量 1 あたりの損益 = 相対通貨の増減 + 基本通貨の増減 * 売り注文の価格
+    # (価格の順に突き合わせるため、単調に減少する)
+    sell_price_rate = sell_gain_rate + buy_gain_rate - sell_pay_rate
+    if bids[0].price * sell_price_rate <= asks[0].price * buy_pay_rate:
+        # 最良気配で損益が正とならない場合
+        return None
+
+    amount = 0
+    buy_counter_sum = 0
+    sell_counter_sum = 0
+    ask_index = bid_index = 0
+    ask_price, ask_amount = asks[0]
+    bid_price, bid_amount = bids[0]
+    # 突き合わせた (売り注文の価格, 買い注文の価格, 数量) の一覧
+    matches = []
+    while bid_price * sell_price_rate > ask_price * buy_pay_rate:
+        # 損益が正となる注文を突き合わせる
+        matched_amount = min(ask_amount, bid_amount)
+        amount += matched_amount
+        buy_counter_sum += ask_price * matched_amount
+        sell_counter_sum += bid_price * matched_amount
+        matches.append((ask_price, bid_price, matched_amount))
+        ask_amount -= matched_amount
+        bid_amount -= matched_amount
+
+        if ask_amount <= 0:
+            ask_index += 1
+            if len(asks) <= ask_index:
+                break
+            ask_price, ask_amount = asks[ask_index]
+
+        if bid_amount <= 0:
+            bid_index += 1
+            if len(bids) <= bid_index:
+                break
+            bid_price, bid_amount = bids[bid_index]
+
+    # 両市場で注文できる数量に丸め、切り捨てた分を最後に突き合わせた注文から順に除く
+    quantizer = calculation.get_quantizer(
+            min(buy_api_wrapper.min_trade_unit, sell_api_wrapper.min_trade_unit)
+    )
+    order_amount = quantizer.kiri_sute(amount)
+    if order_amount < max(buy_api_wrapper.min_trade_amount, sell_api_wrapper.min_trade_amount):
+        return None
+
+    cut_amount = amount - order_amount
+    while 0 < cut_amount:
+        ask_price, bid_price, matched_amount = matches[-1]
+        if cut_amount < matched_amount or len(matches) == 1:
+            # 一部のみ除く(最初に突き合わせた注文は、演算誤差で除き切ることがないよう残す)
+            cut = min(cut_amount, matched_amount)
+            buy_counter_sum -= ask_price * cut
+            sell_counter_sum -= bid_price * cut
+            break
+
+        matches.pop()
+        buy_counter_sum -= ask_price * matched_amount
+        sell_counter_sum -= bid_price * matched_amount
+        cut_amount -= matched_amount
+
+    # 価格は、除いた後に残る最後の注文のもの
+    buy_price, sell_price = matches[-1][:2]
+
+    currency_deltas = get_currency_deltas(buy_api_wrapper, True, order_amount, buy_counter_sum)
+    for currency, delta in get_currency_deltas(
+            sell_api_wrapper, False, order_amount, sell_counter_sum
+    ).items():
+        currency_deltas[currency] = currency_deltas.get(currency, 0) + delta
+
+    profit = currency_deltas[buy_api_wrapper.counter_currency] \
+            + currency_deltas[buy_api_wrapper.base_currency] * sell_price
+    if profit <= min_profit:
+        return None
+
+    return ArbitrageOpportunity(
+            buy_api_wrapper, sell_api_wrapper, order_amount, buy_price, sell_price
+            , currency_deltas, profit, min(buy_book.timestamp, sell_book.timestamp)
+    )
+
+class ArbitrageScanner(object):
+    '''
+    同じ通貨ペアを扱う市場間の裁定機会を、注文一覧の更新毎に検出する
+    '''
+    def __init__(self, events=None, min_profit=0):
+        '''
+        events: イベントを入れるキュー(省略時は作成する)
+        min_profit: 裁定機会とする損益の下限(相対通貨)
+        '''
+        self.events = Queue.Queue() if events is None else events
+        self.min_profit = min_profit
+
+        # 市場のキー -> MarketBook
+        self.__books = {}
+        # (基本通貨, 相対通貨) -> 市場のキーの一覧
+        self.__pair_markets = {}
+        # (買う市場のキー, 売る市場のキー) -> ArbitrageOpportunity
+        self.__opportunities = {}
+        self.__lock = threading.Lock()
+
+    def refresh(self, api_wrapper, max_age=None):
+        '''
+        APIラッパーのdepthスナップショットから注文一覧を更新する
+        '''
+        snapshot = api_wrapper.get_depth_snapshot(max_age)
+        return self.update(
+                api_wrapper
+                , snapshot.get_levels(True, api_wrapper.normalize_buy_orders)
+                , snapshot.get_levels(False, api_wrapper.normalize_sell_orders)
+                , snapshot.timestamp
+        )
+
+    def update(self, api_wrapper, bids, asks, timestamp=None):
+        '''
+        1市場の注文一覧を更新し、その市場を含む組み合わせの裁定機会を計算し直す
+        発生したイベントの一覧を返す(同じイベントはキューにも入れる)
+        bids: 買い注文の DepthLevel 一覧(価格の降順)
+        asks: 売り注文の DepthLevel 一覧(価格の昇順)
+        timestamp: depthの取得時刻(省略時は現在時刻)
+        '''
+        market_key = api_wrapper.get_market_key()
+        book = MarketBook(api_wrapper, bids, asks, time.time() if timestamp is None else timestamp)
+
+        with self.__lock:
+            self.__books[market_key] = book
+            market_keys = self.__pair_markets.setdefault(
+                    (api_wrapper.base_currency, api_wrapper.counter_currency), []
+            )
+            if market_key not in market_keys:
+                market_keys.append(market_key)
+
+            events = []
+            for other_key in market_keys:
+                if other_key == market_key:
+                    continue
+
+                other_book = self.__books[other_key]
+                self.__update_opportunity(
+                        (market_key, other_key)
+                        , find_opportunity(book, other_book, self.min_profit), events
+                )
+                self.__update_opportunity(
+                        (other_key, market_key)
+                        , find_opportunity(other_book, book, self.min_profit), events
+                )
+
+        for event in events:
+            self.events.put(event)
+
+        return events
+
+    def remove(self, api_wrapper):
+        '''
+        市場を検出対象から除き、その市場を含む裁定機会を消滅させる
+        '''
+        market_key = api_wrapper.get_market_key()
+
+        with self.__lock:
+            if self.__books.pop(market_key, None) is None:
+                return []
+
+            self.__pair_markets[(api_wrapper.base_currency, api_wrapper.counter_currency)] \
+                    .remove(market_key)
+
+            events = []
+            for key in [key for key in self.__opportunities if market_key in key]:
+                self.__update_opportunity(key, None, events)
+
+        for event in events:
+            self.events.put(event)
+
+        return events
+
+    def __update_opportunity(self, key, opportunity, events):
+        '''
+        裁定機会を置き換え、変化があればイベントを追加する
+        '''
+        previous = self.__opportunities.get(key)
+        if opportunity is None:
+            if previous is not None:
+                del self.__opportunities[key]
+                events.append(ArbitrageEvent(EVENT_CLOSE, previous))
+            return
+
+        self.__opportunities[key] = opportunity
+        if previous is None:
+            events.append(ArbitrageEvent(EVENT_OPEN, opportunity))
+
+        elif (previous.amount, previous.buy_price, previous.sell_price, previous.profit) \
+                != (opportunity.amount, opportunity.buy_price, opportunity.sell_price
+                        , opportunity.profit
+                ):
+            events.append(ArbitrageEvent(EVENT_UPDATE, opportunity))
+
+    def get_opportunities(self):
+        '''
+        現在の裁定機会の一覧を、損益の降順で得る
+        '''
+        with self.__lock:
+            opportunities = self.__opportunities.values()
+
+        return sorted(opportunities, key=lambda opportunity: opportunity.profit, reverse=True)
+
+    def iter_events(self, timeout=None):
+        '''
+        イベントを発生順に返す
+        timeout: イベントを待つ時間[秒](省略時は待ち続ける、経過した場合は終了する)
+        '''
+        while True:
+            try:
+                yield self.events.get(timeout=timeout)
+
+            except Queue.Empty:
+                return
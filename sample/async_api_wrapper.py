@@ -0,0 +1,377 @@
+# -*- encoding:UTF-8 -*-
+from urlparse import urlparse
+import functools, logging, sys, thread, time
+
+import trollius as asyncio
+from trollius import From, Return
+
+import rate_limiter
+from depth_cache import DepthFetch
+from api_wrapper import BaseApiWrapper, AllCoinApiWrapper, BtcBoxApiWrapper, EtwingsApiWrapper \
+        , register_api_wrapper
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+非同期APIラッパー
+- 1つのイベントループで複数の市場にアクセスする
+- 署名処理、depthの解析は同期版のAPIラッパーをそのまま使用する
+- 各APIはコルーチンを返すため、yield From で結果を待つ
+- 同じ市場のdepthを取得中の場合は、新たに取得せず取得中の結果を待つ(同期版のAPIラッパーの取得も待つ)
+- イベントループ以外のスレッド(depth_poller 等)からは refresh_depth_snapshot_sync で取得する
+  (取得はイベントループで行うため、イベントループが実行中であること)
+'''
+class AsyncBaseApiWrapper(BaseApiWrapper):
+    '''
+    非同期APIラッパーの基底クラス
+    '''
+    def __init__(self, market_instance, loop=None, executor=None, **kwargs):
+        '''
+        loop: 使用するイベントループ(省略時は既定のイベントループ)
+        executor: HTTPリクエストを実行するexecutor(省略時はイベントループの既定)
+        '''
+        super(AsyncBaseApiWrapper, self).__init__(market_instance, **kwargs)
+        self.loop = loop or asyncio.get_event_loop()
+        self.executor = executor
+
+    @asyncio.coroutine
+    def __wait_for_use_api(self, url, endpoint):
+        '''
+        イベントループを止めずに、APIが使用可能になるまで待つ
+        '''
+        # トークンを先に予約し、並行するコルーチンと重ならないようにする
+        wait = self.get_rate_limiter(url, endpoint).reserve()
+        logger.debug('wait_for_use_api=%s', wait)
+
+        if self.metrics.enabled:
+            self.metrics.observe(
+                    'rate_limit_wait_seconds', self.get_metric_labels(urlparse(url).path), wait
+            )
+
+        if 0 < wait:
+            yield From(asyncio.sleep(wait, loop=self.loop))
+
+    @asyncio.coroutine
+    def __send(self, endpoint, raw, func, url, *args, **kwargs):
+        '''
+        executorでリクエストを送信し、レスポンスの本文を返す
+        raw: Trueの場合、本文を文字列にデコードせずbytesのまま返す
+        '''
+        yield From(self.__wait_for_use_api(url, endpoint))
+
+        start = time.time() if self.metrics.enabled else None
+        r = yield From(self.loop.run_in_executor(
+                self.executor, functools.partial(func, url, *args, **kwargs)
+        ))
+        if start is not None:
+            self.record_response(url, r, start)
+
+        raise Return(r.content if raw else r.text)
+
+    @asyncio.coroutine
+    def __request_get(self, key, url, **kwargs):
+        '''
+        API使用可能になるまで待たずに、executorでGETリクエストを送信し、応答時間を記録する
+        '''
+        start = time.time()
+        r = yield From(self.loop.run_in_executor(
+                self.executor, functools.partial(self.transport.get, url, **kwargs)
+        ))
+        self.hedge_policy.observe(key, time.time() - start)
+        if self.metrics.enabled:
+            self.record_response(url, r, start)
+
+        raise Return(r)
+
+    @asyncio.coroutine
+    def __request_hedged(self, key, url, **kwargs):
+        '''
+        GETリクエストを送信し、応答が遅い場合はヘッジを送信して、先に成功した方のレスポンスを得る
+        (hedging.HedgePolicy と同じ方針で、スレッドの代わりにタスクを使用する)
+        '''
+        policy = self.hedge_policy
+        bucket = self.get_rate_limiter(url, rate_limiter.ENDPOINT_PUBLIC)
+        tasks = [asyncio.ensure_future(self.__request_get(key, url, **kwargs), loop=self.loop)]
+        hedge_delay = policy.get_hedge_delay(key)
+
+        first = None
+        while tasks:
+            done, pending = yield From(asyncio.wait(
+                    tasks, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED, loop=self.loop
+            ))
+            if not done:
+                # 応答が遅いため、トークンを取得できればヘッジを送信する
+                # (取得できなければ、次のトークンの時刻まで最初のリクエストを待つ)
+                hedge_delay = policy.try_hedge(key, bucket.try_acquire, bucket.get_wait)
+                if hedge_delay is None:
+                    tasks.append(asyncio.ensure_future(
+                            self.__request_get(key, url, **kwargs), loop=self.loop
+                    ))
+                continue
+
+            for task in done:
+                tasks.remove(task)
+                if task.exception() is None and not policy.is_failure(task.result()):
+                    # 残りのリクエストの結果は使用しない(例外は参照済みとする)
+                    for other in tasks:
+                        other.add_done_callback(lambda other: other.exception())
+                    raise Return(task.result())
+
+                if first is None:
+                    first = task
+
+        raise Return(first.result())
+
+    @asyncio.coroutine
+    def __send_idempotent(self, url, **kwargs):
+        '''
+        冪等なGETリクエストを、ヘッジ、再試行を行って送信し、レスポンスを得る
+        '''
+        key = urlparse(url).netloc
+
+        # 再試行の回数、待ち時間、失敗の判定は HedgePolicy.call と共有する
+        retries = self.hedge_policy.retries(key)
+        for backoff in retries:
+            if backoff:
+                yield From(asyncio.sleep(backoff, loop=self.loop))
+
+            yield From(self.__wait_for_use_api(url, rate_limiter.ENDPOINT_PUBLIC))
+            try:
+                r = yield From(self.__request_hedged(key, url, **kwargs))
+
+            except Exception:
+                if retries.retry_on_error():
+                    continue
+                raise
+
+            if not retries.retry_on_response(r):
+                raise Return(r)
+
+    @asyncio.coroutine
+    def send_get(self, url, raw=False, idempotent=False, **kwargs):
+        '''
+        GETリクエストを送信する
+        idempotent: 冪等なリクエスト(depth等)の場合True
+                    hedge_policyが指定されていれば、ヘッジ、再試行を行う
+        '''
+        if idempotent and self.hedge_policy is not None:
+            r = yield From(self.__send_idempotent(url, **kwargs))
+            text = r.content if raw else r.text
+        else:
+            text = yield From(self.__send(
+                    rate_limiter.ENDPOINT_PUBLIC, raw, self.transport.get, url, **kwargs
+            ))
+
+        logger.debug('GET Request sended.')
+        raise Return(text)
+
+    @asyncio.coroutine
+    def send_post(self, url, data=None, json=None, **kwargs):
+        '''
+        POSTリクエストを送信する
+        '''
+        text = yield From(self.__send(
+                rate_limiter.ENDPOINT_AUTH, False, self.transport.post, url, data, json, **kwargs
+        ))
+        logger.debug('POST Request sended.')
+        raise Return(text)
+
+    @asyncio.coroutine
+    def get_depth_snapshot(self, max_age=None):
+        '''
+        depthのスナップショットを得る
+        max_age: 許容するスナップショットの経過時間[秒](省略時はdepth_max_age)
+        '''
+        max_age = self.depth_max_age if max_age is None else max_age
+        snapshot = self.depth_cache.get(self.get_market_key(), max_age)
+        if snapshot is None:
+            snapshot = yield From(self.__refresh_depth_snapshot(max_age))
+
+        raise Return(snapshot)
+
+    @asyncio.coroutine
+    def refresh_depth_snapshot(self, normalize=False):
+        '''
+        有効期間にかかわらずAPIよりdepthを取得し、スナップショットを保存する
+        (同じ市場を取得中の場合は、その結果を待つ)
+        normalize: Trueの場合、保存する前に両側の DepthLevel 一覧を作成しておく
+        '''
+        snapshot = yield From(self.__refresh_depth_snapshot(normalize=normalize))
+        raise Return(snapshot)
+
+    def refresh_depth_snapshot_sync(self, normalize=False):
+        '''
+        イベントループ以外のスレッドから refresh_depth_snapshot を呼び出し、完了まで待つ
+        (イベントループのスレッドから呼び出した場合は、完了しないため RuntimeError を送出する)
+        depthキャッシュの fetch_wait_timeout までに完了しない場合は DepthFetchTimeout を送出する
+        '''
+        if self.loop._thread_id == thread.get_ident():
+            raise RuntimeError, u"イベントループのスレッドでは refresh_depth_snapshot を使用してください。"
+
+        # 結果の受け渡しには、取得中のdepthと同じ DepthFetch を使用する
+        depth_fetch = DepthFetch()
+
+        def set_result(task):
+            error = asyncio.CancelledError() if task.cancelled() else task.exception()
+            if error is None:
+                depth_fetch.set_result(task.result())
+            else:
+                depth_fetch.set_result(exc_info=(error.__class__, error, None))
+
+        def start():
+            asyncio.ensure_future(self.refresh_depth_snapshot(normalize), loop=self.loop) \
+                    .add_done_callback(set_result)
+
+        self.loop.call_soon_threadsafe(start)
+        return depth_fetch.wait(self.depth_cache.fetch_wait_timeout)
+
+    @asyncio.coroutine
+    def __refresh_depth_snapshot(self, max_age=None, normalize=False):
+        '''
+        APIよりdepthを取得し、スナップショットを保存する
+        (同じ市場を取得中の場合は、新たに取得せずその結果を待つ)
+        max_age: 指定した場合、直前に完了した取得の結果が有効期間内であれば使用する
+        normalize: Trueの場合、保存する前に両側の DepthLevel 一覧を作成しておく
+        '''
+        key = self.get_market_key()
+        depth_fetch, is_fetcher = self.depth_cache.begin_fetch(key)
+        if not is_fetcher:
+            logger.debug('depth fetch joined. key=%s', key)
+            snapshot = yield From(self.__wait_depth_fetch(depth_fetch))
+            raise Return(snapshot)
+
+        try:
+            # 直前に完了した取得の結果があれば使用する
+            snapshot = None if max_age is None else self.depth_cache.get(key, max_age)
+            if snapshot is None:
+                snapshot = self.create_depth_snapshot((yield From(self.depth())))
+                if normalize:
+                    snapshot.get_levels(True, self.normalize_buy_orders)
+                    snapshot.get_levels(False, self.normalize_sell_orders)
+
+        except:
+            self.depth_cache.end_fetch(key, depth_fetch, exc_info=sys.exc_info())
+            raise
+
+        self.depth_cache.end_fetch(key, depth_fetch, snapshot)
+        raise Return(snapshot)
+
+    def __wait_depth_fetch(self, depth_fetch):
+        '''
+        取得中のdepthの完了を待つFutureを得る
+        (取得はスレッド、他のイベントループで行われることもあるため、完了はイベントループのスレッドで通知する)
+        '''
+        future = asyncio.Future(loop=self.loop)
+
+        def set_result(depth_fetch):
+            if future.cancelled():
+                return
+
+            if depth_fetch.error is not None:
+                future.set_exception(depth_fetch.error)
+            else:
+                future.set_result(depth_fetch.snapshot)
+
+        depth_fetch.add_done_callback(
+                lambda depth_fetch: self.loop.call_soon_threadsafe(set_result, depth_fetch)
+        )
+        return future
+
+    @asyncio.coroutine
+    def get_buy_orders(self, max_age=None):
+        '''
+        depthから買い注文一覧を得る
+        '''
+        snapshot = yield From(self.get_depth_snapshot(max_age))
+        raise Return(self.sort_buy_orders(snapshot.bids))
+
+    @asyncio.coroutine
+    def get_sell_orders(self, max_age=None):
+        '''
+        depthから売り注文一覧を得る
+        '''
+        snapshot = yield From(self.get_depth_snapshot(max_age))
+        raise Return(self.sort_sell_orders(snapshot.asks))
+
+    @asyncio.coroutine
+    def get_buy_levels(self, max_age=None):
+        '''
+        depthから買い注文の DepthLevel 一覧(価格の降順)を得る
+        '''
+        snapshot = yield From(self.get_depth_snapshot(max_age))
+        raise Return(snapshot.get_levels(True, self.normalize_buy_orders))
+
+    @asyncio.coroutine
+    def get_sell_levels(self, max_age=None):
+        '''
+        depthから売り注文の DepthLevel 一覧(価格の昇順)を得る
+        '''
+        snapshot = yield From(self.get_depth_snapshot(max_age))
+        raise Return(snapshot.get_levels(False, self.normalize_sell_orders))
+
+    @asyncio.coroutine
+    def iter_buy_levels(self, max_age=None):
+        '''
+        depthから買い注文の DepthLevel を価格の降順に返すイテレータを得る
+        '''
+        snapshot = yield From(self.get_depth_snapshot(max_age))
+        raise Return(snapshot.iter_levels(
+                True, lambda orders: self.iter_normalized_orders(orders, True)
+        ))
+
+    @asyncio.coroutine
+    def iter_sell_levels(self, max_age=None):
+        '''
+        depthから売り注文の DepthLevel を価格の昇順に返すイテレータを得る
+        '''
+        snapshot = yield From(self.get_depth_snapshot(max_age))
+        raise Return(snapshot.iter_levels(
+                False, lambda orders: self.iter_normalized_orders(orders, False)
+        ))
+
+    @asyncio.coroutine
+    def get_balance(self, public_key, secret_key):
+        '''
+        残高を Balance で得る
+        '''
+        text = yield From(self.request_balance(public_key, secret_key))
+        raise Return(self.parse_balance(text))
+
+    @asyncio.coroutine
+    def place_order(self, public_key, secret_key, is_buy_order, price, amount):
+        '''
+        発注し、結果を OrderAck で得る
+        '''
+        text = yield From(self.request_order(public_key, secret_key, is_buy_order, price, amount))
+        raise Return(self.parse_order_ack(text))
+
+    @asyncio.coroutine
+    def cancel(self, public_key, secret_key, order_id):
+        '''
+        注文を取り消し、結果を CancelAck で得る
+        '''
+        text = yield From(self.request_cancel(public_key, secret_key, order_id))
+        raise Return(self.parse_cancel_ack(text))
+
+class AsyncAllCoinApiWrapper(AsyncBaseApiWrapper, AllCoinApiWrapper):
+    '''
+    AllCoin.com 非同期APIラッパー
+    '''
+
+class AsyncBtcBoxApiWrapper(AsyncBaseApiWrapper, BtcBoxApiWrapper):
+    '''
+    BtcBox 非同期APIラッパー
+    '''
+
+class AsyncEtwingsApiWrapper(AsyncBaseApiWrapper, EtwingsApiWrapper):
+    '''
+    etwings 非同期APIラッパー
+    '''
+
+# 非同期APIラッパーを登録する
+for __wrapper_class in (AsyncAllCoinApiWrapper, AsyncBtcBoxApiWrapper, AsyncEtwingsApiWrapper):
+    register_api_wrapper(__wrapper_class)
@@ -1,5 +1,5 @@
 # -*- encoding:UTF-8 -*-
-import logging, re
+import logging
 
 logger = logging.getLogger(__name__)
 
@@ -8,104 +8,151 @@ Created on 2014/12/08
 
 @author: user
 '''
-def __round_framework(func, m, n=0):
+class Quantizer(object):
     '''
-    四捨五入、切り上げ、切り捨て で共通する処理
+    小数点以下桁数を固定した 四捨五入、切り上げ、切り捨て を行う
+    - 10の累乗倍した値を整数に丸めて処理し、文字列への変換は行わない
+    - 旧実装(str()による変換)と同じく、有効数字12桁に丸めた値を処理する
+      (有効数字12桁への丸めで結果が変わり得る場合のみ、実際に丸めてから処理する)
+    - 10進数表記を丸めた値に最も近い浮動小数点数を返す
     '''
-    # 小数点以下桁数指定をint型にする
-    n = int(n)
-
-    # m の絶対値を処理対象とする
-    m_str = str(abs(m))
-
-    # X.Xe-nn 表記かをチェック
-    pattern = re.compile('(\d+\.\d+)[eE]-(\d+)')
-    obj = pattern.match(m_str)
-    if obj:
-        # X.Xe-nn 表記の場合
-        # 0.00･･･ 表記に変更する
-        m_str = '0.' + ''.center(int(obj.group(2)) - 1, '0') \
-                + obj.group(1).replace('.', '')
-        logger.debug(m_str)
-
-    # 整数部分と小数部分に分ける
-    m_str = m_str.split('.')
-
-    if 1 < len(m_str) and 0 <= n < len(m_str[1]):
-        # 小数部分が存在し、小数点以下桁数指定が有効な場合
-        # 個別処理
-        result = func(m_str, n)
-
-        if m < 0:
-            # m が負の数である場合
-            # マイナスを掛けて正負を元に戻す
-            result = -1 * result
-
-    else:
-        # 小数点以下桁数指定が無効な場合
+    # 浮動小数点数の演算誤差として扱う相対誤差(数ulp)
+    EPSILON = 2.0 ** -50
+
+    # 有効数字12桁への丸めによる相対誤差の上限(5e-12に余裕を加えた値)
+    SNAP_EPSILON = 6e-12
+
+    def __init__(self, n=0):
+        '''
+        n: 小数点以下桁数
+        '''
+        # 小数点以下桁数指定をint型にする
+        n = int(n)
         if n < 0:
             # 負の数が指定された場合
             raise RuntimeError, u"小数点以下桁数には正の整数を指定してください。"
 
-        # それ以外は値をそのまま返す
-        result = m
-
-    return result
-
-def __kiri_age(m_str, n):
-    '''
-    切り上げ の個別処理
-    '''
-    if n == 0:
-        # 整数部を切り上げる
-        result = int(m_str[0]) + 1
-    else:
-        # 小数点以下桁数の指定部分に1を加算し、残りの桁は捨てる
-        result = int(m_str[0]) + 10**(-n) * (int(m_str[1][:n]) + 1)
-
-    return result
-
-def __kiri_sute(m_str, n):
+        self.digits = n
+        self.scale = scale = float(10 ** n)
+
+        # 演算誤差で整数の手前(切り上げは整数の直後)になった値を、整数として扱うための倍率
+        up = scale * (1 + self.EPSILON)
+        down = scale * (1 - self.EPSILON)
+
+        # 有効数字12桁に丸めた値が取り得る範囲の倍率
+        snap_up = scale * (1 + self.SNAP_EPSILON)
+        snap_down = scale * (1 - self.SNAP_EPSILON)
+
+        def snap(m):
+            '''
+            有効数字12桁に丸める(旧実装の str() と同じ丸め)
+            '''
+            return float('%.12g' % m)
+
+        # 呼び出し毎の属性参照を避けるため、倍率を束縛した関数を作成する
+        # 有効数字12桁に丸めた値が取り得る範囲の両端で結果が異なる場合のみ、実際に丸めてから処理する
+        def kiri_sute(m):
+            '''
+            切り捨て処理を行う
+            '''
+            if m.__class__ is float:
+                if m < 0:
+                    return 0.0 - kiri_sute(-m)
+
+                k = int(m * snap_down)
+                if k == int(m * snap_up):
+                    return k / scale
+                return int(snap(m) * up) / scale
+
+            if isinstance(m, (int, long)):
+                # 整数はそのまま返す
+                return m
+
+            return kiri_sute(float(m))
+
+        def kiri_age(m):
+            '''
+            切り上げ処理を行う
+            '''
+            if m.__class__ is float:
+                if m < 0:
+                    return 0.0 - kiri_age(-m)
+
+                x = m * snap_down
+                k = int(x)
+                if k < x:
+                    k += 1
+                if m * snap_up <= k:
+                    return k / scale
+
+                x = snap(m) * down
+                k = int(x)
+                if k < x:
+                    k += 1
+                return k / scale
+
+            if isinstance(m, (int, long)):
+                return m
+
+            return kiri_age(float(m))
+
+        def shisha_gonyu(m):
+            '''
+            四捨五入を行う
+            '''
+            if m.__class__ is float:
+                if m < 0:
+                    return 0.0 - shisha_gonyu(-m)
+
+                k = int(m * snap_down + 0.5)
+                if k == int(m * snap_up + 0.5):
+                    return k / scale
+                return int(snap(m) * up + 0.5) / scale
+
+            if isinstance(m, (int, long)):
+                return m
+
+            return shisha_gonyu(float(m))
+
+        if n == 0:
+            # 小数点以下桁数が0の場合はint型とする
+            self.kiri_sute = lambda m: int(kiri_sute(m))
+            self.kiri_age = lambda m: int(kiri_age(m))
+            self.shisha_gonyu = lambda m: int(shisha_gonyu(m))
+
+        else:
+            self.kiri_sute = kiri_sute
+            self.kiri_age = kiri_age
+            self.shisha_gonyu = shisha_gonyu
+
+# 小数点以下桁数 -> Quantizer
+__quantizers = {}
+
+def get_quantizer(n=0):
     '''
-    切り捨て の個別処理
+    小数点以下桁数のQuantizerを得る
     '''
-    if n == 0:
-        # 小数点以下を切り捨てる
-        result = int(m_str[0])
-    else:
-        # 小数点以下桁数の指定部分より下の桁を切り捨てる
-        result = int(m_str[0]) + 10**(-n) * int(m_str[1][:n])
-
-    return result
-
-def __shisha_gonyu(m_str, n):
-    '''
-    四捨五入 の個別処理
-    '''
-    if int(m_str[1][n]) >= 5:
-        # 切り上げ
-        result = __kiri_age(m_str, n)
-
-    else:
-        # 切り捨て
-        result = __kiri_sute(m_str, n)
+    quantizer = __quantizers.get(n)
+    if quantizer is None:
+        quantizer = Quantizer(n)
+        __quantizers[n] = quantizer
 
-    return result
+    return quantizer
 
 def shisha_gonyu(m, n=0):
     '''
     四捨五入を行う
     '''
-    return __round_framework(__shisha_gonyu, m, n)
+    return get_quantizer(n).shisha_gonyu(m)
 
 def kiri_age(m, n=0):
     '''
     切り上げ処理を行う
     '''
-    return __round_framework(__kiri_age, m, n)
+    return get_quantizer(n).kiri_age(m)
 
 def kiri_sute(m, n=0):
     '''
     切り捨て処理を行う
     '''
-    return __round_framework(__kiri_sute, m, n)
\ No newline at end of file
+    return get_quantizer(n).kiri_sute(m)
@@ -0,0 +1,370 @@
+# -*- encoding:UTF-8 -*-
+from collections import namedtuple
+import logging, sys, thread, threading, time
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+depthスナップショットのキャッシュ
+- 買い注文、売り注文の両方で同じスナップショットを使い回す
+- 同じ市場のdepthを取得中の場合、他の呼び出し元は新たに取得せず、取得中の結果を待つ
+  (スレッド、イベントループのどちらからも待つことができる)
+- スレッドで待つのは FETCH_WAIT_TIMEOUT までとし、それを過ぎた場合は自身で取得する
+  取得中の呼び出し元と同じスレッド(取得中のイベントループのスレッド等)では、待たずに自身で取得する
+'''
+# depthの一注文(価格、数量は市場の単位で丸め済み)
+DepthLevel = namedtuple('DepthLevel', 'price amount')
+
+# 取得中のdepthを、スレッドで待つ最長の時間[秒]
+FETCH_WAIT_TIMEOUT = 30.0
+
+class DepthFetchTimeout(Exception):
+    '''
+    取得中のdepthの完了を、待つ時間内に得られなかった
+    '''
+    pass
+
+class LazyLevels(object):
+    '''
+    約定させる順の DepthLevel 一覧を、参照された分だけ作成する
+    作成済みの分は、同じスナップショットの他の参照でも使い回す
+    '''
+    def __init__(self, iterator):
+        '''
+        iterator: DepthLevel を約定させる順に返すイテレータ
+        '''
+        self.__iterator = iterator
+        self.__levels = []
+        self.__lock = threading.Lock()
+
+    def __iter__(self):
+        levels = self.__levels
+        i = 0
+        while True:
+            if i < len(levels):
+                yield levels[i]
+                i += 1
+                continue
+
+            # 未作成の分は、1スレッドずつ作成する
+            with self.__lock:
+                if i < len(levels):
+                    continue
+
+                level = None if self.__iterator is None else next(self.__iterator, None)
+                if level is None:
+                    self.__iterator = None
+                    return
+
+                levels.append(level)
+
+class DepthSnapshot(object):
+    '''
+    ある時点のdepth情報
+    - payloadを指定した場合、買い注文一覧、売り注文一覧は初めて参照した時に解析する
+    '''
+    def __init__(self, bids=None, asks=None, timestamp=None, payload=None, parse_side=None):
+        '''
+        bids: 買い注文一覧(取引所の形式のまま)
+        asks: 売り注文一覧(取引所の形式のまま)
+        timestamp: 取得時刻(UNIX時間)
+        payload: 解析前のdepth情報
+        parse_side: payloadから片側の注文一覧を得る関数 parse_side(payload, is_buy)
+        '''
+        self.__bids = bids
+        self.__asks = asks
+        self.__payload = payload
+        self.__parse_side = parse_side
+
+        # 買い注文かどうか -> 丸め、並べ替え済みの DepthLevel 一覧
+        self.__levels = {}
+        # 買い注文かどうか -> LazyLevels
+        self.__lazy_levels = {}
+        # キー -> 注文一覧から作成したデータ
+        self.__derived = {}
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def __get_side(self, is_buy):
+        '''
+        片側の注文一覧を得る(未解析の場合は解析する)
+        複数スレッドから同時に参照された場合、二重に解析されることがあるが結果は同じ
+        '''
+        orders = self.__bids if is_buy else self.__asks
+        payload = self.__payload
+        if orders is None and payload is not None:
+            orders = self.__parse_side(payload, is_buy)
+            if is_buy:
+                self.__bids = orders
+            else:
+                self.__asks = orders
+
+            if self.__bids is not None and self.__asks is not None:
+                # 両側とも解析済みであれば、解析前のdepth情報は不要
+                self.__payload = None
+
+        return orders
+
+    @property
+    def bids(self):
+        '''
+        買い注文一覧
+        '''
+        return self.__get_side(True)
+
+    @property
+    def asks(self):
+        '''
+        売り注文一覧
+        '''
+        return self.__get_side(False)
+
+    def get_levels(self, is_buy, normalize):
+        '''
+        片側の DepthLevel 一覧を得る
+        初回のみ normalize(注文一覧) で作成し、以降は同じ一覧を返す
+        '''
+        levels = self.__levels.get(is_buy)
+        if levels is None:
+            levels = normalize(self.bids if is_buy else self.asks)
+            self.__levels[is_buy] = levels
+
+        return levels
+
+    def iter_levels(self, is_buy, iter_orders):
+        '''
+        片側の DepthLevel を約定させる順に返すイテレータを得る
+        iter_orders(注文一覧): DepthLevel を約定させる順に返すイテレータを作成する関数
+        全件の一覧を作成済みであれば、それを使用する
+        '''
+        levels = self.__levels.get(is_buy)
+        if levels is not None:
+            return iter(levels)
+
+        lazy_levels = self.__lazy_levels.get(is_buy)
+        if lazy_levels is None:
+            lazy_levels = self.__lazy_levels.setdefault(
+                    is_buy, LazyLevels(iter_orders(self.bids if is_buy else self.asks))
+            )
+
+        return iter(lazy_levels)
+
+    def get_derived(self, key, build):
+        '''
+        注文一覧から作成したデータを得る
+        初回のみ build() で作成し、以降は同じスナップショットである限り同じデータを返す
+        key: 作成するデータを識別するキー
+        '''
+        derived = self.__derived.get(key)
+        if derived is None:
+            derived = self.__derived.setdefault(key, build())
+
+        return derived
+
+    def get_age(self):
+        '''
+        取得してからの経過時間[秒]を得る
+        '''
+        return time.time() - self.timestamp
+
+class DepthFetch(object):
+    '''
+    取得中のdepth
+    取得の完了を、スレッドは wait() で、イベントループは add_done_callback() で待つ
+    '''
+    def __init__(self):
+        self.snapshot = None
+        self.error = None
+        # 取得に失敗した場合の sys.exc_info()
+        self.exc_info = None
+
+        # 取得を開始したスレッド(このスレッドで完了を待つと、完了しないことがある)
+        self.thread_id = thread.get_ident()
+
+        self.__event = threading.Event()
+        # 完了時に呼び出す関数の一覧(完了後はNone)
+        self.__callbacks = []
+        self.__lock = threading.Lock()
+
+    def set_result(self, snapshot=None, exc_info=None):
+        '''
+        取得結果(スナップショット、または失敗した場合の sys.exc_info())を設定し、
+        待っている呼び出し元に通知する
+        '''
+        with self.__lock:
+            self.snapshot = snapshot
+            self.exc_info = exc_info
+            self.error = None if exc_info is None else exc_info[1]
+            self.__event.set()
+            callbacks, self.__callbacks = self.__callbacks, None
+
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, callback):
+        '''
+        完了時に callback(DepthFetch) を呼び出す(完了済みの場合は即座に呼び出す)
+        callbackは取得したスレッドで呼び出される
+        '''
+        with self.__lock:
+            if self.__callbacks is not None:
+                self.__callbacks.append(callback)
+                return
+
+        callback(self)
+
+    def wait(self, timeout=None):
+        '''
+        取得の完了を待ち、スナップショットを得る
+        取得に失敗した場合は、同じ例外を取得時のトレースバックのまま送出する
+        timeout: 待つ最長の時間[秒](Noneの場合は完了するまで待つ)
+                 完了しなかった場合は DepthFetchTimeout を送出する
+        '''
+        if not self.__event.wait(timeout):
+            raise DepthFetchTimeout(u'depth fetch did not complete in %s seconds.' % timeout)
+
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+
+        return self.snapshot
+
+class DepthCache(object):
+    '''
+    市場毎のdepthスナップショットを保持する
+    '''
+    def __init__(self, fetch_wait_timeout=FETCH_WAIT_TIMEOUT):
+        '''
+        fetch_wait_timeout: 取得中のdepthを、スレッドで待つ最長の時間[秒]
+        '''
+        self.fetch_wait_timeout = fetch_wait_timeout
+
+        # 市場のキー -> DepthSnapshot
+        self.__snapshots = {}
+        # 市場のキー -> 取得中の DepthFetch
+        self.__fetches = {}
+        self.__lock = threading.Lock()
+
+    def get(self, key, max_age):
+        '''
+        有効期間内のスナップショットを得る
+        存在しない場合はNoneを返す
+        '''
+        with self.__lock:
+            snapshot = self.__snapshots.get(key)
+
+        if snapshot is None or max_age < snapshot.get_age():
+            return None
+
+        return snapshot
+
+    def put(self, key, snapshot):
+        '''
+        スナップショットを保存する
+        古いスナップショットでは上書きしない
+        '''
+        with self.__lock:
+            current = self.__snapshots.get(key)
+            if current is None or current.timestamp <= snapshot.timestamp:
+                self.__snapshots[key] = snapshot
+
+    def begin_fetch(self, key):
+        '''
+        市場のdepthの取得を開始する
+        既に取得中の場合は、その DepthFetch を返す
+        戻り値: (DepthFetch, 呼び出し元が取得を行うかどうか)
+        (取得を行う場合は、取得後に必ず end_fetch() を呼び出すこと)
+        '''
+        with self.__lock:
+            depth_fetch = self.__fetches.get(key)
+            if depth_fetch is not None:
+                return depth_fetch, False
+
+            depth_fetch = self.__fetches[key] = DepthFetch()
+
+        return depth_fetch, True
+
+    def end_fetch(self, key, depth_fetch, snapshot=None, exc_info=None):
+        '''
+        市場のdepthの取得を終了し、スナップショットを保存して、待っている呼び出し元に通知する
+        exc_info: 取得に失敗した場合の sys.exc_info()
+        '''
+        if snapshot is not None:
+            self.put(key, snapshot)
+
+        with self.__lock:
+            if self.__fetches.get(key) is depth_fetch:
+                del self.__fetches[key]
+
+        depth_fetch.set_result(snapshot, exc_info)
+
+    def refresh(self, key, fetch, max_age=None):
+        '''
+        fetchで取得し、保存する
+        同じ市場を取得中の場合は、新たに取得せずその結果を待つ
+        max_age: 指定した場合、有効期間内のスナップショットがあれば取得せずに使用する
+        '''
+        depth_fetch, is_fetcher = self.begin_fetch(key)
+        if not is_fetcher:
+            return self.__join_fetch(key, depth_fetch, fetch)
+
+        try:
+            # 直前に完了した取得の結果があれば使用する
+            snapshot = None if max_age is None else self.get(key, max_age)
+            if snapshot is None:
+                snapshot = fetch()
+                logger.debug('depth snapshot fetched. key=%s', key)
+
+        except:
+            self.end_fetch(key, depth_fetch, exc_info=sys.exc_info())
+            raise
+
+        self.end_fetch(key, depth_fetch, snapshot)
+        return snapshot
+
+    def __join_fetch(self, key, depth_fetch, fetch):
+        '''
+        取得中のdepthの完了を待つ
+        待っても完了しない場合(取得中の呼び出し元と同じスレッド、待つ時間を過ぎた場合)は、
+        取得中の結果を待たずに fetch で取得し、保存する
+        '''
+        if depth_fetch.thread_id == thread.get_ident():
+            # 取得中のイベントループのスレッド等で待つと、取得が進まず完了しない
+            logger.debug('depth fetch is in progress on this thread. key=%s', key)
+        else:
+            logger.debug('depth fetch joined. key=%s', key)
+            try:
+                return depth_fetch.wait(self.fetch_wait_timeout)
+            except DepthFetchTimeout:
+                logger.warning('depth fetch wait timed out. key=%s', key)
+
+        snapshot = fetch()
+        self.put(key, snapshot)
+        return snapshot
+
+    def get_or_fetch(self, key, max_age, fetch):
+        '''
+        有効期間内のスナップショットを得る
+        存在しない場合はfetchで取得し、保存する
+        同じ市場を取得中の場合は、その結果を待つ
+        '''
+        snapshot = self.get(key, max_age)
+        if snapshot is None:
+            snapshot = self.refresh(key, fetch, max_age)
+
+        return snapshot
+
+    def clear(self, key=None):
+        '''
+        スナップショットを破棄する(keyを省略した場合は全市場)
+        '''
+        with self.__lock:
+            if key is None:
+                self.__snapshots.clear()
+            else:
+                self.__snapshots.pop(key, None)
+
+# 全ての市場、全てのAPIラッパーで共有するキャッシュ
+shared_depth_cache = DepthCache()
@@ -0,0 +1,146 @@
+# -*- encoding:UTF-8 -*-
+from bisect import bisect_left, bisect_right
+import logging
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+丸め、並べ替え済みの注文一覧(DepthLevel の一覧)に対する、数量、価格 * 数量 の累積和の索引
+- 約定させる数量に対する 平均約定価格(VWAP)、最も不利な約定価格、スリッページ、
+  価格に対する約定可能数量 を二分探索で求める
+- depthスナップショット毎に1度だけ作成し、全ての参照元で共有する
+- 最低注文数による端数のまとめは行わない(注文計画は api_coordinator、order_book を使用すること)
+'''
+class DepthIndex(object):
+    '''
+    約定させる順に並べた片側の注文一覧の索引
+    '''
+    def __init__(self, levels, is_ascending):
+        '''
+        levels: DepthLevel の一覧(約定させる順)
+        is_ascending: 価格の昇順かどうか(売り注文一覧の場合はTrue)
+        '''
+        self.is_ascending = is_ascending
+        self.price_list = [level.price for level in levels]
+        self.amount_list = [level.amount for level in levels]
+
+        # 二分探索に使用する、昇順に並ぶ価格
+        self.__price_keys = self.price_list if is_ascending else [-price for price in self.price_list]
+
+        # 先頭i件の 数量、価格 * 数量 の合計
+        self.cum_amounts = [0]
+        self.cum_notionals = [0]
+        for price, amount in zip(self.price_list, self.amount_list):
+            self.cum_amounts.append(self.cum_amounts[-1] + amount)
+            self.cum_notionals.append(self.cum_notionals[-1] + price * amount)
+
+    def __len__(self):
+        return len(self.price_list)
+
+    def get_best_price(self):
+        '''
+        最も有利な価格を得る(注文が無い場合はNone)
+        '''
+        return self.price_list[0] if self.price_list else None
+
+    def get_total_amount(self):
+        '''
+        全ての注文の数量の合計を得る
+        '''
+        return self.cum_amounts[-1]
+
+    def get_fill(self, amount):
+        '''
+        数量を約定させた場合の (約定可能数量, 価格 * 数量 の合計, 最も不利な約定価格) を得る
+        注文が足りない場合は、全ての注文を約定させた結果となる
+        '''
+        if amount <= 0 or not self.price_list:
+            return 0, 0, None
+
+        cum_amounts = self.cum_amounts
+        i = bisect_left(cum_amounts, amount)
+        if len(cum_amounts) <= i:
+            # 全ての注文を約定させても足りない場合(末尾の数量0の注文は約定しない)
+            i = bisect_left(cum_amounts, cum_amounts[-1])
+            if i == 0:
+                return 0, 0, None
+
+            return cum_amounts[-1], self.cum_notionals[-1], self.price_list[i - 1]
+
+        # i-1番目の注文で数量に達する
+        price = self.price_list[i - 1]
+        return amount, self.cum_notionals[i - 1] + price * (amount - cum_amounts[i - 1]), price
+
+    def get_vwap(self, amount):
+        '''
+        数量を約定させた場合の平均約定価格を得る(約定できない場合はNone)
+        '''
+        filled, notional, worst_price = self.get_fill(amount)
+        return notional / filled if filled else None
+
+    def get_worst_price(self, amount):
+        '''
+        数量を約定させた場合の、最も不利な約定価格を得る(約定できない場合はNone)
+        '''
+        return self.get_fill(amount)[2]
+
+    def get_slippage(self, amount):
+        '''
+        最も有利な価格に対する、平均約定価格の不利な方向への乖離率を得る(約定できない場合はNone)
+        '''
+        vwap = self.get_vwap(amount)
+        if vwap is None:
+            return None
+
+        best_price = self.price_list[0]
+        return (vwap - best_price if self.is_ascending else best_price - vwap) / float(best_price)
+
+    def get_price_impact(self, amount):
+        '''
+        最も有利な価格に対する、最も不利な約定価格の乖離率を得る(約定できない場合はNone)
+        '''
+        worst_price = self.get_worst_price(amount)
+        if worst_price is None:
+            return None
+
+        best_price = self.price_list[0]
+        return (worst_price - best_price if self.is_ascending else best_price - worst_price) \
+                / float(best_price)
+
+    def get_count_within(self, price):
+        '''
+        価格以上に不利でない(売り注文一覧は価格以下、買い注文一覧は価格以上の)注文数を得る
+        '''
+        return bisect_right(self.__price_keys, price if self.is_ascending else -price)
+
+    def get_amount_within(self, price):
+        '''
+        価格以上に不利な注文を約定させずに、約定可能な数量を得る
+        '''
+        return self.cum_amounts[self.get_count_within(price)]
+
+    def get_notional_within(self, price):
+        '''
+        価格以上に不利な注文を約定させずに約定可能な、価格 * 数量 の合計を得る
+        '''
+        return self.cum_notionals[self.get_count_within(price)]
+
+def get_depth_index(api_wrapper, is_buy_order, max_age=None):
+    '''
+    APIよりdepthを取得し、(買い|売り)注文で約定させる注文一覧の索引を得る
+    (買い注文は売り注文一覧、売り注文は買い注文一覧の索引)
+    同じdepthスナップショットからは1度だけ作成する
+    '''
+    snapshot = api_wrapper.get_depth_snapshot(max_age)
+
+    def build():
+        if is_buy_order:
+            return DepthIndex(snapshot.get_levels(False, api_wrapper.normalize_sell_orders), True)
+
+        return DepthIndex(snapshot.get_levels(True, api_wrapper.normalize_buy_orders), False)
+
+    return snapshot.get_derived((DepthIndex, is_buy_order), build)
@@ -0,0 +1,278 @@
+# -*- encoding:UTF-8 -*-
+from collections import namedtuple
+import logging, threading, time
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+depthのバックグラウンド取得
+- 登録した市場毎にスレッドを起動し、API使用可能間隔で可能な限り頻繁にdepthを取得する
+- 取得したdepthは、両側の DepthLevel 一覧を作成してから、APIラッパーのdepthキャッシュに公開する
+  (スナップショットの差し替えはキャッシュのロック内で行われ、参照側は作成途中の状態を見ない)
+- 非同期APIラッパーは、そのイベントループで取得する(イベントループを実行しておくこと)
+- 注文計画(api_coordinator、order_book)には max_age=poller.get_max_age(api_wrapper) を渡すことで、
+  通信せずに公開済みのスナップショットを使用する
+  (取得が止まり、スナップショットが古くなった場合は、通常通りAPIより取得する)
+- 最良気配(買い注文、売り注文の最も有利な価格)が変わった場合に、登録した関数を呼び出す
+'''
+# 最良気配(注文が無い側はNone)
+BestQuote = namedtuple('BestQuote', 'bid ask')
+
+# 市場毎の取得状況
+# age: 最後に公開したスナップショットの経過時間[秒](未取得の場合はNone)
+# is_stale: スナップショットが古い(未取得を含む)かどうか
+# last_error: 最後の取得で発生した例外(成功した場合はNone)
+PollerStatus = namedtuple('PollerStatus'
+        , 'market_key age is_stale fetch_count error_count last_error'
+)
+
+# スナップショットを古いとするまでの、API使用可能間隔に対する倍数
+STALE_SPANS = 3
+
+# スナップショットを古いとするまでの最短の時間[秒]
+MIN_STALE_AFTER = 1.0
+
+# 取得後、次の取得までに待つ最短の時間[秒]
+# (API使用可能間隔が0の市場でも、スレッドが待たずに取得し続けないようにする)
+MIN_POLL_INTERVAL = 0.01
+
+class PolledMarket(object):
+    '''
+    取得対象の市場と、その取得状況
+    '''
+    def __init__(self, api_wrapper, interval, stale_after):
+        self.api_wrapper = api_wrapper
+        self.interval = interval
+        self.stale_after = stale_after
+
+        self.snapshot = None
+        self.quote = None
+        self.fetch_count = 0
+        self.error_count = 0
+        self.last_error = None
+
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def get_status(self):
+        '''
+        取得状況を得る
+        '''
+        snapshot = self.snapshot
+        age = None if snapshot is None else snapshot.get_age()
+        return PollerStatus(self.api_wrapper.get_market_key(), age
+                , age is None or self.stale_after < age
+                , self.fetch_count, self.error_count, self.last_error
+        )
+
+class DepthPoller(object):
+    '''
+    登録した市場のdepthをバックグラウンドで取得し続ける
+    '''
+    def __init__(self, interval=0.0, error_interval=1.0):
+        '''
+        interval: 取得後、次の取得までに待つ時間[秒](API使用可能間隔の待ちとは別に待つ、最短 MIN_POLL_INTERVAL)
+        error_interval: 取得に失敗した場合に、次の取得までに待つ時間[秒](最短 MIN_POLL_INTERVAL)
+        '''
+        self.interval = interval
+        self.error_interval = error_interval
+
+        # 市場のキー -> PolledMarket
+        self.__markets = {}
+        # 最良気配が変わった場合に呼び出す関数の一覧
+        self.__listeners = []
+        self.__running = False
+        self.__lock = threading.Lock()
+
+    def add_listener(self, listener):
+        '''
+        最良気配が変わった場合に呼び出す関数を登録する
+        listener(api_wrapper, quote, previous_quote) は取得したスレッドで呼び出される
+        (previous_quote は初回の取得ではNone)
+        '''
+        with self.__lock:
+            self.__listeners = self.__listeners + [listener]
+
+    def remove_listener(self, listener):
+        '''
+        登録した関数を解除する
+        '''
+        with self.__lock:
+            self.__listeners = [l for l in self.__listeners if l is not listener]
+
+    def register(self, api_wrapper, interval=None, stale_after=None):
+        '''
+        市場を登録する(開始済みの場合は、即座に取得を開始する)
+        interval: 取得後、次の取得までに待つ時間[秒](省略時はDepthPollerの既定値)
+        stale_after: スナップショットを古いとするまでの時間[秒]
+                     (省略時はAPI使用可能間隔のSTALE_SPANS倍、最短MIN_STALE_AFTER)
+        '''
+        if stale_after is None:
+            stale_after = max(MIN_STALE_AFTER, api_wrapper.api_available_span * STALE_SPANS)
+
+        market = PolledMarket(api_wrapper, self.interval if interval is None else interval
+                , stale_after
+        )
+        with self.__lock:
+            key = api_wrapper.get_market_key()
+            old = self.__markets.get(key)
+            self.__markets[key] = market
+            if self.__running:
+                self.__start_market(market)
+
+        if old is not None:
+            old.stop_event.set()
+
+        return market
+
+    def unregister(self, api_wrapper):
+        '''
+        市場の登録を解除し、取得を止める
+        '''
+        with self.__lock:
+            market = self.__markets.pop(api_wrapper.get_market_key(), None)
+
+        if market is not None:
+            market.stop_event.set()
+
+    def start(self):
+        '''
+        登録した全ての市場の取得を開始する
+        '''
+        with self.__lock:
+            if not self.__running:
+                self.__running = True
+                for market in self.__markets.values():
+                    self.__start_market(market)
+
+        return self
+
+    def stop(self, timeout=None):
+        '''
+        全ての市場の取得を止める
+        timeout: スレッドの終了を待つ時間[秒](Noneの場合は終了するまで待つ)
+        (取得中、API使用可能待ちのスレッドは、それらが終わってから終了する)
+        '''
+        with self.__lock:
+            self.__running = False
+            markets = self.__markets.values()
+
+        for market in markets:
+            market.stop_event.set()
+
+        deadline = None if timeout is None else time.time() + timeout
+        for market in markets:
+            if market.thread is not None:
+                market.thread.join(None if deadline is None else max(0, deadline - time.time()))
+                market.thread = None
+
+    def is_running(self):
+        return self.__running
+
+    def __start_market(self, market):
+        '''
+        市場の取得スレッドを起動する
+        '''
+        # 終了中の前のスレッドと区別するため、スレッド毎に停止用のイベントを作成する
+        market.stop_event = threading.Event()
+        market.thread = threading.Thread(target=self.__run, args=(market, market.stop_event)
+                , name='depth-poller-%s-%s-%s-%s' % market.api_wrapper.get_market_key()
+        )
+        market.thread.daemon = True
+        market.thread.start()
+
+    def __run(self, market, stop_event):
+        '''
+        止めるまで、市場のdepthを取得し続ける
+        '''
+        api_wrapper = market.api_wrapper
+        while not stop_event.is_set():
+            try:
+                # API使用可能間隔は、APIラッパーのトークンバケットで待つ
+                snapshot = api_wrapper.refresh_depth_snapshot_sync(normalize=True)
+
+            except Exception as e:
+                market.error_count += 1
+                market.last_error = e
+                logger.warning('depth poll failed. key=%s', api_wrapper.get_market_key()
+                        , exc_info=True
+                )
+                stop_event.wait(max(self.error_interval, MIN_POLL_INTERVAL))
+                continue
+
+            market.fetch_count += 1
+            market.last_error = None
+            self.__publish(market, snapshot)
+
+            stop_event.wait(max(market.interval, MIN_POLL_INTERVAL))
+
+    def __publish(self, market, snapshot):
+        '''
+        取得したスナップショットを記録し、最良気配が変わっていれば登録した関数を呼び出す
+        '''
+        api_wrapper = market.api_wrapper
+        bids = snapshot.get_levels(True, api_wrapper.normalize_buy_orders)
+        asks = snapshot.get_levels(False, api_wrapper.normalize_sell_orders)
+        quote = BestQuote(bids[0].price if bids else None, asks[0].price if asks else None)
+
+        previous_quote = market.quote
+        market.snapshot = snapshot
+        market.quote = quote
+        if quote == previous_quote:
+            return
+
+        for listener in self.__listeners:
+            try:
+                listener(api_wrapper, quote, previous_quote)
+            except Exception:
+                logger.exception('depth poller listener failed. key=%s'
+                        , api_wrapper.get_market_key()
+                )
+
+    def __get_market(self, api_wrapper):
+        return self.__markets.get(api_wrapper.get_market_key())
+
+    def get_snapshot(self, api_wrapper):
+        '''
+        最後に取得したスナップショットを、通信せずに得る(未登録、未取得の場合はNone)
+        '''
+        market = self.__get_market(api_wrapper)
+        return None if market is None else market.snapshot
+
+    def get_quote(self, api_wrapper):
+        '''
+        最後に取得した最良気配を得る(未登録、未取得の場合はNone)
+        '''
+        market = self.__get_market(api_wrapper)
+        return None if market is None else market.quote
+
+    def get_max_age(self, api_wrapper):
+        '''
+        注文計画に渡す、許容するスナップショットの経過時間[秒]を得る
+        (未登録の場合はNoneとなり、APIラッパーの既定値を使用する)
+        '''
+        market = self.__get_market(api_wrapper)
+        return None if market is None else market.stale_after
+
+    def get_status(self, api_wrapper):
+        '''
+        市場の取得状況を PollerStatus で得る(未登録の場合はNone)
+        '''
+        market = self.__get_market(api_wrapper)
+        return None if market is None else market.get_status()
+
+    def get_statuses(self):
+        '''
+        全ての市場の取得状況を PollerStatus の一覧で得る
+        '''
+        return [market.get_status() for market in self.__markets.values()]
+
+    def get_stale_markets(self):
+        '''
+        スナップショットが古い(未取得を含む)市場のキーの一覧を得る
+        '''
+        return [status.market_key for status in self.get_statuses() if status.is_stale]
@@ -0,0 +1,276 @@
+# -*- encoding:UTF-8 -*-
+from collections import deque
+import logging, threading, time, Queue
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+冪等なリクエスト(depth等の認証不要のAPI)のヘッジ、再試行
+- 最初のリクエストが、観測した応答時間のパーセンタイル以内に応答しない場合、
+  2つ目のリクエストを送信し、先に応答した方を使用する
+- 失敗した場合は、ジッター付きの指数バックオフで再試行する
+- ヘッジ、再試行もトークンバケットのトークンを使用し、API使用可能間隔を超えて送信しない
+  (ヘッジを送信する時にトークンが無い場合は、次のトークンの時刻まで最初のリクエストを待ってから再度試す)
+- 再試行の回数、待ち時間、失敗の判定は Retries にまとめ、同期版、非同期版のAPIラッパーで共有する
+- 認証が必要なAPI(残高取得、発注、注文取消等)には使用しないこと
+'''
+# 失敗として再試行するHTTPステータスコード
+RETRY_STATUS_CODES = frozenset((429, 500, 502, 503, 504))
+
+# ヘッジのトークンを再度試すまでの最短の待ち時間[秒]
+MIN_HEDGE_RETRY_DELAY = 0.001
+
+class LatencyTracker(object):
+    '''
+    直近の応答時間を保持し、パーセンタイルを得る
+    '''
+    def __init__(self, window=100):
+        '''
+        window: 保持する応答時間の件数
+        '''
+        self.__latencies = deque(maxlen=window)
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__latencies)
+
+    def observe(self, latency):
+        with self.__lock:
+            self.__latencies.append(latency)
+
+    def get_percentile(self, percentile):
+        '''
+        応答時間のパーセンタイルを得る(応答時間が無い場合はNone)
+        percentile: 0 - 1 の割合
+        '''
+        with self.__lock:
+            latencies = sorted(self.__latencies)
+
+        if not latencies:
+            return None
+
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile))]
+
+def is_failed_response(r):
+    '''
+    再試行するレスポンス(HTTPステータスコードがサーバエラー、リクエスト過多)かどうか
+    '''
+    return getattr(r, 'status_code', None) in RETRY_STATUS_CODES
+
+class Retries(object):
+    '''
+    1回の冪等なリクエストの試行(再試行を含む)の状態
+    反復すると、各試行の前に待つ時間[秒](最初の試行は0)を返す
+    '''
+    def __init__(self, policy, key):
+        self.policy = policy
+        self.key = key
+        self.attempt = 0
+
+    def __iter__(self):
+        policy = self.policy
+        for attempt in xrange(policy.max_retries + 1):
+            self.attempt = attempt
+            yield policy.get_backoff(attempt) if attempt else 0.0
+
+    def retry_on_error(self):
+        '''
+        試行で例外が発生した場合に、再試行するかどうか(最後の試行の場合はFalse)
+        '''
+        if self.policy.max_retries <= self.attempt:
+            return False
+
+        logger.warning('idempotent request failed. key=%s, attempt=%s'
+                , self.key, self.attempt, exc_info=True
+        )
+        return True
+
+    def retry_on_response(self, r):
+        '''
+        レスポンスが失敗の場合に、再試行するかどうか(最後の試行の場合はFalse)
+        '''
+        if not self.policy.is_failure(r) or self.policy.max_retries <= self.attempt:
+            return False
+
+        logger.warning('idempotent request failed. key=%s, attempt=%s, status_code=%s'
+                , self.key, self.attempt, getattr(r, 'status_code', None)
+        )
+        return True
+
+class HedgePolicy(object):
+    '''
+    冪等なリクエストのヘッジ、再試行の方針
+    応答時間はキー(取引所ホスト等)毎に記録する
+    '''
+    def __init__(self, percentile=0.95, min_delay=0.05, max_delay=None, initial_delay=1.0
+            , min_samples=10, window=100, max_retries=2, backoff=0.1, max_backoff=2.0
+            , is_failure=is_failed_response
+    ):
+        '''
+        percentile: ヘッジを送信するまでの待ち時間とする、応答時間のパーセンタイル(0 - 1)
+        min_delay: ヘッジを送信するまでの最短の待ち時間[秒]
+        max_delay: ヘッジを送信するまでの最長の待ち時間[秒](Noneの場合は制限しない)
+        initial_delay: 応答時間がmin_samples件に満たない間の待ち時間[秒](Noneの場合はヘッジしない)
+        min_samples: パーセンタイルを使用する応答時間の最小件数
+        window: キー毎に保持する応答時間の件数
+        max_retries: 再試行の最大回数(0の場合は再試行しない)
+        backoff: 最初の再試行までの待ち時間の上限[秒](再試行毎に2倍にする)
+        max_backoff: 再試行までの待ち時間の上限の最大値[秒]
+        is_failure: レスポンスを受け取り、失敗として再試行するかどうかを返す関数
+        '''
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.is_failure = is_failure
+
+        # キー -> LatencyTracker
+        self.__trackers = {}
+        self.__lock = threading.Lock()
+
+    def get_tracker(self, key):
+        '''
+        キーの応答時間の記録を得る(未作成の場合は作成する)
+        '''
+        tracker = self.__trackers.get(key)
+        if tracker is None:
+            with self.__lock:
+                tracker = self.__trackers.setdefault(key, LatencyTracker(self.window))
+
+        return tracker
+
+    def observe(self, key, latency):
+        '''
+        応答時間を記録する
+        '''
+        self.get_tracker(key).observe(latency)
+
+    def get_hedge_delay(self, key):
+        '''
+        ヘッジを送信するまでの待ち時間[秒]を得る(ヘッジしない場合はNone)
+        '''
+        tracker = self.get_tracker(key)
+        if len(tracker) < self.min_samples:
+            return self.initial_delay
+
+        delay = max(self.min_delay, tracker.get_percentile(self.percentile))
+        return delay if self.max_delay is None else min(self.max_delay, delay)
+
+    def get_backoff(self, attempt):
+        '''
+        attempt回目の再試行までの待ち時間[秒]を得る(0 - 上限 の一様乱数)
+        '''
+        # randomは起動時に読み込まないよう、必要な場合のみ読み込む
+        import random
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** (attempt - 1))))
+
+    def retries(self, key):
+        '''
+        1回のリクエストの試行の状態 Retries を得る
+        '''
+        return Retries(self, key)
+
+    def try_hedge(self, key, try_acquire, get_wait=None):
+        '''
+        ヘッジを送信するトークンを待たずに取得する
+        取得できた場合はNone、取得できなかった場合は再度試すまでの待ち時間[秒]を返す
+        try_acquire: 待たずにAPIを使用できる場合のみTrueを返す関数
+        get_wait: トークンを取得せずに、使用可能になるまでの待ち時間[秒]を返す関数
+                  (省略時は min_delay 毎に再度試す)
+        '''
+        if try_acquire():
+            logger.debug('hedged request sent. key=%s', key)
+            return None
+
+        return max(MIN_HEDGE_RETRY_DELAY, self.min_delay if get_wait is None else get_wait())
+
+    def call(self, key, send, acquire, try_acquire, get_wait=None):
+        '''
+        リクエストを送信し、レスポンスを得る(ヘッジ、再試行を行う)
+        最後の試行も失敗した場合は、例外を送出する(レスポンスが失敗の場合はそのレスポンスを返す)
+        key: 応答時間を記録するキー
+        send: リクエストを送信し、レスポンスを返す関数(API使用可能になるまでは待たない)
+        acquire: API使用可能になるまで待つ関数
+        try_acquire: 待たずにAPIを使用できる場合のみTrueを返す関数
+        get_wait: トークンを取得せずに、使用可能になるまでの待ち時間[秒]を返す関数
+        '''
+        retries = self.retries(key)
+        for backoff in retries:
+            if backoff:
+                time.sleep(backoff)
+
+            acquire()
+            try:
+                r = self.__call_hedged(key, send, try_acquire, get_wait)
+
+            except Exception:
+                if retries.retry_on_error():
+                    continue
+                raise
+
+            if not retries.retry_on_response(r):
+                return r
+
+    def __call_hedged(self, key, send, try_acquire, get_wait):
+        '''
+        リクエストを送信し、応答が遅い場合はヘッジを送信して、先に成功した方のレスポンスを得る
+        全て失敗した場合は、最初のリクエストの結果(レスポンス、または例外)とする
+        '''
+        results = Queue.Queue()
+
+        def run():
+            start = time.time()
+            try:
+                r = send()
+            except Exception as e:
+                results.put((False, e))
+                return
+
+            self.observe(key, time.time() - start)
+            results.put((True, r))
+
+        def start_thread():
+            thread = threading.Thread(target=run)
+            thread.daemon = True
+            thread.start()
+
+        start_thread()
+        pending = 1
+        hedge_delay = self.get_hedge_delay(key)
+
+        first = None
+        while pending:
+            try:
+                # ヘッジの送信前は、ヘッジを送信するまでの待ち時間だけ待つ
+                succeeded, result = results.get(timeout=hedge_delay)
+
+            except Queue.Empty:
+                # 応答が遅いため、トークンを取得できればヘッジを送信する
+                # (取得できなければ、次のトークンの時刻まで最初のリクエストを待つ)
+                hedge_delay = self.try_hedge(key, try_acquire, get_wait)
+                if hedge_delay is None:
+                    start_thread()
+                    pending += 1
+                continue
+
+            pending -= 1
+            if succeeded and not self.is_failure(result):
+                return result
+
+            if first is None:
+                first = (succeeded, result)
+
+        succeeded, result = first
+        if not succeeded:
+            raise result
+
+        return result
@@ -0,0 +1,118 @@
+# -*- encoding:UTF-8 -*-
+import logging, re
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+JSONのデコード
+- レスポンスの本文(bytes)をそのままデコードする
+- simplejsonがインストールされていれば、それを使用する(無ければ標準のjson)
+- depthの片側(買い注文一覧 or 売り注文一覧)のみを取り出す
+  (片側のみのデコードには raw_decode を使用するため、raw_decode を持たない ujson は使用しない。
+   ujsonで片側の範囲を切り出してデコードする方法は、範囲の探索がPythonの処理となり標準のjsonより遅い)
+- JSONライブラリは最初のデコード時に読み込む
+'''
+class JsonBackend(object):
+    '''
+    JSONライブラリ
+    '''
+    def __init__(self, name, loads, decoder=None):
+        '''
+        name: ライブラリ名
+        loads: JSON文字列全体をデコードする関数
+        decoder: raw_decode を持つデコーダ(省略時は標準のjson)
+                 指定したキーの値のみを取り出す場合に使用する
+        '''
+        if decoder is None:
+            import json
+            decoder = json.JSONDecoder()
+
+        self.name = name
+        self.loads = loads
+        self.decoder = decoder
+
+def __load_simplejson():
+    import simplejson
+    return JsonBackend('simplejson', simplejson.loads, simplejson.JSONDecoder())
+
+def __load_json():
+    import json
+    return JsonBackend('json', json.loads)
+
+# 使用を試みるライブラリ(優先順)
+__loaders = ((u'simplejson', __load_simplejson), (u'json', __load_json))
+
+def __find_backend():
+    '''
+    インストールされているJSONライブラリのうち、最も優先度の高いものを得る
+    '''
+    for name, loader in __loaders:
+        try:
+            return loader()
+        except ImportError:
+            logger.debug('json backend is not installed. name=%s', name)
+
+    return __load_json()
+
+# 使用中のJSONライブラリ(最初の参照時に決める)
+__backend = [None]
+
+def get_backend():
+    '''
+    使用中のJSONライブラリを得る
+    '''
+    backend = __backend[0]
+    if backend is None:
+        backend = __backend[0] = __find_backend()
+
+    return backend
+
+def set_backend(backend):
+    '''
+    使用するJSONライブラリを差し替える
+    '''
+    __backend[0] = backend
+
+def loads(data):
+    '''
+    JSON文字列(bytes、unicodeのどちらでもよい)全体をデコードする
+    '''
+    return (__backend[0] or get_backend()).loads(data)
+
+# キー -> キーと区切り文字に一致する正規表現
+__key_patterns = {}
+
+def __get_key_pattern(key):
+    pattern = __key_patterns.get(key)
+    if pattern is None:
+        pattern = re.compile(r'"%s"\s*:\s*' % re.escape(key))
+        __key_patterns[key] = pattern
+
+    return pattern
+
+def extract(data, path):
+    '''
+    JSON文字列から、キーの経路(例: ('data', 'buy'))の値のみをデコードする
+    - 経路の各キーを順に文字列から探し、最後のキーの値のみを raw_decode でデコードする
+    - 他のキーの値はPythonのオブジェクトにしない
+    - キーが見つからない場合は、全体をデコードしてから経路をたどる
+
+    注意: キーと同じ文字列("<キー>":)が値の中に現れない形式であること(depthの価格、数量は該当しない)
+    '''
+    position = 0
+    for key in path:
+        match = __get_key_pattern(key).search(data, position)
+        if match is None:
+            logger.debug('json key is not found. path=%s', path)
+            value = loads(data)
+            for key in path:
+                value = value[key]
+            return value
+
+        position = match.end()
+
+    return (__backend[0] or get_backend()).decoder.raw_decode(data, position)[0]
@@ -0,0 +1,187 @@
+# -*- encoding:UTF-8 -*-
+from bisect import bisect_left
+import logging, threading
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+処理時間等の計測値の集計
+- 取引所、市場、エンドポイント毎に、ヒストグラムとカウンタで集計する
+- 既定では無効(enabled=False)であり、無効の間は計測自体を行わない
+- snapshot() で辞書として、to_prometheus() でPrometheusのテキスト形式として得る
+'''
+# ラベル名(ラベルの値はこの順序のタプルで指定する)
+LABEL_NAMES = ('exchange', 'market', 'endpoint')
+
+# ヒストグラムの区間の上限[秒]
+DEFAULT_BUCKETS = (
+        0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# Prometheusのメトリクス名の接頭辞
+PROMETHEUS_PREFIX = 'api_wrapper_'
+
+class Histogram(object):
+    '''
+    区間毎の件数、合計、件数を持つヒストグラム
+    '''
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # 最後の要素は上限を超えた件数
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_cumulative_counts(self):
+        '''
+        (区間の上限, 上限以下の件数) の一覧を得る(最後の区間の上限は '+Inf')
+        '''
+        result = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            result.append((bound, cumulative))
+
+        return result
+
+class MetricsRegistry(object):
+    '''
+    計測値の集計先
+    '''
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS):
+        '''
+        enabled: 計測を行うかどうか
+        buckets: ヒストグラムの区間の上限
+        '''
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+
+        # メトリクス名 -> ラベルの値 -> Histogram
+        self.__histograms = {}
+        # メトリクス名 -> ラベルの値 -> 値
+        self.__counters = {}
+        self.__lock = threading.Lock()
+
+    def observe(self, name, labels, value):
+        '''
+        ヒストグラムに値を加える
+        labels: LABEL_NAMES の順序のラベルの値
+        '''
+        with self.__lock:
+            histograms = self.__histograms.get(name)
+            if histograms is None:
+                histograms = self.__histograms[name] = {}
+
+            histogram = histograms.get(labels)
+            if histogram is None:
+                histogram = histograms[labels] = Histogram(self.buckets)
+
+            histogram.observe(value)
+
+    def increment(self, name, labels, value=1):
+        '''
+        カウンタに値を加える
+        '''
+        with self.__lock:
+            counters = self.__counters.get(name)
+            if counters is None:
+                counters = self.__counters[name] = {}
+
+            counters[labels] = counters.get(labels, 0) + value
+
+    def clear(self):
+        '''
+        集計値を破棄する
+        '''
+        with self.__lock:
+            self.__histograms.clear()
+            self.__counters.clear()
+
+    def snapshot(self):
+        '''
+        集計値を辞書で得る
+        {
+            'histograms': {メトリクス名: [{'labels': {...}, 'count': 件数, 'sum': 合計
+                    , 'buckets': [[区間の上限, 上限以下の件数], ...]}, ...]}
+            , 'counters': {メトリクス名: [{'labels': {...}, 'value': 値}, ...]}
+        }
+        '''
+        with self.__lock:
+            histograms = dict(
+                    (name, [{
+                            'labels': dict(zip(LABEL_NAMES, labels))
+                            , 'count': histogram.count, 'sum': histogram.sum
+                            , 'buckets': [list(bucket) for bucket in histogram.get_cumulative_counts()]
+                    } for labels, histogram in sorted(values.items())])
+                    for name, values in self.__histograms.items()
+            )
+            counters = dict(
+                    (name, [{'labels': dict(zip(LABEL_NAMES, labels)), 'value': value}
+                            for labels, value in sorted(values.items())
+                    ])
+                    for name, values in self.__counters.items()
+            )
+
+        return {'histograms': histograms, 'counters': counters}
+
+    @staticmethod
+    def __format_labels(labels):
+        '''
+        ラベルをPrometheusの形式(name="value",...)にする
+        '''
+        return ','.join(
+                '%s="%s"' % (name, unicode(labels[name]).replace('\\', '\\\\')
+                        .replace('"', '\\"').replace('\n', '\\n')
+                ) for name in LABEL_NAMES
+        )
+
+    def to_prometheus(self):
+        '''
+        集計値をPrometheusのテキスト形式で得る
+        '''
+        snapshot = self.snapshot()
+        lines = []
+
+        for name, values in sorted(snapshot['histograms'].items()):
+            name = PROMETHEUS_PREFIX + name
+            lines.append('# TYPE %s histogram' % name)
+            for value in values:
+                labels = self.__format_labels(value['labels'])
+                for bound, count in value['buckets']:
+                    lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, bound, count))
+                lines.append('%s_sum{%s} %r' % (name, labels, float(value['sum'])))
+                lines.append('%s_count{%s} %d' % (name, labels, value['count']))
+
+        for name, values in sorted(snapshot['counters'].items()):
+            name = PROMETHEUS_PREFIX + name
+            lines.append('# TYPE %s counter' % name)
+            for value in values:
+                lines.append('%s{%s} %r' % (
+                        name, self.__format_labels(value['labels']), float(value['value'])
+                ))
+
+        return '\n'.join(lines) + '\n'
+
+# 全てのAPIラッパーで共有する集計先(既定では無効)
+shared_metrics = MetricsRegistry()
+
+def enable(registry=shared_metrics):
+    '''
+    計測を有効にする
+    '''
+    registry.enabled = True
+
+def disable(registry=shared_metrics):
+    '''
+    計測を無効にする
+    '''
+    registry.enabled = False
@@ -5,7 +5,7 @@ from django.db import models
 
 from utils.validators import UppercaseValidators
 
-from api_wrapper import get_api_wrapper
+from wrapper_pool import get_api_wrapper_instance
 
 logger = logging.getLogger(__name__)
 
@@ -60,5 +60,6 @@ class Market(models.Model):
     def get_api_wrapper_instance(self):
         '''
         APIサポートクラスのインスタンスを得る
+        同じ市場では同じインスタンス(接続、depthスナップショット等)を使い回す
         '''
-        return get_api_wrapper(self.api_util_class)(self)
+        return get_api_wrapper_instance(self)
@@ -0,0 +1,520 @@
+# -*- encoding:UTF-8 -*-
+from collections import namedtuple
+import logging
+
+import numpy as np
+
+from api_coordinator import get_currency_deltas
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+配列で保持する注文一覧と、それを使用した注文計画
+- api_coordinator の get_order_plan_* と同じ結果を返す
+- 約定を見込める範囲は、累積和の二分探索で見積もった位置までの残数量を配列で求めて確定し、
+  打ち切り位置の付近のみ api_coordinator と同じ手順で1注文ずつ処理する
+- 残数量は api_coordinator と同じ丸めの結果とするため、先頭から順に減算する
+  (累積和との差では末尾の桁が一致しないため、打ち切り位置までの注文数に比例する処理となる)
+- 複数の数量を計画する場合は、二分探索、残数量の減算を全ての数量について1度の配列演算で行う
+'''
+# 最低注文数に満たない注文をまとめた後の注文一覧
+# index: 注文一覧でのまとめ先の注文の位置
+# price_list, amount_list: まとめ先の注文の価格、数量(まとめた数量を含む)
+# fraction_list: まとめ先の注文に含めた、最低注文数以下の注文数量合計
+# notional_list: 価格 * 数量
+# cut: 使用できる注文数(数量0の注文で打ち切られる位置)
+# cum_amounts, cum_notionals: 数量、価格 * 数量 の累積和
+# stall_with_base, stall_with_counter: 相対通貨、基本通貨の取引数量が増えない最初の位置
+MergedLevels = namedtuple('MergedLevels'
+        , 'index price_list amount_list fraction_list notional_list cut'
+        ' amounts notionals cum_amounts cum_notionals stall_with_base stall_with_counter'
+)
+
+class ArrayOrderBook(object):
+    '''
+    約定させる順に並べた片側の注文一覧を、価格、数量の配列で保持する
+    (買い注文を計画する場合は売り注文一覧、売り注文を計画する場合は買い注文一覧)
+    '''
+    def __init__(self, price_list, amount_list, is_ascending, min_trade_amount):
+        '''
+        price_list: 価格の一覧(最小価格単位で切り捨て済み)
+        amount_list: 数量の一覧(最小注文単位で切り捨て済み)
+        is_ascending: 価格の昇順かどうか(売り注文一覧の場合はTrue)
+        min_trade_amount: 最低注文数
+        '''
+        self.price_list = price_list
+        self.amount_list = amount_list
+        self.prices = np.array(price_list, dtype=np.float64)
+        self.amounts = np.array(amount_list, dtype=np.float64)
+        self.is_ascending = is_ascending
+        self.min_trade_amount = min_trade_amount
+
+        self.__merged = None
+        self.__price_floors = None
+        self.__prefix_sums = None
+
+    @classmethod
+    def from_api_wrapper(cls, api_wrapper, is_buy_order, max_age=None):
+        '''
+        APIよりdepthを取得し、(買い|売り)注文を計画するための注文一覧を作成する
+        同じdepthスナップショットからは1度だけ作成し、累積和等も共有する
+        '''
+        snapshot = api_wrapper.get_depth_snapshot(max_age)
+
+        def build():
+            levels = snapshot.get_levels(False, api_wrapper.normalize_sell_orders) if is_buy_order \
+                    else snapshot.get_levels(True, api_wrapper.normalize_buy_orders)
+
+            return cls(
+                    [level.price for level in levels], [level.amount for level in levels]
+                    , is_buy_order, api_wrapper.min_trade_amount
+            )
+
+        return snapshot.get_derived((cls, is_buy_order, api_wrapper.min_trade_amount), build)
+
+    def __len__(self):
+        return len(self.price_list)
+
+    def get_price_cut(self, order_price):
+        '''
+        注文価格で約定を見込める注文数を得る
+        '''
+        if self.is_ascending:
+            return int(np.searchsorted(self.prices, order_price, 'right'))
+
+        return int(np.searchsorted(-self.prices, -order_price, 'right'))
+
+    def __merge_fractions(self):
+        '''
+        最低注文数に満たない注文を、次の注文にまとめる
+        最低注文数に満たない注文の位置のみを順に処理する
+        '''
+        m = self.min_trade_amount
+        n = len(self.amount_list)
+
+        closes = np.ones(n, dtype=bool)
+        amount_list = list(self.amount_list)
+        fraction_list = [0] * n
+        cut = n
+
+        fraction = 0
+        prev = -1
+        for i in np.flatnonzero(self.amounts < m).tolist():
+            if fraction and i != prev + 1:
+                # 直前の端数は、最低注文数以上の次の注文にまとまる
+                amount_list[prev + 1] = fraction + self.amount_list[prev + 1]
+                fraction_list[prev + 1] = fraction
+                fraction = 0
+
+            amount = fraction + self.amount_list[i]
+            if amount < m:
+                if amount == fraction:
+                    # 注文が取得出来ない場合
+                    cut = i
+                    break
+
+                fraction = amount
+                closes[i] = False
+
+            else:
+                amount_list[i] = amount
+                fraction_list[i] = fraction
+                fraction = 0
+
+            prev = i
+
+        else:
+            if fraction and prev + 1 < n:
+                amount_list[prev + 1] = fraction + self.amount_list[prev + 1]
+                fraction_list[prev + 1] = fraction
+
+        index = np.flatnonzero(closes[:cut])
+        index_list = index.tolist()
+
+        price_list = [self.price_list[i] for i in index_list]
+        amount_list = [amount_list[i] for i in index_list]
+        fraction_list = [fraction_list[i] for i in index_list]
+        notional_list = [price * amount for price, amount in zip(price_list, amount_list)]
+
+        amounts = np.array(amount_list, dtype=np.float64)
+        notionals = np.array(notional_list, dtype=np.float64)
+        cum_amounts = np.add.accumulate(amounts)
+        cum_notionals = np.add.accumulate(notionals)
+
+        # 端数をまとめておらず、取引数量が増えない位置
+        no_fraction = np.array(fraction_list, dtype=np.float64) == 0
+        stall_with_base = np.flatnonzero(
+                no_fraction & (cum_notionals == np.concatenate(([0.0], cum_notionals[:-1])))
+        )
+        stall_with_counter = np.flatnonzero(
+                no_fraction & (cum_amounts == np.concatenate(([0.0], cum_amounts[:-1])))
+        )
+
+        return MergedLevels(
+                index, price_list, amount_list, fraction_list, notional_list, cut
+                , amounts, notionals, cum_amounts, cum_notionals
+                , int(stall_with_base[0]) if len(stall_with_base) else len(index_list)
+                , int(stall_with_counter[0]) if len(stall_with_counter) else len(index_list)
+        )
+
+    def get_merged(self):
+        '''
+        最低注文数に満たない注文をまとめた後の注文一覧を得る
+        '''
+        if self.__merged is None:
+            self.__merged = self.__merge_fractions()
+
+        return self.__merged
+
+    def get_price_floors(self):
+        '''
+        まとめ先の注文毎に、まとめた注文の 価格 * 最低注文数 の最大値を得る
+        (相対通貨の残数量がこれを下回ると、途中の注文で打ち切られる)
+        '''
+        if self.__price_floors is None:
+            merged = self.get_merged()
+            if len(merged.index):
+                starts = np.concatenate(([0], merged.index[:-1] + 1))
+                self.__price_floors = np.maximum.reduceat(
+                        self.prices[:merged.cut] * self.min_trade_amount, starts
+                )
+            else:
+                self.__price_floors = np.zeros(0)
+
+        return self.__price_floors
+
+    def get_prefix_sums(self):
+        '''
+        まとめた後の注文一覧の 数量、価格 * 数量 を先頭から順に加算した値の一覧を得る
+        (i番目の値は先頭i件の合計であり、reduce で先頭から加算した値と一致する)
+        '''
+        if self.__prefix_sums is None:
+            merged = self.get_merged()
+            amount_sums = [0]
+            notional_sums = [0]
+            for amount, notional in zip(merged.amount_list, merged.notional_list):
+                amount_sums.append(amount_sums[-1] + amount)
+                notional_sums.append(notional_sums[-1] + notional)
+
+            self.__prefix_sums = (amount_sums, notional_sums)
+
+        return self.__prefix_sums
+
+def __find_firsts(starts, decrements, sums, limit, estimates, violates):
+    '''
+    starts の値毎に、decrements を順に減算した残数量が violates を満たす最初の位置(満たさない場合はlimit)と、
+    その位置までを減算した残数量を得る
+    (残数量は reduce で先頭から減算した値と一致する)
+    全ての値の減算を、1行に1つの値を置いた配列の行毎の累積で行う
+    sums: decrements を先頭から加算した値の一覧(整数のみを減算した場合は、reduce と同じく整数で返す)
+    estimates: 値毎の、violates を満たす位置の見積もり
+    '''
+    results = [None] * len(starts)
+    pending = range(len(starts))
+    hi = min(limit, max(max(estimates) + 2, 16)) if estimates else 0
+    if not hi:
+        # 1件も減算しない場合は、渡された値のまま返す
+        return [(0, start) for start in starts]
+
+    while pending:
+        table = np.empty((len(pending), hi + 1), dtype=np.float64)
+        table[:, 0] = [starts[j] for j in pending]
+        table[:, 1:] = decrements[:hi]
+        lefts = np.subtract.accumulate(table, axis=1)
+        hits = violates(lefts[:, :hi])
+        founds = hits.any(axis=1).tolist()
+        firsts = hits.argmax(axis=1).tolist()
+
+        rest = []
+        for row, j in enumerate(pending):
+            if not founds[row] and hi < limit:
+                # 見積もった範囲に無い場合は、範囲を広げて探し直す
+                rest.append(j)
+                continue
+
+            k = firsts[row] if founds[row] else limit
+            left = starts[j]
+            if not k:
+                # 1件も減算しない場合は、渡された値のまま返す
+                results[j] = (k, left)
+
+            elif isinstance(left, float) or isinstance(sums[k], float):
+                results[j] = (k, float(lefts[row, k]))
+
+            else:
+                results[j] = (k, int(lefts[row, k]))
+
+        pending = rest
+        hi = min(limit, hi * 4)
+
+    return results
+
+def __search_with_base_amount(book, order_amounts, level_cut):
+    '''
+    注文数毎に、先頭から全ての注文が約定を見込める注文数と、その注文までの残りの注文数量を得る
+    '''
+    merged = book.get_merged()
+
+    # 残りの注文数量が注文数量以下となる位置までは、全ての注文が約定を見込める
+    closes = int(np.searchsorted(merged.index, min(level_cut, merged.cut)))
+    amounts = merged.amounts
+    return __find_firsts(
+            order_amounts, amounts, book.get_prefix_sums()[0]
+            , min(closes, merged.stall_with_base)
+            , np.searchsorted(merged.cum_amounts, order_amounts).tolist()
+            , lambda lefts: lefts <= amounts[:lefts.shape[-1]]
+    )
+
+def __get_order_plan_with_base_amount(book, k, left_amount, level_cut):
+    '''
+    __search_with_base_amount で得た位置以降を処理し、
+    約定を見込める注文の一覧、残りの注文数量、相対通貨数量(手数料未計算)を得る
+    '''
+    merged = book.get_merged()
+    m = book.min_trade_amount
+
+    order_list = [[price, amount]
+            for price, amount in zip(merged.price_list[:k], merged.amount_list[:k])
+    ]
+    counter_sum = book.get_prefix_sums()[1][k]
+
+    # 以降は api_coordinator と同じ手順で処理する
+    fraction = 0
+    for i in xrange(int(merged.index[k - 1]) + 1 if k else 0, level_cut):
+        if left_amount < m:
+            # 残りの注文数量が最低注文数量に満たない場合
+            break
+
+        price = book.price_list[i]
+        amount = fraction + book.amount_list[i]
+
+        pre_fraction = fraction
+        pre_counter_sum = counter_sum
+
+        if amount < m:
+            fraction = amount
+
+        elif left_amount <= amount:
+            fraction = 0
+            order_list.append([price, left_amount])
+            counter_sum += price * left_amount
+            left_amount = 0
+
+        else:
+            fraction = 0
+            order_list.append([price, amount])
+            counter_sum += price * amount
+            left_amount -= amount
+
+        if counter_sum == pre_counter_sum and fraction == pre_fraction:
+            # 注文が取得出来ない場合
+            break
+
+    return order_list, left_amount, counter_sum
+
+def get_order_plan_with_base_amount(api_wrapper, is_buy_order, order_amount
+        , max_age=None, order_book=None
+):
+    '''
+    注文数から、約定を見込める(買い|売り)注文の一覧、各通貨の増減数量 を得る
+    api_wrapper: 市場情報
+    is_buy_order: 買い注文かどうか
+    order_amount: 注文数
+    max_age: 許容するdepthスナップショットの経過時間[秒](省略時はapi_wrapperの既定値)
+    order_book: 使用する注文一覧(省略時はAPIより取得する)
+    '''
+    book = ArrayOrderBook.from_api_wrapper(api_wrapper, is_buy_order, max_age) \
+            if order_book is None else order_book
+    [(k, left_amount)] = __search_with_base_amount(book, [order_amount], len(book))
+    order_list, left_amount, counter_sum = __get_order_plan_with_base_amount(
+            book, k, left_amount, len(book)
+    )
+
+    # 注文一覧、各通貨の増減数量 の順序で返す
+    return order_list, get_currency_deltas(
+            api_wrapper, is_buy_order, order_amount - left_amount, counter_sum
+    )
+
+def get_order_plan_with_order(api_wrapper, is_buy_order, order_price, order_amount
+        , max_age=None, order_book=None
+):
+    '''
+    注文から、約定を見込める(買い|売り)注文の一覧、各通貨の増減数量 を得る
+    api_wrapper: 市場情報
+    is_buy_order: 買い注文かどうか
+    order_price: 注文価格
+    order_amount: 注文数
+    max_age: 許容するdepthスナップショットの経過時間[秒](省略時はapi_wrapperの既定値)
+    order_book: 使用する注文一覧(省略時はAPIより取得する)
+    '''
+    book = ArrayOrderBook.from_api_wrapper(api_wrapper, is_buy_order, max_age) \
+            if order_book is None else order_book
+
+    # 注文価格より不利な注文の手前で打ち切る
+    level_cut = book.get_price_cut(order_price)
+    [(k, left_amount)] = __search_with_base_amount(book, [order_amount], level_cut)
+    order_list, left_amount, counter_sum = __get_order_plan_with_base_amount(
+            book, k, left_amount, level_cut
+    )
+
+    # 注文一覧、各通貨の増減数量 の順序で返す
+    return order_list, get_currency_deltas(
+            api_wrapper, is_buy_order, order_amount - left_amount, counter_sum
+    )
+
+def __search_with_counter_amount(book, counter_amounts):
+    '''
+    相対通貨の数量毎に、先頭から全ての注文が約定を見込める注文数と、その注文までの残りの相対通貨数量を得る
+    '''
+    merged = book.get_merged()
+
+    # 残りの相対通貨が 価格 * 数量 以下となる位置までは、全ての注文が約定を見込める
+    notionals = merged.notionals
+    floors = book.get_price_floors()
+    return __find_firsts(
+            counter_amounts, notionals, book.get_prefix_sums()[1]
+            , min(len(merged.index), merged.stall_with_counter)
+            , np.searchsorted(merged.cum_notionals, counter_amounts).tolist()
+            , lambda lefts: (lefts < floors[:lefts.shape[-1]]) | (lefts <= notionals[:lefts.shape[-1]])
+    )
+
+def __get_order_plan_with_counter_amount(book, k, left_amount, trade_quantizer):
+    '''
+    __search_with_counter_amount で得た位置以降を処理し、
+    約定を見込める注文の一覧、残りの相対通貨数量、基本通貨数量(手数料未計算)を得る
+    '''
+    merged = book.get_merged()
+    m = book.min_trade_amount
+
+    order_list = [[price, amount]
+            for price, amount in zip(merged.price_list[:k], merged.amount_list[:k])
+    ]
+    base_sum = book.get_prefix_sums()[0][k]
+
+    # 以降は api_coordinator と同じ手順で処理する
+    fraction = 0
+    for i in xrange(int(merged.index[k - 1]) + 1 if k else 0, len(book)):
+        price = book.price_list[i]
+        amount = fraction + book.amount_list[i]
+
+        if left_amount < price * m:
+            # 残りの相対通貨で最小単位の注文が出来ない場合
+            break
+
+        pre_fraction = fraction
+        pre_base_sum = base_sum
+
+        if amount < m:
+            fraction = amount
+
+        elif left_amount <= price * amount:
+            fraction = 0
+            order_amount = trade_quantizer.kiri_sute(left_amount / price)
+            order_list.append([price, order_amount])
+            base_sum += order_amount
+            left_amount = 0
+
+        else:
+            fraction = 0
+            order_list.append([price, amount])
+            base_sum += amount
+            left_amount -= price * amount
+
+        if base_sum == pre_base_sum and fraction == pre_fraction:
+            # 注文が取得出来ない場合
+            break
+
+    return order_list, left_amount, base_sum
+
+def get_order_plan_with_counter_amount(api_wrapper, is_buy_order, counter_amount
+        , max_age=None, order_book=None
+):
+    '''
+    相対通貨の数量から、約定を見込める(買い|売り)注文の一覧、各通貨の増減数量 を得る
+    api_wrapper: 市場情報
+    is_buy_order: 買い注文かどうか
+    counter_amount: 相対通貨の数量
+    max_age: 許容するdepthスナップショットの経過時間[秒](省略時はapi_wrapperの既定値)
+    order_book: 使用する注文一覧(省略時はAPIより取得する)
+    '''
+    book = ArrayOrderBook.from_api_wrapper(api_wrapper, is_buy_order, max_age) \
+            if order_book is None else order_book
+    [(k, left_amount)] = __search_with_counter_amount(book, [counter_amount])
+    order_list, left_amount, base_sum = __get_order_plan_with_counter_amount(
+            book, k, left_amount, api_wrapper.trade_quantizer
+    )
+
+    # 注文一覧、各通貨の増減 の順序で返す
+    return order_list, get_currency_deltas(
+            api_wrapper, is_buy_order, base_sum, counter_amount - left_amount
+    )
+
+def get_order_plans_with_base_amount(api_wrapper, is_buy_order, order_amounts
+        , max_age=None, order_book=None
+):
+    '''
+    複数の注文数それぞれについて、約定を見込める(買い|売り)注文の一覧、各通貨の増減数量 を得る
+    1つの注文一覧から、まとめた注文一覧、累積和を共有して全ての注文数を計画する
+    (全ての注文が約定を見込める位置は、全ての注文数について1度の二分探索、配列演算で求める
+    残数量は先頭から順に減算するため、配列演算の量は打ち切り位置までの注文数に比例する)
+    api_wrapper: 市場情報
+    is_buy_order: 買い注文かどうか
+    order_amounts: 注文数の一覧
+    max_age: 許容するdepthスナップショットの経過時間[秒](省略時はapi_wrapperの既定値)
+    order_book: 使用する注文一覧(省略時はAPIより取得する)
+    '''
+    book = ArrayOrderBook.from_api_wrapper(api_wrapper, is_buy_order, max_age) \
+            if order_book is None else order_book
+
+    order_amounts = list(order_amounts)
+
+    plans = []
+    for order_amount, (k, left_amount) in zip(
+            order_amounts, __search_with_base_amount(book, order_amounts, len(book))
+    ):
+        order_list, left_amount, counter_sum = __get_order_plan_with_base_amount(
+                book, k, left_amount, len(book)
+        )
+        plans.append((order_list, get_currency_deltas(
+                api_wrapper, is_buy_order, order_amount - left_amount, counter_sum
+        )))
+
+    # (注文一覧, 各通貨の増減数量) の一覧を order_amounts と同じ順序で返す
+    return plans
+
+def get_order_plans_with_counter_amount(api_wrapper, is_buy_order, counter_amounts
+        , max_age=None, order_book=None
+):
+    '''
+    複数の相対通貨の数量それぞれについて、約定を見込める(買い|売り)注文の一覧、各通貨の増減数量 を得る
+    1つの注文一覧から、まとめた注文一覧、累積和、価格の下限を共有して全ての数量を計画する
+    (全ての注文が約定を見込める位置は、全ての数量について1度の二分探索、配列演算で求める
+    残数量は先頭から順に減算するため、配列演算の量は打ち切り位置までの注文数に比例する)
+    api_wrapper: 市場情報
+    is_buy_order: 買い注文かどうか
+    counter_amounts: 相対通貨の数量の一覧
+    max_age: 許容するdepthスナップショットの経過時間[秒](省略時はapi_wrapperの既定値)
+    order_book: 使用する注文一覧(省略時はAPIより取得する)
+    '''
+    book = ArrayOrderBook.from_api_wrapper(api_wrapper, is_buy_order, max_age) \
+            if order_book is None else order_book
+
+    counter_amounts = list(counter_amounts)
+
+    plans = []
+    for counter_amount, (k, left_amount) in zip(
+            counter_amounts, __search_with_counter_amount(book, counter_amounts)
+    ):
+        order_list, left_amount, base_sum = __get_order_plan_with_counter_amount(
+                book, k, left_amount, api_wrapper.trade_quantizer
+        )
+        plans.append((order_list, get_currency_deltas(
+                api_wrapper, is_buy_order, base_sum, counter_amount - left_amount
+        )))
+
+    # (注文一覧, 各通貨の増減) の一覧を counter_amounts と同じ順序で返す
+    return plans
@@ -0,0 +1,149 @@
+# -*- encoding:UTF-8 -*-
+from collections import namedtuple
+import logging, threading, time
+
+import api_coordinator
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+注文一覧(get_order_plan_* の order_list)の一括発注
+- API使用可能間隔でトークンを予約した順に、各注文を別スレッドで署名、送信する
+- 前の注文の応答を待たずに次の注文を送信するため、複数の価格の注文を短時間で送信できる
+- 失敗した注文があれば、以降の注文は送信しない
+'''
+# 1注文の発注結果
+# price: 注文価格
+# amount: 注文数量
+# result: api_coordinator.order の戻り値(OrderAck、例外で失敗した場合はNone)
+# error: 失敗した場合の例外
+# latency: 送信から応答までの時間[秒]
+# wait: API使用可能になるまで待った時間[秒]
+LegResult = namedtuple('LegResult', 'price amount result error latency wait')
+
+class OrderPipeline(object):
+    '''
+    1市場、1アカウントの一括発注
+    '''
+    def __init__(self, api_wrapper, public_key, secret_key, max_in_flight=4, pool=None):
+        '''
+        api_wrapper: 市場情報
+        max_in_flight: 同時に応答を待つ注文数の上限
+                       nonceの順序で到着しないと拒否する取引所で、API使用可能間隔が0の場合は1を指定すること
+        pool: 発注に使用するスレッドプール(省略時は発注毎に作成する)
+        '''
+        self.api_wrapper = api_wrapper
+        self.public_key = public_key
+        self.secret_key = secret_key
+        self.max_in_flight = max_in_flight
+        self.pool = pool
+
+    def __execute_leg(self, is_buy_order, price, amount, bucket, start_at, stopped, in_flight
+            , is_failure
+    ):
+        '''
+        予約した時刻まで待ち、1注文を発注する
+        stopped: 失敗時に設定するイベント(失敗しても止めない場合はNone)
+        '''
+        try:
+            wait = max(0.0, start_at - time.time())
+            if 0 < wait:
+                time.sleep(wait)
+
+            if stopped is not None and stopped.is_set():
+                # 先に送信した注文が失敗した場合
+                logger.debug('leg skipped. price=%s, amount=%s', price, amount)
+                return None
+
+            start = time.time()
+            try:
+                with bucket.reserved():
+                    result = api_coordinator.order(
+                            self.api_wrapper, self.public_key, self.secret_key
+                            , is_buy_order, price, amount
+                    )
+
+            except Exception as e:
+                logger.exception('leg failed. price=%s, amount=%s', price, amount)
+                if stopped is not None:
+                    stopped.set()
+                return LegResult(price, amount, None, e, time.time() - start, wait)
+
+            latency = time.time() - start
+            if is_failure(result):
+                logger.warning('leg rejected. price=%s, amount=%s, result=%s', price, amount, result)
+                if stopped is not None:
+                    stopped.set()
+
+            return LegResult(price, amount, result, None, latency, wait)
+
+        finally:
+            in_flight.release()
+
+    @staticmethod
+    def __is_rejected(order_ack):
+        '''
+        取引所に拒否された発注結果かどうか
+        '''
+        return not order_ack.success
+
+    def execute(self, is_buy_order, order_list, stop_on_failure=True, is_failure=None):
+        '''
+        注文一覧を発注し、送信した注文の LegResult 一覧を order_list と同じ順序で返す
+        (失敗により送信しなかった注文は含めない)
+        is_buy_order: 買い注文かどうか
+        order_list: [価格, 数量] の一覧
+        stop_on_failure: 失敗した注文があれば、以降の注文を送信しないかどうか
+        is_failure: 発注結果から失敗かどうかを判定する関数(省略時は OrderAck.success が偽の場合を失敗とする)
+        '''
+        if is_failure is None:
+            is_failure = self.__is_rejected
+
+        bucket = self.api_wrapper.get_auth_rate_limiter()
+        stopped = threading.Event() if stop_on_failure else None
+        in_flight = threading.Semaphore(self.max_in_flight)
+
+        own_pool = self.pool is None
+        if own_pool:
+            # multiprocessingは起動時に読み込まないよう、必要な場合のみ読み込む
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(max(1, min(self.max_in_flight, len(order_list))))
+        else:
+            pool = self.pool
+
+        try:
+            pending = []
+            for price, amount in order_list:
+                in_flight.acquire()
+                if stopped is not None and stopped.is_set():
+                    in_flight.release()
+                    break
+
+                # トークンを注文の順に予約し、予約した時刻に署名、送信する
+                # (nonceは送信する順に発行される)
+                start_at = time.time() + bucket.reserve()
+                pending.append(pool.apply_async(self.__execute_leg, (
+                        is_buy_order, price, amount, bucket, start_at, stopped, in_flight
+                        , is_failure
+                )))
+
+            return [leg_result for leg_result in (r.get() for r in pending)
+                    if leg_result is not None
+            ]
+
+        finally:
+            if own_pool:
+                pool.close()
+
+def execute_order_plan(api_wrapper, public_key, secret_key, is_buy_order, order_list, **kwargs):
+    '''
+    注文一覧を一括発注する
+    kwargs: OrderPipeline.execute の引数
+    '''
+    return OrderPipeline(api_wrapper, public_key, secret_key).execute(
+            is_buy_order, order_list, **kwargs
+    )
@@ -0,0 +1,207 @@
+# -*- encoding:UTF-8 -*-
+from collections import namedtuple
+import heapq, logging
+
+import calculation
+from api_coordinator import get_currency_deltas
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+同じ通貨ペアを扱う複数市場への注文の振り分け
+- 各市場の注文一覧を、手数料を考慮した実質価格の順に heapq.merge でまとめて参照する
+  (参照した分の注文のみ取り出すため、処理量は 約定を見込める注文数 * log(市場数) 程度)
+- 最低注文数、最小注文単位は市場毎に api_coordinator の get_order_plan_* と同じ手順で扱う
+- depthは各市場のスナップショットを使用するため、
+  取得し直す場合は先に api_coordinator.fetch_depths 等で並行して取得しておくこと
+'''
+# 1市場への注文
+# api_wrapper: 市場情報
+# order_list: 約定を見込める注文一覧 [価格, 数量]
+# currency_deltas: 手数料を考慮した各通貨の増減数量
+RoutedOrder = namedtuple('RoutedOrder', 'api_wrapper order_list currency_deltas')
+
+def get_effective_rate(api_wrapper, is_buy_order):
+    '''
+    価格に掛けると、手数料を考慮した実質価格となる係数を得る
+    買い注文: 基本通貨 1 を得るために支払う相対通貨
+    売り注文: 基本通貨 1 を支払って得る相対通貨
+    '''
+    if is_buy_order:
+        return api_wrapper.get_buy_order_pay(1.0) / api_wrapper.get_buy_order_gain(1.0)
+
+    return api_wrapper.get_sell_order_gain(1.0) / api_wrapper.get_sell_order_pay(1.0)
+
+def __iter_keyed_levels(levels, key_rate, index):
+    '''
+    注文一覧を (並び順のキー, 市場の位置, 価格, 数量) で返す
+    '''
+    for price, amount in levels:
+        yield price * key_rate, index, price, amount
+
+def __iter_merged_levels(api_wrappers, is_buy_order, max_age):
+    '''
+    全市場の注文を、約定させる順(実質価格の有利な順)に返す
+    実質価格が同じ場合は api_wrappers の順とする
+    '''
+    streams = []
+    for index, api_wrapper in enumerate(api_wrappers):
+        # 買い注文は実質価格の昇順、売り注文は実質価格の降順に並べる
+        key_rate = get_effective_rate(api_wrapper, is_buy_order) * (1 if is_buy_order else -1)
+        levels = api_wrapper.iter_sell_levels(max_age) if is_buy_order \
+                else api_wrapper.iter_buy_levels(max_age)
+        streams.append(__iter_keyed_levels(levels, key_rate, index))
+
+    return heapq.merge(*streams)
+
+def __route(api_wrappers, is_buy_order, left_amount, get_fill, max_age, left_quantizer=None):
+    '''
+    全市場の注文を約定させる順に参照し、市場毎の注文一覧を得る
+    get_fill: (api_wrapper, 価格, 数量, 残り) から (注文数量, 残りから差し引く量) を得る関数
+    left_quantizer: 残りを丸める処理(差し引く毎の演算誤差を累積させない場合に指定する)
+    '''
+    market_num = len(api_wrappers)
+    order_lists = [[] for i in xrange(market_num)]
+    fractions = [0] * market_num
+    base_sums = [0] * market_num
+    counter_sums = [0] * market_num
+
+    # これ以上注文を取得できない市場
+    closed = [False] * market_num
+    open_num = market_num
+
+    for key, index, price, amount in __iter_merged_levels(api_wrappers, is_buy_order, max_age):
+        if left_amount <= 0 or open_num == 0:
+            break
+
+        if closed[index]:
+            continue
+
+        api_wrapper = api_wrappers[index]
+
+        # 最低注文数よりamountが少ない注文は、同じ市場の次の注文に含める
+        fraction = fractions[index]
+        amount += fraction
+        if amount < api_wrapper.min_trade_amount:
+            if amount == fraction:
+                # 注文が取得出来ない場合(api_coordinator と同じく、この市場は打ち切る)
+                closed[index] = True
+                open_num -= 1
+                continue
+
+            fractions[index] = amount
+            continue
+
+        fractions[index] = 0
+        order_amount, consumed = get_fill(api_wrapper, price, amount, left_amount)
+        if order_amount < api_wrapper.min_trade_amount:
+            # 残りがこの市場の最低注文数に満たない場合
+            # (以降の注文はより不利な価格のため、この市場は打ち切る)
+            closed[index] = True
+            open_num -= 1
+            continue
+
+        order_lists[index].append([price, order_amount])
+        base_sums[index] += order_amount
+        counter_sums[index] += price * order_amount
+        left_amount -= consumed
+        if left_quantizer is not None:
+            left_amount = left_quantizer.shisha_gonyu(left_amount)
+
+    logger.debug('order_lists=%s, left_amount=%s', order_lists, left_amount)
+
+    routed_orders = [
+            RoutedOrder(api_wrapper, order_list, get_currency_deltas(
+                    api_wrapper, is_buy_order, base_sum, counter_sum
+            ))
+            for api_wrapper, order_list, base_sum, counter_sum
+            in zip(api_wrappers, order_lists, base_sums, counter_sums)
+    ]
+
+    # 市場毎の注文、全市場の各通貨の増減数量 の順序で返す
+    return routed_orders, get_total_deltas(routed_orders)
+
+def get_total_deltas(routed_orders):
+    '''
+    全市場の各通貨の増減数量を合計する
+    '''
+    total_deltas = {}
+    for routed_order in routed_orders:
+        for currency, delta in routed_order.currency_deltas.items():
+            total_deltas[currency] = total_deltas.get(currency, 0) + delta
+
+    return total_deltas
+
+def __fill_with_base_amount(api_wrapper, price, amount, left_amount):
+    '''
+    残りの基本通貨の数量から、注文数量を得る
+    '''
+    if left_amount <= amount:
+        amount = api_wrapper.trade_quantizer.kiri_sute(left_amount)
+
+    return amount, amount
+
+def route_with_base_amount(api_wrappers, is_buy_order, order_amount, max_age=None):
+    '''
+    基本通貨の数量を、手数料を考慮した支払いが最小(売り注文は受け取りが最大)となるよう
+    複数市場に振り分ける
+    api_wrappers: 同じ通貨ペアの市場情報の一覧
+    is_buy_order: 買い注文かどうか
+    order_amount: 注文数
+    max_age: 許容するdepthスナップショットの経過時間[秒](省略時は各api_wrapperの既定値)
+    '''
+    # 残りは最も細かい最小注文単位で丸める(市場が無い場合は丸めない)
+    api_wrappers = list(api_wrappers)
+    left_quantizer = calculation.get_quantizer(
+            max(api_wrapper.min_trade_unit for api_wrapper in api_wrappers)
+    ) if api_wrappers else None
+
+    return __route(
+            api_wrappers, is_buy_order, order_amount, __fill_with_base_amount, max_age
+            , left_quantizer
+    )
+
+def __fill_buy_with_counter_amount(api_wrapper, price, amount, left_amount):
+    '''
+    残りの相対通貨(手数料込みの支払い)から、買い注文の数量を得る
+    '''
+    pay = api_wrapper.get_buy_order_pay(price * amount)
+    if left_amount <= pay:
+        amount = api_wrapper.trade_quantizer.kiri_sute(
+                left_amount / api_wrapper.get_buy_order_pay(price)
+        )
+        pay = api_wrapper.get_buy_order_pay(price * amount)
+
+    return amount, pay
+
+def __fill_sell_with_counter_amount(api_wrapper, price, amount, left_amount):
+    '''
+    残りの相対通貨(手数料差し引き後の受け取り)から、売り注文の数量を得る
+    '''
+    gain = api_wrapper.get_sell_order_gain(price * amount)
+    if left_amount <= gain:
+        amount = api_wrapper.trade_quantizer.kiri_sute(
+                left_amount / api_wrapper.get_sell_order_gain(price)
+        )
+        gain = api_wrapper.get_sell_order_gain(price * amount)
+
+    return amount, gain
+
+def route_with_counter_amount(api_wrappers, is_buy_order, counter_amount, max_age=None):
+    '''
+    相対通貨の数量を、手数料を考慮した取得数量が最大(売り注文は支払いが最小)となるよう
+    複数市場に振り分ける
+    api_wrappers: 同じ通貨ペアの市場情報の一覧
+    is_buy_order: 買い注文かどうか
+    counter_amount: 相対通貨の数量(買い注文は手数料込みの支払い、売り注文は手数料差し引き後の受け取り)
+    max_age: 許容するdepthスナップショットの経過時間[秒](省略時は各api_wrapperの既定値)
+    '''
+    return __route(
+            list(api_wrappers), is_buy_order, counter_amount
+            , __fill_buy_with_counter_amount if is_buy_order else __fill_sell_with_counter_amount
+            , max_age
+    )
@@ -0,0 +1,257 @@
+# -*- encoding:UTF-8 -*-
+from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
+import fcntl, logging, mmap, os, struct, threading, time
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+API呼び出し間隔の制御
+- 取引所ホスト、エンドポイント種別毎のトークンバケットで制御する
+- トークンバケットはGCRA(次のトークンの理論到着時刻のみを状態に持つ方式)で実装する
+'''
+# エンドポイント種別
+# 認証不要のAPI(depth等)
+ENDPOINT_PUBLIC = 'public'
+# 認証が必要なAPI(残高取得、発注、注文取消等)
+ENDPOINT_AUTH = 'auth'
+
+class BaseTokenBucket(object):
+    '''
+    トークンバケットの基底クラス
+    '''
+    __metaclass__ = ABCMeta
+
+    def __init__(self, interval, burst=1):
+        '''
+        interval: トークンの補充間隔[秒]
+        burst: 連続して使用できるトークン数
+        '''
+        self.interval = float(interval)
+        self.burst = burst
+
+        # 理論到着時刻より前でも使用を許容する時間
+        self.tolerance = self.interval * (burst - 1)
+
+        # スレッド毎の予約済みトークン数
+        self.__reserved = threading.local()
+
+    @abstractmethod
+    def update(self, func):
+        '''
+        理論到着時刻を排他的に更新する
+        func: 理論到着時刻を受け取り、(新しい理論到着時刻, 戻り値) を返す関数
+        '''
+        pass
+
+    def peek(self):
+        '''
+        ロックを取らずに理論到着時刻を得る(得られない場合はNone)
+        '''
+        return None
+
+    def reserve(self):
+        '''
+        トークンを予約し、使用可能になるまでの待ち時間[秒]を返す
+        予約した順にトークンが割り当てられる
+        '''
+        now = time.time()
+
+        def func(tat):
+            tat = max(tat, now)
+            return tat + self.interval, max(0.0, tat - self.tolerance - now)
+
+        return self.update(func)
+
+    def try_acquire(self):
+        '''
+        待たずに使用できる場合のみトークンを取得する
+        '''
+        now = time.time()
+
+        # トークンが不足していることがロック無しで分かる場合は、即座に返す
+        tat = self.peek()
+        if tat is not None and now < tat - self.tolerance:
+            return False
+
+        def func(tat):
+            tat = max(tat, now)
+            if now < tat - self.tolerance:
+                return tat, False
+            return tat + self.interval, True
+
+        return self.update(func)
+
+    def get_wait(self):
+        '''
+        トークンを取得せずに、使用可能になるまでの待ち時間[秒]を得る
+        '''
+        now = time.time()
+        tat = self.peek()
+        if tat is None:
+            tat = self.update(lambda tat: (tat, tat))
+
+        return max(0.0, tat - self.tolerance - now)
+
+    @contextmanager
+    def reserved(self):
+        '''
+        reserve() で予約済みのトークンを使用する
+        このブロック内の最初の acquire() は、待たずにトークンを取得したものとする
+        (予約と使用を別のスレッドで行う場合に、トークンを二重に消費しないため)
+        '''
+        self.__reserved.count = getattr(self.__reserved, 'count', 0) + 1
+        try:
+            yield self
+
+        finally:
+            self.__reserved.count = 0
+
+    def acquire(self):
+        '''
+        トークンを取得できるまで待ち、待った時間[秒]を返す
+        '''
+        if getattr(self.__reserved, 'count', 0):
+            # 予約済みのトークンを使用する
+            self.__reserved.count -= 1
+            return 0.0
+
+        wait = self.reserve()
+        if 0 < wait:
+            time.sleep(wait)
+
+        return wait
+
+class TokenBucket(BaseTokenBucket):
+    '''
+    プロセス内で共有するトークンバケット
+    '''
+    def __init__(self, interval, burst=1):
+        super(TokenBucket, self).__init__(interval, burst)
+        self.__tat = 0.0
+        self.__lock = threading.Lock()
+
+    def update(self, func):
+        '''
+        理論到着時刻を排他的に更新する
+        '''
+        with self.__lock:
+            self.__tat, result = func(self.__tat)
+
+        return result
+
+    def peek(self):
+        '''
+        ロックを取らずに理論到着時刻を得る
+        '''
+        return self.__tat
+
+class FileTokenBucket(BaseTokenBucket):
+    '''
+    ファイルを介して複数プロセスで共有するトークンバケット
+    ファイルをmmapし、flockで排他する(/dev/shm 上に置けば共有メモリとなる)
+    '''
+    # ファイルの内容(理論到着時刻)
+    __STATE = struct.Struct('d')
+
+    def __init__(self, path, interval, burst=1):
+        '''
+        path: 状態を保存するファイルのパス
+        '''
+        super(FileTokenBucket, self).__init__(interval, burst)
+        self.path = path
+
+        # flockはプロセス単位のため、プロセス内のスレッドはロックで排他する
+        self.__lock = threading.Lock()
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size < self.__STATE.size:
+                    os.ftruncate(fd, self.__STATE.size)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+            self.__mmap = mmap.mmap(fd, self.__STATE.size)
+
+        except:
+            os.close(fd)
+            raise
+
+        self.__fd = fd
+
+    def update(self, func):
+        '''
+        理論到着時刻を排他的に更新する
+        '''
+        with self.__lock:
+            fcntl.flock(self.__fd, fcntl.LOCK_EX)
+            try:
+                tat, result = func(self.__STATE.unpack_from(self.__mmap, 0)[0])
+                self.__STATE.pack_into(self.__mmap, 0, tat)
+            finally:
+                fcntl.flock(self.__fd, fcntl.LOCK_UN)
+
+        return result
+
+    def close(self):
+        '''
+        ファイルを閉じる
+        '''
+        self.__mmap.close()
+        os.close(self.__fd)
+
+def get_shared_dir():
+    '''
+    プロセス間で共有するトークンバケットの既定の保存先を得る
+    '''
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+
+    # tempfileは random 等も読み込むため、必要な場合のみ読み込む
+    import tempfile
+    return tempfile.gettempdir()
+
+# 取引所ホスト、エンドポイント種別 -> トークンバケット
+__buckets = {}
+__buckets_lock = threading.Lock()
+
+def get_rate_limiter(host, endpoint, interval, burst=1, shared_dir=None):
+    '''
+    取引所ホスト、エンドポイント種別のトークンバケットを得る
+    未作成の場合は作成する
+    host: 取引所ホスト
+    endpoint: エンドポイント種別
+    interval: トークンの補充間隔[秒]
+    burst: 連続して使用できるトークン数
+    shared_dir: 指定した場合、このディレクトリを介してプロセス間で共有する
+    '''
+    key = (host, endpoint)
+    with __buckets_lock:
+        bucket = __buckets.get(key)
+        if bucket is None:
+            if shared_dir is None:
+                bucket = TokenBucket(interval, burst)
+            else:
+                bucket = FileTokenBucket(
+                        os.path.join(shared_dir, 'rate_limit-%s-%s' % key), interval, burst
+                )
+            __buckets[key] = bucket
+            logger.debug('rate limiter created. key=%s, interval=%s, burst=%s'
+                    , key, interval, burst
+            )
+
+    return bucket
+
+def set_rate_limiter(host, endpoint, bucket):
+    '''
+    取引所ホスト、エンドポイント種別のトークンバケットを設定する
+    (起動時にburstやプロセス間共有を設定する場合に使用する)
+    '''
+    with __buckets_lock:
+        __buckets[(host, endpoint)] = bucket
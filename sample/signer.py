@@ -0,0 +1,194 @@
+# -*- encoding:UTF-8 -*-
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+import logging, os, threading
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+認証が必要なAPIの署名
+- アカウント毎に鍵から署名用の状態を1度だけ作成し、リクエスト毎に複製して使用する
+- 作成した署名は (署名クラス, 公開鍵) 毎に、MAX_SIGNERS件まで保持する(超えた場合は古い順に破棄する)
+  (秘密鍵はキーにせず、前回と同じ秘密鍵のオブジェクトであればそのまま使用する。
+   異なるオブジェクトの場合のみ、秘密鍵の指紋(プロセス毎の乱数を加えたSHA-256)で同じ秘密鍵かを確認する)
+  破棄した署名は、秘密鍵から作成した状態ごと参照されなくなる
+- 署名する文字列は build_query で作成する
+- hashlib、hmac は署名を作成する時に読み込む
+'''
+def build_query(params, keys=None):
+    '''
+    署名する文字列(key=value を & で連結したもの)を作成する
+    params: パラメータ
+    keys: 連結するキーの順序(省略時はparamsの順序)
+    '''
+    if keys is None:
+        keys = params
+
+    return '&'.join([
+            key + '=' + (value if value.__class__ is str else str(value))
+            for key, value in ((key, params[key]) for key in keys)
+    ])
+
+class BaseSigner(object):
+    '''
+    署名の基底クラス
+    '''
+    __metaclass__ = ABCMeta
+
+    def __init__(self, public_key, secret_key):
+        '''
+        public_key: 公開鍵(APIキー)
+        secret_key: 秘密鍵
+        '''
+        self.public_key = public_key
+
+    @abstractmethod
+    def sign(self, post_params):
+        '''
+        署名に必要なパラメータをPOSTパラメータに追加し、署名に必要なHTTP Headerを返す
+        '''
+        pass
+
+class AllCoinSigner(BaseSigner):
+    '''
+    AllCoin.com の署名
+    秘密鍵もPOSTパラメータに含め、キーの昇順で連結した文字列のMD5を sign とする
+    (秘密鍵は連結した文字列の途中に入るため、事前に計算できる状態は無い)
+    '''
+    def __init__(self, public_key, secret_key):
+        super(AllCoinSigner, self).__init__(public_key, secret_key)
+        self.__secret_key = secret_key
+
+        import hashlib
+        self.__md5 = hashlib.md5
+
+    def sign(self, post_params):
+        post_params.update({'access_key': self.public_key, 'secret_key': self.__secret_key})
+
+        # 暗号化用の文字列を作成
+        for_sign = build_query(post_params, sorted(post_params))
+        logger.debug('for_sign=%s', for_sign)
+
+        # signを作成
+        sign = self.__md5(for_sign).hexdigest()
+        logger.debug('sign=%s', sign)
+
+        post_params['sign'] = sign
+        return {}
+
+class BtcBoxSigner(BaseSigner):
+    '''
+    BtcBox の署名
+    パラメータを連結した文字列を、md5(秘密鍵) を鍵とするHMAC-SHA256で署名し signature とする
+    '''
+    def __init__(self, public_key, secret_key):
+        super(BtcBoxSigner, self).__init__(public_key, secret_key)
+
+        import hashlib, hmac
+        self.__hmac = hmac.new(hashlib.md5(str(secret_key)).hexdigest(), digestmod=hashlib.sha256)
+
+    def sign(self, post_params):
+        post_params['key'] = self.public_key
+
+        # 秘密鍵で署名を行う文字列を作成
+        for_signature = build_query(post_params)
+        logger.debug('for_signature=%s', for_signature)
+
+        # 鍵を設定済みのHMACを複製して署名を行う
+        signature = self.__hmac.copy()
+        signature.update(for_signature)
+        signature = signature.hexdigest()
+        logger.debug('signature=%s', signature)
+
+        post_params['signature'] = signature
+        return {}
+
+class EtwingsSigner(BaseSigner):
+    '''
+    etwings の署名
+    パラメータを連結した文字列を、秘密鍵を鍵とするHMAC-SHA512で署名し、HTTP Headerの sign とする
+    '''
+    def __init__(self, public_key, secret_key):
+        super(EtwingsSigner, self).__init__(public_key, secret_key)
+
+        import hashlib, hmac
+        self.__hmac = hmac.new(str(secret_key), digestmod=hashlib.sha512)
+
+    def sign(self, post_params):
+        # 秘密鍵で署名を行う文字列を作成
+        for_sign = build_query(post_params)
+        logger.debug('for_sign=%s', for_sign)
+
+        # 鍵を設定済みのHMACを複製して署名を行う
+        sign = self.__hmac.copy()
+        sign.update(for_sign)
+        sign = sign.hexdigest()
+        logger.debug('sign=%s', sign)
+
+        return {'key': self.public_key, 'sign': sign}
+
+# 保持する署名の最大数(超えた場合は、最も古く作成した署名を破棄する)
+MAX_SIGNERS = 256
+
+# (署名クラス, 公開鍵) -> [前回渡された秘密鍵, 秘密鍵の指紋, 署名] (作成した順)
+__signers = OrderedDict()
+__signers_lock = threading.Lock()
+
+# 秘密鍵の指紋に加える値(プロセス毎の乱数)
+__fingerprint_salt = os.urandom(32)
+
+def __get_fingerprint(secret_key):
+    '''
+    秘密鍵の指紋を得る(秘密鍵そのものを保持しないため)
+    '''
+    import hashlib
+    return hashlib.sha256(__fingerprint_salt + str(secret_key)).digest()
+
+def get_signer(signer_class, public_key, secret_key):
+    '''
+    アカウントの署名を得る(同じアカウントでは同じ署名を使い回す)
+    同じ公開鍵で秘密鍵が異なる場合は、署名を作成し直す
+    '''
+    key = (signer_class, public_key)
+
+    # 前回と同じ秘密鍵のオブジェクトであれば、指紋を計算せずに使用する
+    entry = __signers.get(key)
+    if entry is not None and entry[0] is secret_key:
+        return entry[2]
+
+    fingerprint = __get_fingerprint(secret_key)
+    if entry is not None and entry[1] == fingerprint:
+        entry[0] = secret_key
+        return entry[2]
+
+    with __signers_lock:
+        entry = __signers.get(key)
+        if entry is None or entry[1] != fingerprint:
+            # 作成し直した署名は、新しく作成した署名として末尾に置く
+            __signers.pop(key, None)
+            entry = __signers[key] = [secret_key, fingerprint, signer_class(public_key, secret_key)]
+            if MAX_SIGNERS < len(__signers):
+                __signers.popitem(last=False)
+
+    return entry[2]
+
+def clear_signers():
+    '''
+    保持している全ての署名を破棄する
+    '''
+    with __signers_lock:
+        __signers.clear()
+
+def as_signer(signer_class, public_key, secret_key=None):
+    '''
+    APIラッパーのメソッドに渡された鍵を署名にする
+    public_key に署名が渡された場合は、それをそのまま使用する
+    '''
+    if isinstance(public_key, BaseSigner):
+        return public_key
+
+    return get_signer(signer_class, public_key, secret_key)
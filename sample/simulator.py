@@ -0,0 +1,406 @@
+# -*- encoding:UTF-8 -*-
+from urlparse import parse_qsl, urlparse
+import BaseHTTPServer, SocketServer
+import argparse, hashlib, hmac, itertools, json, logging, random, re, socket, threading, time, urllib
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+取引所シミュレータ
+- AllCoin.com、BtcBox、etwings のAPIと同じパス、同じ形式の応答を返すHTTPサーバ
+- 認証が必要なAPIは、各取引所と同じ方法で署名を検証する(検証に失敗した場合は HTTP 401 を返す)
+  署名する文字列は、APIラッパー(signer.build_query)を使用せず、受信したパラメータを
+  各取引所の仕様の順序で urllib.urlencode して作成する
+- 板の厚さ、応答時間、ゆらぎ、エラー率、API呼び出し間隔の制限を設定できる
+
+使い方:
+    simulator = ExchangeSimulator(depth=200, latency=0.05).start()
+    api_wrapper = BtcBoxApiWrapper(market_instance, base_url=simulator.get_base_url())
+    ...
+    simulator.stop()
+'''
+# API呼び出し間隔の制限を判定する際に許容する誤差[秒]
+RATE_LIMIT_TOLERANCE = 0.01
+
+# 署名の検証に失敗した場合のHTTPステータスコード
+SIGNATURE_ERROR_STATUS = 401
+
+def canonicalize(params):
+    '''
+    署名する文字列を、(キー, 値) の一覧から、その順序のまま urlencode して作成する
+    '''
+    return urllib.urlencode(params)
+
+def generate_book(rnd, depth, best_bid, tick, amount_digits):
+    '''
+    (買い注文一覧, 売り注文一覧) を (価格, 数量) の一覧で作成する(約定させる順)
+    '''
+    def generate_side(best_price, step_sign):
+        levels = []
+        price = best_price
+        for i in xrange(depth):
+            levels.append((price, round(rnd.expovariate(1.0), amount_digits)))
+            price += step_sign * tick * rnd.randint(1, 3)
+        return levels
+
+    return generate_side(best_bid, -1), generate_side(best_bid + tick, 1)
+
+class SimulatorError(Exception):
+    '''
+    シミュレータが返すエラー
+    '''
+    def __init__(self, message, status=200):
+        super(SimulatorError, self).__init__(message)
+        self.status = status
+
+class SimulatorHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    各取引所のAPIのリクエストを処理する
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    # 応答をまとめて送信し、Nagleアルゴリズムと遅延ACKによる待ちを避ける
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    # (HTTPメソッド, パスの正規表現, 取引所, 処理するメソッド名)
+    ROUTES = (
+            ('GET', re.compile(r'^/api2/orderbook/(?P<base>\w+)_(?P<counter>\w+)$'), 'allcoin', 'allcoin_depth')
+            , ('POST', re.compile(r'^/api2/auth_api/$'), 'allcoin', 'allcoin_auth_api')
+            , ('GET', re.compile(r'^/api/v1/depth/$'), 'btcbox', 'btcbox_depth')
+            , ('POST', re.compile(r'^/api/v1/(?P<func_name>\w+)/$'), 'btcbox', 'btcbox_auth_api')
+            , ('GET', re.compile(r'^/api/1/depth/(?P<base>\w+)_jpy$'), 'etwings', 'etwings_depth')
+            , ('POST', re.compile(r'^/tapi$'), 'etwings', 'etwings_auth_api')
+    )
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def do_GET(self):
+        self.__dispatch('GET')
+
+    def do_POST(self):
+        self.__dispatch('POST')
+
+    def __dispatch(self, method):
+        '''
+        パスに応じた処理を行い、応答を返す
+        '''
+        url = urlparse(self.path)
+        query = dict(parse_qsl(url.query))
+
+        # POSTパラメータは、署名の検証のため送信された順序で保持する
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0)) if method == 'POST' else ''
+        params = parse_qsl(body, keep_blank_values=True)
+
+        simulator = self.server
+        for route_method, pattern, exchange, handler_name in self.ROUTES:
+            match = pattern.match(url.path)
+            if route_method != method or match is None:
+                continue
+
+            simulator.wait_latency()
+            try:
+                simulator.check_failure()
+                simulator.check_rate_limit(exchange, method)
+                result = getattr(simulator, handler_name)(params=params, query=query, headers=self.headers
+                        , **match.groupdict()
+                )
+                return self.__send(200, result)
+
+            except SimulatorError as e:
+                logger.debug('simulator error. path=%s, error=%s', url.path, e)
+                return self.__send(e.status, simulator.make_error(exchange, e))
+
+        self.__send(404, {'error': 'not found'})
+
+    def __send(self, status, result):
+        '''
+        JSONで応答を返す
+        '''
+        body = json.dumps(result)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class ExchangeSimulator(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    '''
+    取引所シミュレータ
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0), depth=50, latency=0.0, jitter=0.0
+            , error_rate=0.0, rate_limit=0.0, accounts=None, seed=0
+    ):
+        '''
+        address: 待ち受けるアドレス(ポート0の場合は空いているポート)
+        depth: 板の厚さ(片側の注文数)
+        latency: 応答までの時間[秒]
+        jitter: 応答までの時間に加える、0〜jitter[秒]のゆらぎ
+        error_rate: HTTP 500 を返す割合
+        rate_limit: 取引所毎、認証の要否毎のAPI呼び出し間隔の下限[秒](0の場合は制限しない)
+        accounts: 公開鍵 -> 秘密鍵(省略時は 'public_key' -> 'secret_key' のみ)
+        seed: 板、ゆらぎ、エラーの乱数の種
+        '''
+        BaseHTTPServer.HTTPServer.__init__(self, address, SimulatorHandler)
+        self.depth = depth
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.accounts = accounts or {'public_key': 'secret_key'}
+
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+
+        # (取引所, 認証の要否) -> 最後に受け付けた時刻
+        self.__last_requests = {}
+        # (取引所, 公開鍵) -> 最後に受け付けたnonce
+        self.__last_nonces = {}
+        self.__order_ids = itertools.count(1)
+        self.__thread = None
+
+        # 接続中のソケット -> 処理中のスレッド(終了時に切断し、スレッドの終了を待つ)
+        self.__connections = {}
+
+        # 取引所 -> (買い注文一覧, 売り注文一覧)
+        self.books = {
+                'allcoin': generate_book(random.Random('%s-allcoin' % seed), depth, 65e-8, 1e-8, 4)
+                , 'btcbox': generate_book(random.Random('%s-btcbox' % seed), depth, 30000, 1, 3)
+                , 'etwings': generate_book(random.Random('%s-etwings' % seed), depth, 30000, 5, 4)
+        }
+
+    def get_base_url(self):
+        '''
+        APIラッパーの base_url に指定するURL
+        '''
+        host, port = self.server_address[:2]
+        return 'http://%s:%s' % (host, port)
+
+    def start(self):
+        '''
+        別スレッドで待ち受けを開始する
+        '''
+        self.__thread = threading.Thread(target=self.serve_forever)
+        self.__thread.daemon = True
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        '''
+        待ち受けを終了し、接続中(keep-alive)のソケットを切断する
+        '''
+        self.shutdown()
+        self.server_close()
+
+        with self.__lock:
+            connections = self.__connections.items()
+        for connection, thread in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            thread.join(1.0)
+
+    def process_request_thread(self, request, client_address):
+        with self.__lock:
+            self.__connections[request] = threading.current_thread()
+        try:
+            SocketServer.ThreadingMixIn.process_request_thread(self, request, client_address)
+        finally:
+            with self.__lock:
+                self.__connections.pop(request, None)
+
+    def handle_error(self, request, client_address):
+        # 終了時に切断した接続のエラー等は、ログのみ出力する
+        logger.debug('simulator request failed. client_address=%s', client_address, exc_info=True)
+
+    def __random_value(self):
+        with self.__lock:
+            return self.__random.random()
+
+    def wait_latency(self):
+        '''
+        設定された応答時間だけ待つ
+        '''
+        delay = self.latency + (self.jitter * self.__random_value() if self.jitter else 0)
+        if 0 < delay:
+            time.sleep(delay)
+
+    def check_failure(self):
+        '''
+        設定されたエラー率でエラーにする
+        '''
+        if self.error_rate and self.__random_value() < self.error_rate:
+            raise SimulatorError('internal server error', 500)
+
+    def check_rate_limit(self, exchange, method):
+        '''
+        API呼び出し間隔の下限より短い間隔のリクエストをエラーにする
+        '''
+        if not self.rate_limit:
+            return
+
+        key = (exchange, method)
+        now = time.time()
+        with self.__lock:
+            last = self.__last_requests.get(key)
+            if last is not None and now - last < self.rate_limit - RATE_LIMIT_TOLERANCE:
+                raise SimulatorError('too many requests', 429)
+            self.__last_requests[key] = now
+
+    def __check_nonce(self, exchange, public_key, nonce):
+        '''
+        nonceが前回より大きいことを検証する
+        '''
+        try:
+            nonce = long(nonce)
+        except (TypeError, ValueError):
+            raise SimulatorError('invalid nonce')
+
+        key = (exchange, public_key)
+        with self.__lock:
+            if nonce <= self.__last_nonces.get(key, -1):
+                raise SimulatorError('nonce not incremented')
+            self.__last_nonces[key] = nonce
+
+    def __get_secret_key(self, public_key):
+        secret_key = self.accounts.get(public_key)
+        if secret_key is None:
+            raise SimulatorError('invalid key')
+        return secret_key
+
+    def make_error(self, exchange, error):
+        '''
+        取引所の形式のエラー応答を作成する
+        '''
+        if exchange == 'allcoin':
+            return {'code': -1, 'error': str(error)}
+        if exchange == 'btcbox':
+            return {'result': False, 'code': str(error)}
+        return {'success': 0, 'error': str(error)}
+
+    def allcoin_depth(self, base, counter, **kwargs):
+        bids, asks = self.books['allcoin']
+        return {'code': 1, 'data': {
+                'sell': [{'price': '%.8f' % price, 'amount': amount * 1e6} for price, amount in asks]
+                , 'buy': [{'price': '%.8f' % price, 'amount': amount * 1e6} for price, amount in bids]
+        }}
+
+    def allcoin_auth_api(self, params, **kwargs):
+        '''
+        sign: 秘密鍵を含むパラメータをキーの昇順で連結した文字列のMD5
+        '''
+        params = dict(params)
+        sign = params.pop('sign', None)
+        if self.__get_secret_key(params.get('access_key')) != params.get('secret_key') \
+                or sign != hashlib.md5(canonicalize(sorted(params.items()))).hexdigest():
+            raise SimulatorError('sign error', SIGNATURE_ERROR_STATUS)
+
+        method = params.get('method')
+        if method == 'getinfo':
+            return {'code': 1, 'data': {'balances_available': {'BTC': 1.0, 'DOGE': 1000000.0}}}
+        if method in ('buy_coin', 'sell_coin'):
+            return {'code': 1, 'data': {'order_id': next(self.__order_ids)}}
+        if method == 'cancel_order':
+            return {'code': 1, 'data': {'order_id': params.get('order_id')}}
+
+        raise SimulatorError('invalid method')
+
+    def btcbox_depth(self, **kwargs):
+        # 売り注文、買い注文ともに価格の降順
+        bids, asks = self.books['btcbox']
+        return {
+                'asks': [[price, amount] for price, amount in reversed(asks)]
+                , 'bids': [[price, amount] for price, amount in bids]
+        }
+
+    def btcbox_auth_api(self, params, func_name, **kwargs):
+        '''
+        signature: signature以外のパラメータを送信された順に連結した文字列の、
+                   md5(秘密鍵) を鍵とするHMAC-SHA256
+        '''
+        signature = dict(params).get('signature')
+        params = [(key, value) for key, value in params if key != 'signature']
+        query = dict(params)
+        secret_key = self.__get_secret_key(query.get('key'))
+
+        expected = hmac.new(hashlib.md5(secret_key).hexdigest(), canonicalize(params)
+                , hashlib.sha256
+        ).hexdigest()
+        if signature != expected:
+            raise SimulatorError('signature error', SIGNATURE_ERROR_STATUS)
+        self.__check_nonce('btcbox', query['key'], query.get('nonce'))
+
+        if func_name == 'balance':
+            return {
+                    'uid': 1, 'nameauth': 0, 'moflag': 0
+                    , 'btc_balance': 1.0, 'btc_lock': 0, 'jpy_balance': 100000.0, 'jpy_lock': 0
+            }
+        if func_name == 'wallet':
+            return {'result': True, 'address': '1xxxxxxxxxxxxxxxxxxxxxxxx'}
+        if func_name == 'trade_add':
+            return {'result': True, 'id': str(next(self.__order_ids))}
+        if func_name == 'trade_cancel':
+            return {'result': True, 'id': query.get('id')}
+
+        raise SimulatorError('invalid method', 404)
+
+    def etwings_depth(self, base, **kwargs):
+        # 売り注文は価格の昇順、買い注文は価格の降順
+        bids, asks = self.books['etwings']
+        return {
+                'asks': [[price, amount] for price, amount in asks]
+                , 'bids': [[price, amount] for price, amount in bids]
+        }
+
+    def etwings_auth_api(self, params, headers, **kwargs):
+        '''
+        sign(HTTP Header): パラメータを送信された順に連結した文字列の、秘密鍵を鍵とするHMAC-SHA512
+        '''
+        public_key = headers.get('key')
+        secret_key = self.__get_secret_key(public_key)
+        query = dict(params)
+
+        expected = hmac.new(secret_key, canonicalize(params), hashlib.sha512).hexdigest()
+        if headers.get('sign') != expected:
+            raise SimulatorError('signature mismatch', SIGNATURE_ERROR_STATUS)
+        self.__check_nonce('etwings', public_key, query.get('nonce'))
+
+        method = query.get('method')
+        if method == 'get_info':
+            return {'success': 1, 'return': {'funds': {'jpy': 100000.0, 'btc': 1.0}}}
+        if method == 'trade':
+            return {'success': 1, 'return': {'order_id': next(self.__order_ids)}}
+        if method == 'cancel_order':
+            return {'success': 1, 'return': {'order_id': query.get('order_id')}}
+
+        raise SimulatorError('invalid method')
+
+def main():
+    parser = argparse.ArgumentParser(description=u'取引所シミュレータ')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--depth', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    simulator = ExchangeSimulator((args.host, args.port), args.depth, args.latency, args.jitter
+            , args.error_rate, args.rate_limit, seed=args.seed
+    )
+    print simulator.get_base_url()
+    simulator.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# -*- encoding:UTF-8 -*-
+import logging, threading
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+HTTPトランスポート
+- 取引所ホストへの接続を使い回し、TCP/TLSハンドシェイクを省く
+- requestsは最初のリクエストの送信時に読み込む(通信しない処理の起動を遅くしないため)
+'''
+# コネクションプールの既定サイズ
+DEFAULT_POOL_SIZE = 4
+
+# 既定のタイムアウト[秒] (接続, 読み込み)
+DEFAULT_TIMEOUT = (5, 30)
+
+class HttpTransport(object):
+    '''
+    keep-aliveで接続を使い回すHTTPトランスポート
+    '''
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, keep_alive=True, timeout=DEFAULT_TIMEOUT):
+        '''
+        pool_size: ホスト毎に保持する接続数
+        keep_alive: 接続を使い回すかどうか
+        timeout: 既定のタイムアウト[秒]
+        '''
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+
+        # requestsのセッション(最初の参照時に作成する)
+        self.__session = None
+        self.__session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        '''
+        requestsのセッション
+        '''
+        session = self.__session
+        if session is None:
+            with self.__session_lock:
+                session = self.__session
+                if session is None:
+                    session = self.__session = self.__create_session()
+
+        return session
+
+    def __create_session(self):
+        '''
+        requestsのセッションを作成する
+        '''
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        if not self.keep_alive:
+            # 接続を都度切断する
+            session.headers['Connection'] = 'close'
+
+        return session
+
+    def request(self, method, url, **kwargs):
+        '''
+        リクエストを送信する
+        timeoutが指定されない場合は既定のタイムアウトを使用する
+        '''
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        '''
+        GETリクエストを送信する
+        '''
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        '''
+        POSTリクエストを送信する
+        '''
+        return self.request('POST', url, data=data, json=json, **kwargs)
+
+    def close(self):
+        '''
+        保持している接続を閉じる
+        '''
+        if self.__session is not None:
+            self.__session.close()
+
+# 共有トランスポート(取引所名 -> HttpTransport)
+__shared_transports = {}
+__shared_lock = threading.Lock()
+
+def get_shared_transport(key, **kwargs):
+    '''
+    取引所単位で共有するトランスポートを得る
+    未作成の場合はkwargsで作成する
+    '''
+    with __shared_lock:
+        transport = __shared_transports.get(key)
+        if transport is None:
+            transport = HttpTransport(**kwargs)
+            __shared_transports[key] = transport
+            logger.debug('shared transport created. key=%s', key)
+
+    return transport
+
+def set_shared_transport(key, transport):
+    '''
+    取引所単位で共有するトランスポートを設定する
+    '''
+    with __shared_lock:
+        old = __shared_transports.get(key)
+        __shared_transports[key] = transport
+
+    if old is not None and old is not transport:
+        old.close()
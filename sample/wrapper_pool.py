@@ -0,0 +1,85 @@
+# -*- encoding:UTF-8 -*-
+import logging, threading
+
+from api_wrapper import get_api_wrapper
+
+logger = logging.getLogger(__name__)
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+APIラッパーのインスタンスの使い回し
+- 市場毎に1つのインスタンスを保持し、接続、depthスナップショット、API使用可能間隔の状態を引き継ぐ
+- 市場情報(手数料等)が変更された場合は、新しいインスタンスを作成する
+'''
+# APIラッパーが市場情報から取得する項目
+MARKET_FIELDS = (
+        'api_util_class', 'exchange_name', 'api_available_span', 'base_currency', 'counter_currency'
+        , 'fee', 'bid_fee_is_gain', 'ask_fee_is_gain'
+        , 'min_price_unit', 'min_trade_amount', 'min_trade_unit'
+)
+
+class ApiWrapperPool(object):
+    '''
+    市場毎のAPIラッパーのインスタンスを保持する
+    '''
+    def __init__(self, **wrapper_kwargs):
+        '''
+        wrapper_kwargs: インスタンスの作成時にAPIラッパーに渡す引数(transport、depth_max_age等)
+        '''
+        self.wrapper_kwargs = wrapper_kwargs
+
+        # (取引所名, 基本通貨, 相対通貨) -> (市場情報の値, APIラッパー)
+        self.__api_wrappers = {}
+        self.__lock = threading.Lock()
+
+    def get(self, market_instance):
+        '''
+        市場のAPIラッパーを得る(未作成、または市場情報が変更された場合は作成する)
+        '''
+        key = (market_instance.exchange_name, market_instance.base_currency
+                , market_instance.counter_currency
+        )
+        values = tuple(getattr(market_instance, name) for name in MARKET_FIELDS)
+
+        entry = self.__api_wrappers.get(key)
+        if entry is not None and entry[0] == values:
+            return entry[1]
+
+        with self.__lock:
+            entry = self.__api_wrappers.get(key)
+            if entry is None or entry[0] != values:
+                api_wrapper = get_api_wrapper(market_instance.api_util_class)(
+                        market_instance, **self.wrapper_kwargs
+                )
+                entry = self.__api_wrappers[key] = (values, api_wrapper)
+                logger.debug('api wrapper created. key=%s', key)
+
+        return entry[1]
+
+    def remove(self, market_instance):
+        '''
+        市場のAPIラッパーを破棄する
+        '''
+        with self.__lock:
+            self.__api_wrappers.pop((market_instance.exchange_name
+                    , market_instance.base_currency, market_instance.counter_currency
+            ), None)
+
+    def clear(self):
+        '''
+        全てのAPIラッパーを破棄する
+        '''
+        with self.__lock:
+            self.__api_wrappers.clear()
+
+# 全ての市場で共有するAPIラッパーのプール
+shared_api_wrapper_pool = ApiWrapperPool()
+
+def get_api_wrapper_instance(market_instance):
+    '''
+    共有のプールから市場のAPIラッパーを得る
+    '''
+    return shared_api_wrapper_pool.get(market_instance)
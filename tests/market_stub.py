@@ -0,0 +1,29 @@
+# -*- encoding:UTF-8 -*-
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+テスト用の市場情報(models.Market と同じ属性を持つ)
+'''
+class StubMarket(object):
+    '''
+    テスト用の市場情報
+    '''
+    def __init__(self, exchange_name='BtcBox', base_currency='BTC', counter_currency='JPY'
+            , api_available_span=0, fee=0.1, bid_fee_is_gain=True, ask_fee_is_gain=True
+            , min_price_unit=0, min_trade_amount=0.001, min_trade_unit=3
+            , api_util_class='BtcBoxApiWrapper'
+    ):
+        self.exchange_name = exchange_name
+        self.api_available_span = api_available_span
+        self.base_currency = base_currency
+        self.counter_currency = counter_currency
+        self.fee = fee
+        self.bid_fee_is_gain = bid_fee_is_gain
+        self.ask_fee_is_gain = ask_fee_is_gain
+        self.min_price_unit = min_price_unit
+        self.min_trade_amount = min_trade_amount
+        self.min_trade_unit = min_trade_unit
+        self.api_util_class = api_util_class
@@ -0,0 +1,64 @@
+# -*- encoding:UTF-8 -*-
+import os, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'sample'))
+
+from api_coordinator import get_currency_deltas
+from api_wrapper import BtcBoxApiWrapper
+from arbitrage import MarketBook, find_opportunity
+from depth_cache import DepthLevel
+from market_stub import StubMarket
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+arbitrage の裁定機会の損益計算を確認する
+'''
+class FindOpportunityTest(unittest.TestCase):
+    def setUp(self):
+        # 最小注文単位は 0.001
+        self.buy_api_wrapper = BtcBoxApiWrapper(StubMarket(fee=0.1, min_trade_unit=3))
+        self.sell_api_wrapper = BtcBoxApiWrapper(StubMarket(fee=0.2, min_trade_unit=3))
+
+    def get_expected_profit(self, order_amount, buy_counter_sum, sell_counter_sum, sell_price):
+        deltas = get_currency_deltas(self.buy_api_wrapper, True, order_amount, buy_counter_sum)
+        for currency, delta in get_currency_deltas(
+                self.sell_api_wrapper, False, order_amount, sell_counter_sum
+        ).items():
+            deltas[currency] = deltas.get(currency, 0) + delta
+
+        return deltas['JPY'] + deltas['BTC'] * sell_price
+
+    def find(self, asks, bids):
+        return find_opportunity(
+                MarketBook(self.buy_api_wrapper, [], [DepthLevel(*level) for level in asks], 0)
+                , MarketBook(self.sell_api_wrapper, [DepthLevel(*level) for level in bids], [], 0)
+        )
+
+    def test_cut_larger_than_last_level(self):
+        # 最後の注文(0.0003)は最小注文単位より小さく、切り捨てる 0.0009 はそれを超える
+        opportunity = self.find([(100, 1.0006), (101, 0.0003)], [(110, 2.0)])
+
+        self.assertEqual(1.0, opportunity.amount)
+        # 切り捨てた分は最後の注文と、その前の注文から除く
+        self.assertEqual(100, opportunity.buy_price)
+        self.assertEqual(110, opportunity.sell_price)
+        self.assertAlmostEqual(
+                self.get_expected_profit(1.0, 100 * 1.0, 110 * 1.0, 110)
+                , opportunity.profit, 9
+        )
+
+    def test_cut_within_last_level(self):
+        opportunity = self.find([(100, 1.0), (101, 0.5004)], [(110, 2.0)])
+
+        self.assertEqual(1.5, opportunity.amount)
+        self.assertEqual(101, opportunity.buy_price)
+        self.assertAlmostEqual(
+                self.get_expected_profit(1.5, 100 * 1.0 + 101 * 0.5, 110 * 1.5, 110)
+                , opportunity.profit, 9
+        )
+
+if __name__ == '__main__':
+    unittest.main()
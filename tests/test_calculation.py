@@ -0,0 +1,114 @@
+# -*- encoding:UTF-8 -*-
+import os, random, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'sample'))
+
+import calculation
+import baseline_calculation
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+calculation の丸め処理を、変更前の実装(baseline_calculation)と比較する
+- リテラルだけでなく、商、差として計算した値(演算誤差を含む値)で比較する
+- 変更前の実装の戻り値の演算誤差(0.7000000000000001 等)は、10の累乗倍して整数に丸めて比較する
+'''
+# 比較する小数点以下桁数
+DIGITS = range(0, 9)
+
+def random_decimal(rnd, max_digits=8):
+    '''
+    有効数字12桁以内、0.001以上の10進数表記の値を得る
+    '''
+    digits = rnd.randint(0, max_digits)
+    return rnd.randint(10 ** max(0, digits - 3), 10 ** min(12, digits + 4)) / float(10 ** digits)
+
+def iter_computed_values(rnd, count):
+    '''
+    演算誤差を含む値(商、差、差の商)を得る
+    '''
+    for i in xrange(count):
+        a = random_decimal(rnd)
+        b = random_decimal(rnd)
+        price = random_decimal(rnd, 4)
+
+        yield a / price
+        yield abs(a - b)
+        yield abs(a - b) / price
+        # 数量 * 価格 を価格で割り戻した値(注文計画の残数量の計算と同じ形)
+        yield (a * price) / price
+        yield (a + b) - b
+
+def to_units(value, n):
+    '''
+    丸めた値を 10**n 倍した整数にする
+    '''
+    return int(round(value * 10 ** n))
+
+class QuantizerTest(unittest.TestCase):
+
+    def assert_same_as_baseline(self, name, m, n):
+        expected = getattr(baseline_calculation, name)(m, n)
+        actual = getattr(calculation, name)(m, n)
+        self.assertEqual(to_units(expected, n), to_units(actual, n)
+                , '%s(%r, %s): baseline=%r, actual=%r' % (name, m, n, expected, actual)
+        )
+
+    def is_baseline_ceil_bug(self, m, n):
+        '''
+        変更前の kiri_age は、小数部が0の値を n=0 で切り上げると1大きくなる
+        '''
+        return n == 0 and str(abs(m)).endswith('.0')
+
+    def check_values(self, values):
+        for m in values:
+            if m < 1e-3:
+                # 変更前の実装は指数表記(1e-05等)の一部を丸めないため、比較しない
+                continue
+
+            for n in DIGITS:
+                self.assert_same_as_baseline('kiri_sute', m, n)
+                self.assert_same_as_baseline('shisha_gonyu', m, n)
+                if not self.is_baseline_ceil_bug(m, n):
+                    self.assert_same_as_baseline('kiri_age', m, n)
+
+    def test_computed_values(self):
+        self.check_values(list(iter_computed_values(random.Random(0), 3000)))
+
+    def test_literal_values(self):
+        rnd = random.Random(1)
+        self.check_values([random_decimal(rnd) for i in xrange(5000)])
+
+    def test_negative_values(self):
+        values = list(iter_computed_values(random.Random(2), 300))
+        for m in values:
+            for n in DIGITS:
+                for name in ('kiri_sute', 'kiri_age', 'shisha_gonyu'):
+                    func = getattr(calculation, name)
+                    self.assertEqual(-func(m, n), func(-m, n))
+
+    def test_float_drift(self):
+        # 累積した引き算で整数の手前になった値
+        self.assertEqual(313470, calculation.kiri_sute(313469.9999999996))
+        self.assertEqual(0.3, calculation.kiri_sute(1000.3 - 1000.0, 1))
+        self.assertEqual(29, calculation.kiri_sute(0.29 * 100))
+        self.assertEqual(0.3, calculation.kiri_age(0.1 + 0.2, 1))
+
+    def test_twelve_digit_boundary(self):
+        # 有効数字12桁の値は、12桁に丸めても変わらない
+        self.assertEqual(99999999999.9, calculation.kiri_sute(99999999999.9, 1))
+        self.assertEqual(99999999999, calculation.kiri_sute(99999999999.9))
+        self.assertEqual(0.123456789012, calculation.kiri_age(0.123456789012, 12))
+
+    def test_int_values(self):
+        self.assertEqual(3, calculation.kiri_sute(3, 2))
+        self.assertEqual(1, calculation.kiri_age(1.0, 0))
+        self.assertTrue(isinstance(calculation.shisha_gonyu(2.5), int))
+
+    def test_negative_digits(self):
+        self.assertRaises(RuntimeError, calculation.Quantizer, -1)
+
+if __name__ == '__main__':
+    unittest.main()
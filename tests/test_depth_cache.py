@@ -0,0 +1,122 @@
+# -*- encoding:UTF-8 -*-
+import os, sys, threading, time, traceback, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'sample'))
+
+import trollius as asyncio
+from trollius import From, Return
+
+from api_wrapper import EtwingsApiWrapper
+from async_api_wrapper import AsyncEtwingsApiWrapper
+from depth_cache import DepthCache, DepthSnapshot
+from simulator import ExchangeSimulator
+from market_stub import StubMarket
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+depth_cache の取得中のdepthの待ち合わせを確認する
+'''
+KEY = ('test', 'BTC', 'JPY', None)
+
+# 完了しない待ちを検出するまでの時間[秒]
+WAIT_TIMEOUT = 10.0
+
+class DepthFetchTest(unittest.TestCase):
+    def start_fetch(self, cache, fetch):
+        '''
+        別のスレッドで取得を開始し、取得中になるまで待つ
+        '''
+        started = threading.Event()
+
+        def run():
+            def fetching():
+                started.set()
+                return fetch()
+            try:
+                cache.refresh(KEY, fetching)
+            except ValueError:
+                pass
+
+        fetcher = threading.Thread(target=run)
+        fetcher.daemon = True
+        fetcher.start()
+        started.wait(WAIT_TIMEOUT)
+        return fetcher
+
+    def test_join_keeps_traceback(self):
+        # 待っていた呼び出し元にも、取得時のトレースバックのまま例外を送出する
+        cache = DepthCache()
+        release = threading.Event()
+
+        def failing_fetch():
+            release.wait(WAIT_TIMEOUT)
+            raise ValueError('fetch failed')
+
+        fetcher = self.start_fetch(cache, failing_fetch)
+        threading.Timer(0.1, release.set).start()
+        try:
+            cache.refresh(KEY, lambda: self.fail('joined caller must not fetch'))
+        except ValueError:
+            names = [frame[2] for frame in traceback.extract_tb(sys.exc_info()[2])]
+            self.assertIn('failing_fetch', names)
+        else:
+            self.fail('error was not raised')
+
+        fetcher.join(WAIT_TIMEOUT)
+
+    def test_join_timeout(self):
+        # 待つ時間を過ぎた場合は、自身で取得する
+        cache = DepthCache(fetch_wait_timeout=0.1)
+        release = threading.Event()
+        fetcher = self.start_fetch(cache, lambda: release.wait(WAIT_TIMEOUT) and DepthSnapshot([], []))
+
+        own = DepthSnapshot([], [])
+        start = time.time()
+        self.assertIs(own, cache.refresh(KEY, lambda: own))
+        self.assertLess(time.time() - start, WAIT_TIMEOUT)
+
+        release.set()
+        fetcher.join(WAIT_TIMEOUT)
+
+class LoopThreadTest(unittest.TestCase):
+    def setUp(self):
+        # 非同期版の取得中に、同期版の取得を行えるよう応答を遅くする
+        self.simulator = ExchangeSimulator(depth=20, latency=0.3).start()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self.simulator.stop()
+
+    def test_sync_fetch_on_loop_thread(self):
+        # イベントループのスレッドで、同じ市場を非同期版が取得中に同期版で取得しても止まらない
+        cache = DepthCache()
+        market = StubMarket('etwings', 'btc', 'jpy')
+        base_url = self.simulator.get_base_url()
+        async_wrapper = AsyncEtwingsApiWrapper(market, loop=self.loop, depth_cache=cache, base_url=base_url)
+        sync_wrapper = EtwingsApiWrapper(market, depth_cache=cache, base_url=base_url)
+        self.assertEqual(async_wrapper.get_market_key(), sync_wrapper.get_market_key())
+
+        @asyncio.coroutine
+        def run():
+            task = asyncio.ensure_future(async_wrapper.get_depth_snapshot(0), loop=self.loop)
+            yield From(asyncio.sleep(0.05, loop=self.loop))
+
+            start = time.time()
+            snapshot = sync_wrapper.get_depth_snapshot(0)
+            elapsed = time.time() - start
+
+            yield From(task)
+            raise Return((snapshot, elapsed))
+
+        snapshot, elapsed = self.loop.run_until_complete(
+                asyncio.wait_for(run(), WAIT_TIMEOUT, loop=self.loop)
+        )
+        self.assertEqual(20, len(snapshot.get_levels(False, sync_wrapper.normalize_sell_orders)))
+        self.assertLess(elapsed, WAIT_TIMEOUT / 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+# -*- encoding:UTF-8 -*-
+import os, sys, threading, time, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'sample'))
+
+import trollius as asyncio
+
+from async_api_wrapper import AsyncEtwingsApiWrapper
+from depth_cache import DepthCache, DepthSnapshot
+from depth_poller import DepthPoller, MIN_POLL_INTERVAL
+from simulator import ExchangeSimulator
+from market_stub import StubMarket
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+depth_poller が非同期APIラッパーのdepthを、そのイベントループで取得することを確認する
+'''
+# 取得を待つ最長の時間[秒]
+WAIT_TIMEOUT = 10.0
+
+class AsyncDepthPollerTest(unittest.TestCase):
+    def setUp(self):
+        self.simulator = ExchangeSimulator(depth=20).start()
+
+        # イベントループは別のスレッドで実行し続ける
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever)
+        self.loop_thread.daemon = True
+        self.loop_thread.start()
+
+        self.api_wrapper = AsyncEtwingsApiWrapper(
+                StubMarket('etwings', 'btc', 'jpy', api_util_class='AsyncEtwingsApiWrapper')
+                , loop=self.loop, depth_cache=DepthCache(), base_url=self.simulator.get_base_url()
+        )
+        self.poller = DepthPoller(interval=0.05)
+
+    def tearDown(self):
+        self.poller.stop(WAIT_TIMEOUT)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join(WAIT_TIMEOUT)
+        self.loop.close()
+        self.simulator.stop()
+
+    def wait_snapshot(self):
+        deadline = time.time() + WAIT_TIMEOUT
+        while time.time() < deadline:
+            snapshot = self.poller.get_snapshot(self.api_wrapper)
+            if snapshot is not None:
+                return snapshot
+            time.sleep(0.01)
+
+        self.fail('depth was not polled. status=%s' % (self.poller.get_status(self.api_wrapper), ))
+
+    def test_poll_async_wrapper(self):
+        self.poller.register(self.api_wrapper)
+        self.poller.start()
+        snapshot = self.wait_snapshot()
+
+        # 取得したスナップショットは、両側の DepthLevel 一覧を作成済みでキャッシュに公開されている
+        self.assertEqual(20, len(snapshot.get_levels(True, None)))
+        self.assertEqual(20, len(snapshot.get_levels(False, None)))
+        self.assertIs(snapshot, self.api_wrapper.depth_cache.get(
+                self.api_wrapper.get_market_key(), WAIT_TIMEOUT
+        ))
+        self.assertIsNone(self.poller.get_status(self.api_wrapper).last_error)
+
+        quote = self.poller.get_quote(self.api_wrapper)
+        self.assertLess(quote.bid, quote.ask)
+
+    def test_refresh_sync(self):
+        # イベントループ以外のスレッドからは、イベントループで取得した結果を待つ
+        snapshot = self.api_wrapper.refresh_depth_snapshot_sync(normalize=True)
+
+        self.assertIsInstance(snapshot, DepthSnapshot)
+        self.assertEqual(20, len(snapshot.get_levels(False, None)))
+        self.assertIs(snapshot, self.api_wrapper.depth_cache.get(
+                self.api_wrapper.get_market_key(), WAIT_TIMEOUT
+        ))
+
+    def test_refresh_sync_from_loop_thread(self):
+        # イベントループのスレッドから待つと完了しないため、例外とする
+        errors = []
+
+        def call():
+            try:
+                self.api_wrapper.refresh_depth_snapshot_sync()
+            except RuntimeError as e:
+                errors.append(e)
+
+        self.loop.call_soon_threadsafe(call)
+        deadline = time.time() + WAIT_TIMEOUT
+        while not errors and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(1, len(errors))
+
+class StubApiWrapper(object):
+    '''
+    API使用可能間隔が0で、通信せずに空のスナップショットを返すAPIラッパー
+    '''
+    api_available_span = 0
+
+    def __init__(self):
+        self.fetch_count = 0
+
+    def get_market_key(self):
+        return ('stub', 'BTC', 'JPY', None)
+
+    def refresh_depth_snapshot_sync(self, normalize=False):
+        self.fetch_count += 1
+        return DepthSnapshot([], [])
+
+    def normalize_buy_orders(self, orders):
+        return ()
+
+    def normalize_sell_orders(self, orders):
+        return ()
+
+class PollIntervalTest(unittest.TestCase):
+    def test_zero_interval(self):
+        # 待ち時間が0でも、MIN_POLL_INTERVAL 毎にしか取得しない
+        api_wrapper = StubApiWrapper()
+        poller = DepthPoller(interval=0, error_interval=0)
+        poller.register(api_wrapper)
+
+        duration = 0.3
+        poller.start()
+        time.sleep(duration)
+        poller.stop(WAIT_TIMEOUT)
+
+        self.assertLess(0, api_wrapper.fetch_count)
+        self.assertLessEqual(api_wrapper.fetch_count, duration / MIN_POLL_INTERVAL + 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# -*- encoding:UTF-8 -*-
+import os, random, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'sample'))
+
+import api_coordinator, order_book
+from api_wrapper import BtcBoxApiWrapper
+from depth_cache import DepthCache, DepthSnapshot
+from market_stub import StubMarket
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+order_book の複数数量の計画が、1件毎の計画と同じ結果となることを確認する
+- depthはAPIより取得せず、APIラッパーのキャッシュに入れたスナップショットを使用する
+'''
+def make_api_wrapper(bids, asks, **market_kwargs):
+    '''
+    注文一覧(BtcBox の形式)をキャッシュに入れたAPIラッパーを作成する
+    '''
+    api_wrapper = BtcBoxApiWrapper(StubMarket(**market_kwargs)
+            , depth_cache=DepthCache(), depth_max_age=float('inf')
+    )
+    api_wrapper.depth_cache.put(api_wrapper.get_market_key(), DepthSnapshot(bids=bids, asks=asks))
+    return api_wrapper
+
+def make_levels(rnd, num, low, high, min_trade_amount):
+    '''
+    最低注文数に満たない注文(最小注文単位以上)を含む注文一覧を作成する
+    (5件以上の場合は、最後から2件目を数量0の注文とする)
+    '''
+    levels = []
+    for i in xrange(num):
+        if rnd.random() < 0.3:
+            amount = round(rnd.uniform(0.001, min_trade_amount), 3)
+        else:
+            amount = round(rnd.random() * 3, 5)
+        levels.append([rnd.randint(low, high), amount])
+
+    if 5 <= num:
+        levels[-2][1] = 0
+
+    return levels
+
+class OrderBookTest(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(18)
+        self.api_wrappers = [make_api_wrapper(
+                make_levels(rnd, num, 29000, 30000, min_trade_amount)
+                , make_levels(rnd, num, 30000, 31000, min_trade_amount)
+                , min_trade_amount=min_trade_amount, min_trade_unit=3
+        ) for num in (0, 1, 5, 200) for min_trade_amount in (0.01, 0.5)]
+
+    def test_plans_with_base_amount(self):
+        order_amounts = [0, 0.1, 0.5, 1, 5, 10, 37.123, 1000]
+        for api_wrapper in self.api_wrappers:
+            for is_buy_order in (True, False):
+                plans = order_book.get_order_plans_with_base_amount(
+                        api_wrapper, is_buy_order, order_amounts
+                )
+                # 1件毎の計画、api_coordinator と末尾の桁まで一致する
+                self.assertEqual([order_book.get_order_plan_with_base_amount(
+                        api_wrapper, is_buy_order, order_amount
+                ) for order_amount in order_amounts], plans)
+                self.assertEqual([api_coordinator.get_order_plan_with_base_amount(
+                        api_wrapper, is_buy_order, order_amount
+                ) for order_amount in order_amounts], plans)
+
+    def test_plans_with_counter_amount(self):
+        counter_amounts = [0, 100, 30000, 123456.78, 1e6, 1e8]
+        for api_wrapper in self.api_wrappers:
+            for is_buy_order in (True, False):
+                plans = order_book.get_order_plans_with_counter_amount(
+                        api_wrapper, is_buy_order, counter_amounts
+                )
+                self.assertEqual([order_book.get_order_plan_with_counter_amount(
+                        api_wrapper, is_buy_order, counter_amount
+                ) for counter_amount in counter_amounts], plans)
+                self.assertEqual([api_coordinator.get_order_plan_with_counter_amount(
+                        api_wrapper, is_buy_order, counter_amount
+                ) for counter_amount in counter_amounts], plans)
+
+    def test_empty_amounts(self):
+        api_wrapper = self.api_wrappers[-1]
+        self.assertEqual([], order_book.get_order_plans_with_base_amount(api_wrapper, True, []))
+        self.assertEqual([], order_book.get_order_plans_with_counter_amount(api_wrapper, False, []))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# -*- encoding:UTF-8 -*-
+import os, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'sample'))
+
+import api_coordinator, order_router
+from api_wrapper import BtcBoxApiWrapper
+from depth_cache import DepthCache, DepthSnapshot
+from market_stub import StubMarket
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+order_router の複数市場への注文の振り分けを確認する
+- depthはAPIより取得せず、各APIラッパーのキャッシュに入れたスナップショットを使用する
+'''
+def make_api_wrapper(bids, asks, **market_kwargs):
+    '''
+    注文一覧(BtcBox の形式)をキャッシュに入れたAPIラッパーを作成する
+    '''
+    api_wrapper = BtcBoxApiWrapper(StubMarket(**market_kwargs)
+            , depth_cache=DepthCache(), depth_max_age=float('inf')
+    )
+    api_wrapper.depth_cache.put(api_wrapper.get_market_key(), DepthSnapshot(bids=bids, asks=asks))
+    return api_wrapper
+
+def round_orders(order_list):
+    return [[price, round(amount, 9)] for price, amount in order_list]
+
+class OrderRouterTest(unittest.TestCase):
+    def assertDeltasEqual(self, expected, actual):
+        self.assertEqual(sorted(expected), sorted(actual))
+        for currency in expected:
+            self.assertAlmostEqual(expected[currency], actual[currency], 6)
+
+    def test_empty_markets(self):
+        for is_buy_order in (True, False):
+            self.assertEqual(([], {}), order_router.route_with_base_amount([], is_buy_order, 1.0))
+            self.assertEqual(([], {}), order_router.route_with_counter_amount([], is_buy_order, 100.0))
+
+    def test_single_market(self):
+        # 1市場の場合は api_coordinator と同じ注文一覧となる
+        # (最小注文単位で 0 となる注文以降は、api_coordinator と同じく注文しない)
+        api_wrapper = make_api_wrapper(
+                [[99, 0.5], [98, 0.0004], [97, 1.2], [95, 3]]
+                , [[100, 0.5], [101, 0.0004], [102, 1.2], [104, 3]]
+        )
+        for is_buy_order in (True, False):
+            for order_amount in (0.3, 0.5, 1.0, 1.7004, 100):
+                routed_orders, total_deltas = order_router.route_with_base_amount(
+                        [api_wrapper], is_buy_order, order_amount
+                )
+                order_list, currency_deltas = api_coordinator.get_order_plan_with_base_amount(
+                        api_wrapper, is_buy_order, order_amount
+                )
+                self.assertEqual(round_orders(order_list), round_orders(routed_orders[0].order_list))
+                self.assertDeltasEqual(currency_deltas, total_deltas)
+
+    def make_interleaved_markets(self):
+        # 手数料0で、価格が交互に並ぶ2市場
+        return (
+                make_api_wrapper([[99, 1], [97, 1], [95, 1]], [[100, 1], [102, 1], [104, 1]], fee=0)
+                , make_api_wrapper([[98, 1], [96, 1], [94, 1]], [[101, 1], [103, 1], [105, 1]], fee=0)
+        )
+
+    def test_interleaved_markets(self):
+        market_a, market_b = self.make_interleaved_markets()
+
+        routed_orders, total_deltas = order_router.route_with_base_amount(
+                [market_a, market_b], True, 3.5
+        )
+        self.assertEqual([market_a, market_b], [order.api_wrapper for order in routed_orders])
+        self.assertEqual([[100, 1], [102, 1]], round_orders(routed_orders[0].order_list))
+        self.assertEqual([[101, 1], [103, 0.5]], round_orders(routed_orders[1].order_list))
+        self.assertDeltasEqual({'BTC': 3.5, 'JPY': -354.5}, total_deltas)
+
+        routed_orders, total_deltas = order_router.route_with_base_amount(
+                [market_a, market_b], False, 2.5
+        )
+        self.assertEqual([[99, 1], [97, 0.5]], round_orders(routed_orders[0].order_list))
+        self.assertEqual([[98, 1]], round_orders(routed_orders[1].order_list))
+        self.assertDeltasEqual({'BTC': -2.5, 'JPY': 245.5}, total_deltas)
+
+    def test_counter_amount(self):
+        market_a, market_b = self.make_interleaved_markets()
+
+        # 100 + 101 を支払った残り 49 で、102 の注文を最小注文単位で切り捨てた数量だけ買う
+        routed_orders, total_deltas = order_router.route_with_counter_amount(
+                [market_a, market_b], True, 250.0
+        )
+        self.assertEqual([[100, 1], [102, 0.48]], round_orders(routed_orders[0].order_list))
+        self.assertEqual([[101, 1]], round_orders(routed_orders[1].order_list))
+        self.assertDeltasEqual({'BTC': 2.48, 'JPY': -249.96}, total_deltas)
+
+        # 99 + 98 を受け取った残り 50 で、97 の注文を売る
+        routed_orders, total_deltas = order_router.route_with_counter_amount(
+                [market_a, market_b], False, 247.0
+        )
+        self.assertEqual([[99, 1], [97, 0.515]], round_orders(routed_orders[0].order_list))
+        self.assertEqual([[98, 1]], round_orders(routed_orders[1].order_list))
+        self.assertDeltasEqual({'BTC': -2.515, 'JPY': 246.955}, total_deltas)
+
+if __name__ == '__main__':
+    unittest.main()
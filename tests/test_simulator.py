@@ -0,0 +1,54 @@
+# -*- encoding:UTF-8 -*-
+from collections import OrderedDict
+import os, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'sample'))
+
+import requests
+
+from signer import EtwingsSigner
+from simulator import ExchangeSimulator, SIGNATURE_ERROR_STATUS
+
+'''
+Created on 2026/10/17
+
+@author: user
+
+取引所シミュレータの署名の検証が、APIラッパーの署名処理とは独立に行われることを確認する
+'''
+class SimulatorSignatureTest(unittest.TestCase):
+    def setUp(self):
+        self.simulator = ExchangeSimulator(depth=5).start()
+        self.url = self.simulator.get_base_url() + '/tapi'
+        self.signer = EtwingsSigner('public_key', 'secret_key')
+
+    def tearDown(self):
+        self.simulator.stop()
+
+    def post(self, nonce, reorder):
+        '''
+        パラメータの順序で署名し、reorder の場合は異なる順序で送信する
+        '''
+        params = OrderedDict((('method', 'get_info'), ('nonce', str(nonce))))
+        headers = self.signer.sign(params)
+
+        items = params.items()
+        if reorder:
+            items.reverse()
+
+        return requests.post(self.url, data=items, headers=headers)
+
+    def test_signed_order(self):
+        r = self.post(1, False)
+        self.assertEqual(200, r.status_code)
+        self.assertEqual(1, r.json()['success'])
+
+    def test_misordered_query(self):
+        # 署名した順序と送信した順序が異なる場合は、署名の検証に失敗する
+        r = self.post(2, True)
+        self.assertEqual(SIGNATURE_ERROR_STATUS, r.status_code)
+        self.assertEqual(401, r.status_code)
+        self.assertEqual(0, r.json()['success'])
+
+if __name__ == '__main__':
+    unittest.main()